@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# Jobs sent to a worker per task
+CHUNK_SIZE = 256
+
+# Chunks in flight per worker, which bounds how far the pool reads ahead of the consumer
+CHUNKS_PER_WORKER = 2
+
+
+def _classify_chunk(classify, chunk):
+    return [classify(job) for job in chunk]
+
+
+def _chunks(jobs, chunk_size):
+    jobs = iter(jobs)
+    while True:
+        chunk = list(islice(jobs, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _classify_on(executor, classify, jobs, workers, chunk_size):
+    pending = deque()
+    for chunk in _chunks(jobs, chunk_size):
+        pending.append((chunk, executor.submit(_classify_chunk, classify, chunk)))
+        if len(pending) >= workers * CHUNKS_PER_WORKER:
+            done_chunk, future = pending.popleft()
+            yield from zip(done_chunk, future.result())
+    while pending:
+        done_chunk, future = pending.popleft()
+        yield from zip(done_chunk, future.result())
+
+
+def classify_jobs(classify, jobs, workers=1, chunk_size=CHUNK_SIZE, executor=None):
+    """Yield (job, classify(job)) for every job, in input order
+
+    With more than one worker the jobs are classified in chunks on a process
+    pool. `classify` must be a module-level function so it can be sent to
+    the workers; each worker imports its module, and so builds the keyword
+    matcher, once. Results are yielded in the order the jobs were read, so
+    the output is identical to a serial run. Pass a ProcessPoolExecutor of
+    `workers` processes as `executor` to share one pool across calls;
+    otherwise each call starts its own.
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield job, classify(job)
+        return
+
+    if executor is not None:
+        yield from _classify_on(executor, classify, jobs, workers, chunk_size)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from _classify_on(executor, classify, jobs, workers, chunk_size)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from functools import partial
+
+from classification_engine import classify_job
+from job_reader import iter_jobs
+
+# A segment is a line, or a sentence within a line; the separators are kept so the remainder reads as before
+SEGMENT_BOUNDARY = re.compile(r'(\n|(?<=[.!?])[ \t]+)')
+
+DIGITS = re.compile(r'[0-9]+')
+SPACE = re.compile(r'\s+')
+
+# Bullets and dashes that lead checklist lines
+BULLETS = ' -*•·–'
+
+# A segment is boilerplate once it appears in this many jobs...
+MIN_JOBS = 10
+# ...and has at least this many words, so short headings such as 'SOLAR' or 'Energy Meter' stay
+MIN_WORDS = 5
+
+# Distinct segments counted while learning before those seen only once are forgotten
+MAX_TRACKED_SEGMENTS = 1000000
+
+# Distinct raw segments remembered between jobs before the lookup cache is reset
+MAX_CACHED_SEGMENTS = 200000
+
+
+def normalise_segment(segment):
+    """Lowercased segment with whitespace collapsed, every run of digits as 0 and leading bullets removed
+
+    Insurer footers that differ only in limits, dates or claim numbers
+    normalise alike.
+    """
+    return SPACE.sub(' ', DIGITS.sub('0', segment.lower())).strip(BULLETS)
+
+
+def split_segments(text):
+    """A description's segments, alternating with the separators between them"""
+    return SEGMENT_BOUNDARY.split(text)
+
+
+def _fingerprint(normalised):
+    return hashlib.blake2b(normalised.encode('utf-8'), digest_size=8).digest()
+
+
+class BoilerplateDictionary:
+    """Segments repeated across many jobs' descriptions, and the stripping of them
+
+    The dictionary is learned from a corpus: each description is cut into
+    lines and sentences, and a normalised segment that appears in at least
+    `min_jobs` jobs and has at least `min_words` words is boilerplate, such
+    as the insurer 'Pre-approval limit: $300 + GST ...' footer or the steps
+    of a make safe checklist. Stripping removes those segments so only the
+    distinctive remainder is scanned. A job made of nothing but boilerplate
+    keeps its text, since then the repeated segment is the job.
+
+    Repeated job content, such as the equipment list of a standard solar
+    quote, is learned too; the dictionary is plain JSON, so review it (and
+    `report` its label changes) and delete such segments before use.
+    """
+
+    def __init__(self, segments, min_jobs=MIN_JOBS, min_words=MIN_WORDS, jobs=0):
+        self.segments = segments
+        self.min_jobs = min_jobs
+        self.min_words = min_words
+        self.jobs = jobs
+        self.known = {}
+
+    @classmethod
+    def learn(cls, jobs, min_jobs=MIN_JOBS, min_words=MIN_WORDS):
+        """Count each segment once per job, by fingerprint, and keep the frequent ones
+
+        When more than MAX_TRACKED_SEGMENTS distinct segments are being
+        counted, those seen only once are dropped; a segment that first
+        becomes common late in a very large corpus may then be undercounted.
+        """
+        counts = {}
+        texts = {}
+        total = 0
+        for job in jobs:
+            total += 1
+            seen = set()
+            for segment in split_segments(job.get('job_description') or '')[::2]:
+                normalised = normalise_segment(segment)
+                if len(normalised.split()) < min_words:
+                    continue
+                fingerprint = _fingerprint(normalised)
+                if fingerprint in seen:
+                    continue
+                seen.add(fingerprint)
+                count = counts[fingerprint] = counts.get(fingerprint, 0) + 1
+                if count == min_jobs:
+                    texts[fingerprint] = normalised
+            if len(counts) > MAX_TRACKED_SEGMENTS:
+                counts = {fingerprint: count for fingerprint, count in counts.items() if count > 1}
+
+        segments = {texts[fingerprint]: counts[fingerprint] for fingerprint in texts}
+        segments = dict(sorted(segments.items(), key=lambda item: (-item[1], item[0])))
+        return cls(segments, min_jobs, min_words, total)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['segments'], data['min_jobs'], data['min_words'], data['jobs'])
+
+    def save(self, path):
+        data = {'min_jobs': self.min_jobs, 'min_words': self.min_words, 'jobs': self.jobs,
+                'segments': self.segments}
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump(data, f, indent=2)
+        os.replace(f.name, path)
+
+    @property
+    def version(self):
+        """Changes whenever a segment is added or removed, so cached results from another dictionary are not reused"""
+        return hashlib.sha256('\n'.join(sorted(self.segments)).encode('utf-8')).hexdigest()[:16]
+
+    def is_boilerplate(self, segment):
+        known = self.known.get(segment)
+        if known is None:
+            if len(self.known) >= MAX_CACHED_SEGMENTS:
+                self.known.clear()
+            known = self.known[segment] = normalise_segment(segment) in self.segments
+        return known
+
+    def strip(self, text):
+        """The text without its boilerplate segments (unchanged when it has none, or nothing else)"""
+        parts = split_segments(text)
+        kept = []
+        stripped = False
+        # parts alternates segment, separator; a dropped segment takes its separator with it
+        for index in range(0, len(parts), 2):
+            if self.is_boilerplate(parts[index]):
+                stripped = True
+            else:
+                kept.append(parts[index])
+                kept.append(parts[index + 1] if index + 1 < len(parts) else '')
+        if not stripped or not ''.join(kept).strip():
+            return text
+        return ''.join(kept)
+
+    def strip_job(self, job):
+        """The job itself, or a copy with its description stripped of boilerplate"""
+        description = job['job_description']
+        remainder = self.strip(description)
+        return job if remainder is description else {**job, 'job_description': remainder}
+
+
+# Dictionaries loaded by this process, by path; a worker process loads its own on first use
+_loaded = {}
+
+
+def load_dictionary(path):
+    """The dictionary at `path`, loaded once per process"""
+    if path not in _loaded:
+        _loaded[path] = BoilerplateDictionary.load(path)
+    return _loaded[path]
+
+
+def classify_stripped(path, classify, job):
+    return classify(load_dictionary(path).strip_job(job))
+
+
+def stripped_classifier(path, classify=classify_job):
+    """`classify` run on jobs stripped of the boilerplate in the dictionary at `path`
+
+    Only the path goes to worker processes with each chunk of jobs, so every
+    worker loads the dictionary once rather than receiving it again per chunk.
+    """
+    return partial(classify_stripped, path, classify)
+
+
+def report(dictionary, jobs):
+    """How much text stripping removes and which labels change, with the classification time with and without"""
+    strip_job = dictionary.strip_job
+    stripped_jobs = []
+    characters = kept_characters = 0
+    for job in jobs:
+        stripped = strip_job(job)
+        stripped_jobs.append((job, stripped))
+        characters += len(job['job_description'])
+        kept_characters += len(stripped['job_description'])
+
+    started = time.perf_counter()
+    before = [classify_job(job) for job, _ in stripped_jobs]
+    full_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    after = [classify_job(strip_job(job)) for job, _ in stripped_jobs]
+    stripped_seconds = time.perf_counter() - started
+
+    changes = {}
+    for old, new in zip(before, after):
+        for field in ('work_type', 'urgency_level', 'property_type'):
+            if getattr(old, field) != getattr(new, field):
+                move = f"{field}: {getattr(old, field)} -> {getattr(new, field)}"
+                changes[move] = changes.get(move, 0) + 1
+    return {
+        'jobs': len(stripped_jobs),
+        'jobs_with_boilerplate': sum(job is not stripped for job, stripped in stripped_jobs),
+        'characters': characters,
+        'characters_scanned': kept_characters,
+        'classify_seconds': round(full_seconds, 4),
+        'classify_stripped_seconds': round(stripped_seconds, 4),
+        'label_changes': dict(sorted(changes.items(), key=lambda item: -item[1]))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Learn the boilerplate repeated across job descriptions, and measure what stripping it changes")
+    parser.add_argument('--dictionary', default='boilerplate.json', help="Learned boilerplate segments")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    learn = subparsers.add_parser('learn', help="Learn the dictionary from a corpus of jobs")
+    learn.add_argument('--input', default='all_jobs.csv',
+                       help="Jobs to learn from: a JSON array, a CSV such as all_jobs.csv, or a job store")
+    learn.add_argument('--min-jobs', type=int, default=MIN_JOBS, help="Jobs a segment must appear in")
+    learn.add_argument('--min-words', type=int, default=MIN_WORDS, help="Words a segment must have")
+    learn.add_argument('--top', type=int, default=10, help="Most frequent segments to print")
+    measure = subparsers.add_parser('report', help="Text removed and labels changed by stripping a corpus")
+    measure.add_argument('--input', default='all_jobs.csv')
+    args = parser.parse_args()
+
+    if args.command == 'learn':
+        started = time.perf_counter()
+        dictionary = BoilerplateDictionary.learn(iter_jobs(args.input), args.min_jobs, args.min_words)
+        dictionary.save(args.dictionary)
+        print(f"Learned {len(dictionary.segments)} boilerplate segments from {dictionary.jobs} jobs in "
+              f"{time.perf_counter() - started:.1f}s; written to {args.dictionary}")
+        for segment, count in list(dictionary.segments.items())[:args.top]:
+            print(f"  {count} jobs: {segment[:100]}")
+        return
+
+    result = report(BoilerplateDictionary.load(args.dictionary), iter_jobs(args.input))
+    print(f"{result['jobs_with_boilerplate']} of {result['jobs']} jobs have boilerplate; "
+          f"{result['characters_scanned']:,} of {result['characters']:,} characters left to scan "
+          f"({100 * result['characters_scanned'] / max(result['characters'], 1):.1f}%)")
+    print(f"Classification: {result['classify_seconds']:.2f}s as is, "
+          f"{result['classify_stripped_seconds']:.2f}s stripped (including the stripping)")
+    print(f"{sum(result['label_changes'].values())} labels change:")
+    for move, count in result['label_changes'].items():
+        print(f"  {move}: {count}")
+
+if __name__ == "__main__":
+    main()
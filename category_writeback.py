@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from classification_engine import CATEGORY_MAP
+from job_reader import iter_jobs
+from results_query_service import load_results
+from servicem8_client import ServiceM8Client
+from servicem8_sync import SERVICEM8_API_BASE
+
+# Applied updates are committed to the checkpoint in groups of this many
+CHECKPOINT_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applied (
+    job_uuid TEXT PRIMARY KEY,
+    category_uuid TEXT NOT NULL,
+    job_number TEXT,
+    applied_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failed (
+    job_uuid TEXT PRIMARY KEY,
+    category_uuid TEXT NOT NULL,
+    job_number TEXT,
+    status INTEGER,
+    error TEXT NOT NULL,
+    failed_at TEXT NOT NULL
+);
+"""
+
+
+def index_jobs(jobs):
+    """Job number -> uuid and uuid -> live category_uuid for the jobs of an export or store
+
+    A job number shared by several jobs maps to None, since an update for it
+    could land on the wrong job. Raises ValueError when no job carries a
+    category_uuid (CSV exports such as all_jobs.csv do not), as the live
+    category is what decides whether a job needs changing.
+    """
+    job_uuids = {}
+    categories = {}
+    for job in jobs:
+        if not job.get('uuid'):
+            continue
+        if 'category_uuid' in job:
+            categories[job['uuid']] = job['category_uuid'] or ''
+        job_number = job['generated_job_id']
+        job_uuids[job_number] = None if job_uuids.get(job_number, job['uuid']) != job['uuid'] else job['uuid']
+    if job_uuids and not categories:
+        raise ValueError("no category_uuid column, so the jobs' current categories are unknown")
+    return job_uuids, categories
+
+
+def plan_updates(rows, job_uuids, categories, category_uuids):
+    """Turn result rows into (job_uuid, job_number, category, category_uuid) updates
+
+    Rows carry job numbers, so each is resolved to its ServiceM8 uuid through
+    `job_uuids`. A job is updated only when its live category (from
+    `categories`) differs from the recommended one; the results' own
+    needs_change flag is not trusted. Returns the updates and the rows
+    skipped, by reason.
+    """
+    updates = []
+    skipped = {'no_job_uuid': 0, 'ambiguous_job_number': 0, 'unknown_category': 0}
+    for row in rows:
+        job_uuid = row.get('uuid') or job_uuids.get(row['job_number'])
+        category_uuid = category_uuids.get(row['recommended_category'])
+        if not job_uuid and row['job_number'] in job_uuids:
+            skipped['ambiguous_job_number'] += 1
+        elif not job_uuid or job_uuid not in categories:
+            skipped['no_job_uuid'] += 1
+        elif not category_uuid:
+            skipped['unknown_category'] += 1
+        elif categories[job_uuid] != category_uuid:
+            updates.append((job_uuid, row['job_number'], row['recommended_category'], category_uuid))
+    return updates, skipped
+
+
+class WritebackCheckpoint:
+    """SQLite record of the updates already applied, so an interrupted run resumes where it stopped
+
+    An update counts as applied only for the category it set; a job whose
+    recommendation has since changed is written again.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.pending = 0
+
+    def applied(self):
+        return dict(self.connection.execute("SELECT job_uuid, category_uuid FROM applied"))
+
+    def record_applied(self, job_uuid, job_number, category_uuid):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO applied (job_uuid, category_uuid, job_number, applied_at) VALUES (?, ?, ?, ?)",
+            (job_uuid, category_uuid, job_number, _now()))
+        self.connection.execute("DELETE FROM failed WHERE job_uuid = ?", (job_uuid,))
+        self.pending += 1
+        if self.pending >= CHECKPOINT_EVERY:
+            self.commit()
+
+    def record_failed(self, job_uuid, job_number, category_uuid, status, error):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO failed (job_uuid, category_uuid, job_number, status, error, failed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", (job_uuid, category_uuid, job_number, status, error, _now()))
+        self.pending += 1
+
+    def commit(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class CategoryWriteback:
+    """Applies category updates to ServiceM8 through a ServiceM8Client
+
+    `concurrency` workers take updates from a queue, so up to that many are
+    in flight on the client's keep-alive connections. Setting a job's
+    category is idempotent, so an update retried after a lost response is
+    harmless.
+    """
+
+    def __init__(self, checkpoint, client):
+        self.checkpoint = checkpoint
+        self.client = client
+        self.counts = {'applied': 0, 'failed': 0}
+
+    async def worker(self, queue, progress):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            job_uuid, job_number, category, category_uuid = item
+            status, _, error = await self.client.request(
+                'POST', f"/job/{job_uuid}.json", json.dumps({'category_uuid': category_uuid}))
+            if error is None:
+                self.checkpoint.record_applied(job_uuid, job_number, category_uuid)
+                self.counts['applied'] += 1
+            else:
+                self.checkpoint.record_failed(job_uuid, job_number, category_uuid, status, error)
+                self.counts['failed'] += 1
+                print(f"❌ Job {job_number}: {status or 'no response'} {error}")
+            progress()
+
+    async def run(self, updates, report_every=100):
+        queue = asyncio.Queue(maxsize=self.client.concurrency * 2)
+        started = time.monotonic()
+
+        def progress():
+            done = self.counts['applied'] + self.counts['failed']
+            if done % report_every == 0 or done == len(updates):
+                elapsed = time.monotonic() - started
+                print(f"  {done}/{len(updates)} updates, {done / elapsed if elapsed else 0:.1f}/s, "
+                      f"{self.counts['failed']} failed, {self.client.retries} retries")
+
+        workers = [asyncio.create_task(self.worker(queue, progress)) for _ in range(self.client.concurrency)]
+        for update in updates:
+            await queue.put(update)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        self.checkpoint.commit()
+        return self.counts
+
+
+async def apply_updates(checkpoint, updates, api_base, concurrency, rate, max_attempts):
+    async with ServiceM8Client(api_base, concurrency=concurrency, rate=rate, max_attempts=max_attempts) as client:
+        counts = await CategoryWriteback(checkpoint, client).run(updates)
+        return dict(counts, retries=client.retries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--results', default='three_dimensional_job_classification.json',
+                        help="Classification results with recommended_category (.json, .ndjson or .jcol)")
+    parser.add_argument('--jobs', default='servicem8_jobs.db',
+                        help="servicem8_sync.py job store the results came from, with each job's uuid and current "
+                             "category_uuid; CSV and JSON exports lack these and cannot be written back")
+    parser.add_argument('--checkpoint', default='category_writeback.db',
+                        help="SQLite file of applied updates; a rerun skips them")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=10.0, help="Maximum requests per second")
+    parser.add_argument('--max-attempts', type=int, default=6)
+    parser.add_argument('--api-base', default=SERVICEM8_API_BASE)
+    parser.add_argument('--apply', action='store_true', help="Write to ServiceM8; without it only the plan is shown")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.jobs):
+        raise SystemExit(f"No job store at {args.jobs}; run servicem8_sync.py first")
+    try:
+        job_uuids, categories = index_jobs(iter_jobs(args.jobs))
+    except ValueError as error:
+        raise SystemExit(f"Cannot plan category changes from {args.jobs}: {error}; "
+                         f"pass the servicem8_sync.py job store")
+    category_uuids = {name: uuid for uuid, name in CATEGORY_MAP.items() if uuid}
+    updates, skipped = plan_updates(load_results(args.results), job_uuids, categories, category_uuids)
+
+    with WritebackCheckpoint(args.checkpoint) as checkpoint:
+        applied = checkpoint.applied()
+        remaining = [update for update in updates if applied.get(update[0]) != update[3]]
+        print(f"📋 {len(updates)} category changes in {args.results}; {len(updates) - len(remaining)} already applied, "
+              f"{len(remaining)} to do")
+        if any(skipped.values()):
+            print(f"   Skipped {skipped['no_job_uuid']} jobs without a uuid in {args.jobs}, "
+                  f"{skipped['ambiguous_job_number']} job numbers shared by several jobs and "
+                  f"{skipped['unknown_category']} recommendations with no ServiceM8 category")
+
+        if not args.apply:
+            for job_uuid, job_number, category, category_uuid in remaining[:20]:
+                print(f"   Job {job_number} -> {category}")
+            print("Dry run; pass --apply to write these changes")
+            return
+
+        counts = asyncio.run(apply_updates(
+            checkpoint, remaining, args.api_base, args.concurrency, args.rate, args.max_attempts))
+        print(f"✅ Applied {counts['applied']} updates, {counts['failed']} failed ({counts['retries']} retries)")
+
+if __name__ == "__main__":
+    main()
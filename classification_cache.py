@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+
+from batch_classifier import classify_jobs
+
+# Jobs looked up in the cache per batch; misses in a batch are classified together
+BATCH_SIZE = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS classifications (
+    job_key TEXT PRIMARY KEY,
+    input_hash TEXT NOT NULL,
+    result TEXT NOT NULL,
+    run INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def job_key(job):
+    """Stable identity of a job: its uuid, or its job number for exports without one"""
+    return job.get('uuid') or job['generated_job_id']
+
+
+def input_hash(job):
+    """Hash of every job field the classifiers read"""
+    fields = (job.get('category_uuid') or '', job['job_description'], job.get('job_address') or '')
+    return hashlib.sha256('\x1f'.join(fields).encode('utf-8')).hexdigest()
+
+
+def _as_tuples(value):
+    if isinstance(value, list):
+        return tuple(_as_tuples(item) for item in value)
+    return value
+
+
+class ClassificationCache:
+    """SQLite cache of classification results keyed by job and classifier input
+
+    An entry is reused only when the job's description, address and category
+    hash to the same value and the cache was written by the same ruleset
+    version. A ruleset change empties the cache. Entries for jobs that were
+    not seen in a run are evicted by `prune()`.
+    """
+
+    def __init__(self, path, ruleset_version, result_type=tuple):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.result_type = result_type
+        self.hits = 0
+        self.misses = 0
+
+        stored = self._metadata('ruleset_version')
+        if stored != ruleset_version:
+            self.connection.execute("DELETE FROM classifications")
+            self._set_metadata('ruleset_version', ruleset_version)
+        self.run = int(self._metadata('last_run') or 0) + 1
+        self._set_metadata('last_run', str(self.run))
+
+    def _metadata(self, name):
+        row = self.connection.execute("SELECT value FROM metadata WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_metadata(self, name, value):
+        self.connection.execute("INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)", (name, value))
+
+    def _lookup(self, keys):
+        placeholders = ','.join('?' * len(keys))
+        rows = self.connection.execute(
+            f"SELECT job_key, input_hash, result FROM classifications WHERE job_key IN ({placeholders})", keys)
+        return {key: (stored_hash, result) for key, stored_hash, result in rows}
+
+    def classify_jobs(self, classify, jobs, workers=1):
+        """Yield (job, result) in input order, classifying only new or edited jobs
+
+        With more than one worker, one process pool classifies the misses of
+        every batch.
+        """
+        with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+            yield from self._classify_batches(classify, iter(jobs), workers, executor)
+
+    def _classify_batches(self, classify, jobs, workers, executor):
+        while True:
+            batch = list(islice(jobs, BATCH_SIZE))
+            if not batch:
+                return
+
+            keys = [job_key(job) for job in batch]
+            hashes = [input_hash(job) for job in batch]
+            # Deduplicate keys; SQLite limits the number of bound parameters per query
+            unique_keys = list(dict.fromkeys(keys))
+            stored = {}
+            for start in range(0, len(unique_keys), 500):
+                stored.update(self._lookup(unique_keys[start:start + 500]))
+
+            results = [None] * len(batch)
+            misses = []
+            for index, (key, digest) in enumerate(zip(keys, hashes)):
+                entry = stored.get(key)
+                if entry and entry[0] == digest:
+                    results[index] = self.result_type(_as_tuples(json.loads(entry[1])))
+                else:
+                    misses.append(index)
+            self.hits += len(batch) - len(misses)
+            self.misses += len(misses)
+
+            missed_jobs = (batch[index] for index in misses)
+            for index, (job, result) in zip(misses, classify_jobs(classify, missed_jobs, workers, executor=executor)):
+                results[index] = result
+
+            missed = set(misses)
+            self.connection.executemany(
+                "UPDATE classifications SET run = ? WHERE job_key = ?",
+                [(self.run, key) for index, key in enumerate(keys) if index not in missed])
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO classifications (job_key, input_hash, result, run) VALUES (?, ?, ?, ?)",
+                [(keys[index], hashes[index], json.dumps(results[index]), self.run) for index in misses])
+
+            yield from zip(batch, results)
+
+    def prune(self):
+        """Evict entries for jobs that were not seen in this run; returns the number removed"""
+        cursor = self.connection.execute("DELETE FROM classifications WHERE run != ?", (self.run,))
+        return cursor.rowcount
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
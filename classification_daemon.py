@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import os
+import stat
+import time
+
+from classification_engine import classify_job, determine_recommended_category, rules_version
+from classification_rules import CACHE_DIR, POLL_INTERVAL, RULES_PATH, RuleWatcher
+
+DEFAULT_PORT = 8765
+
+# Requests larger than this are refused rather than buffered
+MAX_BODY_BYTES = 16 * 2 ** 20
+MAX_HEADER_BYTES = 64 * 2 ** 10
+
+# Jobs classified between yields to the event loop, so a large batch does not stall other clients
+YIELD_EVERY = 256
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def result_payload(result, category_uuids):
+    """The JSON form of one ClassificationResult, with the category a new job should be filed under"""
+    recommended_category = determine_recommended_category(result.work_type, result.urgency_level)
+    return {
+        'current_category': result.current_category,
+        'work_type': result.work_type,
+        'urgency_level': result.urgency_level,
+        'property_type': result.property_type,
+        'recommended_category': recommended_category,
+        'recommended_category_uuid': category_uuids.get(recommended_category),
+        'evidence': {
+            'work_type': result.work_type_evidence,
+            'urgency_level': result.urgency_evidence,
+            'property_type': result.property_type_evidence
+        }
+    }
+
+
+def _job(value, where):
+    """The job, if it has every field the classifiers read in the type they expect"""
+    if not isinstance(value, dict) or not isinstance(value.get('job_description'), str):
+        raise RequestError(400, f"{where} must be an object with a job_description string")
+    for field in ('job_address', 'category_uuid'):
+        if value.get(field) is not None and not isinstance(value[field], str):
+            raise RequestError(400, f"{field} in {where} must be a string")
+    return value
+
+
+class ClassificationDaemon:
+    """Classifies jobs on request with rules compiled once and kept in memory
+
+    Speaks just enough HTTP/1.1 (with keep-alive) for curl, fetch and
+    http.client, over TCP or a Unix socket. POST /classify takes one job
+    object, or {"jobs": [...]} for a batch; GET /health reports the ruleset
+    in use. The rule file is watched and reloaded without a restart.
+    """
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+        self.jobs_classified = 0
+        self.requests = 0
+        self.started = time.time()
+
+    def classify(self, jobs, rules, category_uuids):
+        return [result_payload(classify_job(job, rules), category_uuids) for job in jobs]
+
+    async def handle_classify(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError as error:
+            raise RequestError(400, f"Invalid JSON: {error}") from None
+
+        # One rules reference per request, so a reload never splits a batch across rulesets
+        rules = self.watcher.rules['job_dimensions']
+        category_uuids = {name: uuid for uuid, name in rules.category_map.items() if uuid}
+
+        if isinstance(payload, dict) and 'jobs' in payload:
+            if not isinstance(payload['jobs'], list):
+                raise RequestError(400, "jobs must be a list")
+            jobs = [_job(job, f"jobs[{index}]") for index, job in enumerate(payload['jobs'])]
+            results = []
+            for start in range(0, len(jobs), YIELD_EVERY):
+                results.extend(self.classify(jobs[start:start + YIELD_EVERY], rules, category_uuids))
+                await asyncio.sleep(0)
+            self.jobs_classified += len(jobs)
+            return {'ruleset_version': rules_version(rules), 'results': results}
+
+        (result,) = self.classify([_job(payload, "Request body")], rules, category_uuids)
+        self.jobs_classified += 1
+        return {'ruleset_version': rules_version(rules), 'result': result}
+
+    def health(self):
+        rules = self.watcher.rules
+        return {
+            'status': 'ok',
+            'ruleset_version': rules_version(rules['job_dimensions']),
+            'rules_file': self.watcher.path,
+            'rules_file_version': rules.version,
+            'rules_error': str(self.watcher.error) if self.watcher.error else None,
+            'requests': self.requests,
+            'jobs_classified': self.jobs_classified,
+            'uptime_seconds': round(time.time() - self.started, 1)
+        }
+
+    async def respond(self, method, path, headers, body):
+        if path == '/health':
+            if method != 'GET':
+                raise RequestError(405, "Use GET for /health")
+            return self.health()
+        if path != '/classify':
+            raise RequestError(404, f"No such endpoint: {path}")
+        if method != 'POST':
+            raise RequestError(405, "Use POST for /classify")
+        if 'content-length' not in headers:
+            raise RequestError(411, "Content-Length is required")
+        return await self.handle_classify(body)
+
+    async def read_body(self, headers, reader):
+        """Read a request body; chunked bodies are not supported"""
+        if 'transfer-encoding' in headers:
+            raise RequestError(411, "Send the body with a Content-Length")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise RequestError(400, "Invalid Content-Length") from None
+        if length > MAX_BODY_BYTES:
+            raise RequestError(413, f"Request body over {MAX_BODY_BYTES} bytes")
+        return await reader.readexactly(length) if length > 0 else b''
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, 413, {'error': "Request headers too large"}, keep_alive=False)
+                    break
+                except asyncio.IncompleteReadError:
+                    break
+
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = request_line.split()
+                except ValueError:
+                    await self.send(writer, 400, {'error': "Malformed request line"}, keep_alive=False)
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, separator, value = line.partition(':')
+                    if separator:
+                        headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                self.requests += 1
+                try:
+                    body = await self.read_body(headers, reader)
+                except RequestError as error:
+                    # The unread body would be taken for the next request, so the connection ends here
+                    await self.send(writer, error.status, {'error': str(error)}, keep_alive=False)
+                    break
+                try:
+                    status, payload = 200, await self.respond(method, target.split('?', 1)[0], headers, body)
+                except RequestError as error:
+                    status, payload = error.status, {'error': str(error)}
+                except Exception as error:
+                    # A bug in classifying one request must not take the connection down without a reply
+                    print(f"Error handling {method} {target}: {error!r}")
+                    status, payload = 500, {'error': "Internal error while classifying"}
+                await self.send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    async def watch_rules(self, interval):
+        """Check the rule file periodically, compiling changes off the event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            if await loop.run_in_executor(None, self.watcher.check):
+                print(f"Reloaded {self.watcher.path}: ruleset {rules_version(self.watcher.rules['job_dimensions'])}")
+
+
+async def serve(daemon, host, port, unix_path, watch_interval):
+    if unix_path:
+        # Clear a socket left behind by an earlier run, but never any other kind of file
+        if os.path.exists(unix_path) and stat.S_ISSOCK(os.stat(unix_path).st_mode):
+            os.remove(unix_path)
+        server = await asyncio.start_unix_server(daemon.serve_connection, unix_path, limit=MAX_HEADER_BYTES)
+        address = f"unix:{unix_path}"
+    else:
+        server = await asyncio.start_server(daemon.serve_connection, host, port, limit=MAX_HEADER_BYTES)
+        address = f"http://{host}:{port}"
+
+    if watch_interval:
+        asyncio.get_running_loop().create_task(daemon.watch_rules(watch_interval))
+    print(f"Classifying with ruleset {rules_version(daemon.watcher.rules['job_dimensions'])} at {address}")
+    print('  POST /classify with a job, or {"jobs": [...]} for a batch; GET /health for the ruleset in use')
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument('--rules', default=RULES_PATH, help="Rule file to classify with")
+    parser.add_argument('--watch-interval', type=float, default=POLL_INTERVAL,
+                        help="Seconds between checks of the rule file for changes (0 disables reloading)")
+    args = parser.parse_args()
+
+    daemon = ClassificationDaemon(RuleWatcher(args.rules, CACHE_DIR))
+    try:
+        asyncio.run(serve(daemon, args.host, args.port, args.unix, args.watch_interval))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
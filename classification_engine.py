@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+from collections import namedtuple
+
+from classification_rules import load_rules
+from keyword_matcher import ruleset_version
+
+# Keyword tables, tier order, fallbacks and the category mapping live in
+# classification_rules.json, compiled once per edit and cached on disk
+RULES = load_rules()['job_dimensions']
+
+CATEGORY_MAP = RULES.category_map
+
+# Tiers are checked in priority order; the first tier with a keyword hit wins
+WORK_TYPE_TIERS = RULES.tiers['work_type']
+URGENCY_TIERS = RULES.tiers['urgency']
+PROPERTY_TYPE_TIERS = RULES.tiers['property_type']
+
+# Built once and shared by every dimension
+KEYWORD_MATCHER = RULES.matcher
+
+# Bump ENGINE_REVISION when the classification logic below changes
+ENGINE_REVISION = 2
+
+def rules_version(rules):
+    """Version of the results classify_job produces with the given rules"""
+    return ruleset_version(ENGINE_REVISION, rules.version)
+
+# Changes whenever a keyword, tier order, fallback or category mapping changes
+RULESET_VERSION = rules_version(RULES)
+
+# One job's labels plus the keywords that decided each of them
+ClassificationResult = namedtuple('ClassificationResult', [
+    'current_category', 'work_type', 'urgency_level', 'property_type',
+    'work_type_evidence', 'urgency_evidence', 'property_type_evidence'
+])
+
+def classify_work_type(desc_hits, desc_keywords, rules=RULES):
+    """Work type and its evidence from the description scan; default to Electrical for electrical work"""
+    work_type, evidence = rules.first_match(desc_hits, desc_keywords, 'work_type')
+    return work_type or rules.fallback('work_type'), evidence
+
+def classify_urgency(desc_hits, desc_keywords, current_category, rules=RULES):
+    """Urgency level and its evidence from the description scan
+
+    Emergency first, then Make Safe and other urgent indicators, then planned
+    and standard work, then a default based on current category.
+    """
+    urgency_level, evidence = rules.first_match(desc_hits, desc_keywords, 'urgency')
+    return urgency_level or rules.fallback('urgency', current_category), evidence
+
+def classify_property_type(desc_lower, address_lower, rules=RULES):
+    """Property type and its evidence from the description and address
+
+    Jobs without any indicator (sheds, home assist programs, make safes at
+    homes) default to residential.
+    """
+    joined_keywords = rules.matcher.scan_joined_keywords(desc_lower, address_lower)
+    property_type, evidence = rules.first_match(rules.matcher.hits_for(joined_keywords), joined_keywords, 'property_type')
+    return property_type or rules.fallback('property_type'), evidence
+
+def classify_job(job, rules=RULES):
+    """Classify a job's work type, urgency and property type from a single scan of its text
+
+    Pass `rules` (a ruleset compiled from a rule file) to classify with rules
+    other than the ones loaded at import, e.g. after a RuleWatcher reload.
+    """
+    current_category = rules.current_category(job)
+
+    # Normalise once; the description scan is shared by all three dimensions
+    desc_lower = job['job_description'].lower()
+    address_lower = (job.get('job_address') or '').lower()
+    desc_keywords = rules.matcher.scan_keywords(desc_lower)
+    desc_hits = rules.matcher.scan(desc_lower)
+
+    work_type, work_type_evidence = classify_work_type(desc_hits, desc_keywords, rules)
+    urgency_level, urgency_evidence = classify_urgency(desc_hits, desc_keywords, current_category, rules)
+    property_type, property_type_evidence = classify_property_type(desc_lower, address_lower, rules)
+
+    return ClassificationResult(
+        current_category, work_type, urgency_level, property_type,
+        work_type_evidence, urgency_evidence, property_type_evidence
+    )
+
+def classify_scanned(current_category, desc_keywords, joined_keywords, rules=RULES):
+    """Classify from keywords already found in the description and in the description joined with the address
+
+    The keywords may come from any matcher whose vocabulary includes the
+    rules' keywords (e.g. one scan shared by several rulesets); the rest are
+    ignored. Gives the same result as classify_job.
+    """
+    vocabulary = rules.matcher.groups
+    desc_keywords = desc_keywords.intersection(vocabulary)
+    joined_keywords = joined_keywords.intersection(vocabulary)
+    desc_hits = rules.matcher.hits_for(desc_keywords)
+
+    work_type, work_type_evidence = classify_work_type(desc_hits, desc_keywords, rules)
+    urgency_level, urgency_evidence = classify_urgency(desc_hits, desc_keywords, current_category, rules)
+    property_type, property_type_evidence = rules.first_match(
+        rules.matcher.hits_for(joined_keywords), joined_keywords, 'property_type')
+
+    return ClassificationResult(
+        current_category, work_type, urgency_level, property_type or rules.fallback('property_type'),
+        work_type_evidence, urgency_evidence, property_type_evidence
+    )
+
+def determine_recommended_category(work_type, urgency_level):
+    """Determine recommended ServiceM8 category based on work type and urgency"""
+
+    # Priority mapping based on work type
+    if work_type == "Make Safe":
+        return "Make Safe"
+    elif work_type == "Level Two":
+        return "Level Two"
+    elif work_type == "Solar/Battery":
+        return "Solar, Battery, Standalone"
+    elif work_type == "Admin":
+        return "Admin office time & Quotes"
+    elif work_type == "Security/CCTV":
+        return "Security, CCTV, Access control"
+    elif work_type == "Data/Phone":
+        return "Data, Phone"
+    elif work_type == "Air Conditioning":
+        return "AC install"
+    elif work_type == "Electrical":
+        # All electrical work goes to Electrical category regardless of urgency
+        # (urgency is now tracked separately in urgency_level field)
+        return "Electrical"
+    else:
+        return "Electrical"
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+
+import keyword_matcher
+from keyword_matcher import KeywordMatcher, is_pattern, ruleset_version, tier_groups
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The rule file every classifier loads unless CLASSIFICATION_RULES names another one
+RULES_PATH = os.environ.get('CLASSIFICATION_RULES') or os.path.join(MODULE_DIR, 'classification_rules.json')
+
+# Compiled rules are cached here, keyed by the rule file's content hash
+CACHE_DIR = os.path.join(MODULE_DIR, '.rule_cache')
+
+# Compiled rule files kept in the cache; older ones are evicted
+MAX_CACHED_RULES = 16
+
+# Seconds between checks of the rule file by RuleWatcher
+POLL_INTERVAL = 2.0
+
+
+class CompiledRuleset:
+    """One ruleset of a rule file, compiled into a single shared KeywordMatcher
+
+    A ruleset has one or more dimensions. Each dimension has tiers, checked
+    in the order they are listed (the first tier with a keyword hit wins),
+    and a fallback used when no tier matches: either a label, or labels by
+    the job's current category with a default.
+    """
+
+    def __init__(self, name, category_map, dimensions):
+        self.name = name
+        self.category_map = category_map
+        self.tiers = {dimension: tiers for dimension, (tiers, fallback) in dimensions.items()}
+        self.fallbacks = {dimension: fallback for dimension, (tiers, fallback) in dimensions.items()}
+        self.matcher = KeywordMatcher(
+            [group for dimension, tiers in self.tiers.items() for group in tier_groups(dimension, tiers)])
+        self.version = ruleset_version(category_map, self.tiers, self.fallbacks)
+
+    def current_category(self, job):
+        return self.category_map.get(job.get('category_uuid', ''), 'Unknown')
+
+    def first_match(self, hits, keywords, dimension):
+        """Return the highest priority tier label present in the hits and the keywords that fired it"""
+        return self.matcher.first_tier_match(hits, keywords, dimension, self.tiers[dimension])
+
+    def fallback(self, dimension, current_category=None):
+        """Label for a job that no tier of the dimension matched"""
+        fallback = self.fallbacks[dimension]
+        if isinstance(fallback, str):
+            return fallback
+        return fallback['by_current_category'].get(current_category, fallback['default'])
+
+
+class CompiledRules:
+    """Every ruleset of one rule file, with the file's version and content hash"""
+
+    def __init__(self, version, source_hash, rulesets):
+        self.version = version
+        self.source_hash = source_hash
+        self.rulesets = rulesets
+
+    def __getitem__(self, name):
+        return self.rulesets[name]
+
+
+def _keywords(value, tables, where):
+    if isinstance(value, str):
+        if value not in tables:
+            raise ValueError(f"{where}: unknown keyword table {value!r}")
+        value = tables[value]
+    if not isinstance(value, list) or not all(isinstance(keyword, str) and keyword for keyword in value):
+        raise ValueError(f"{where}: keywords must be a table name or a list of non-empty strings")
+    for keyword in value:
+        if is_pattern(keyword):
+            try:
+                re.compile(keyword)
+            except re.error as error:
+                raise ValueError(f"{where}: invalid keyword pattern {keyword!r}: {error}") from None
+    return value
+
+
+def _fallback(value, where):
+    if isinstance(value, str):
+        return value
+    if (isinstance(value, dict) and isinstance(value.get('default'), str)
+            and isinstance(value.get('by_current_category', {}), dict)):
+        return {'by_current_category': value.get('by_current_category', {}), 'default': value['default']}
+    raise ValueError(f"{where}: fallback must be a label or {{'by_current_category': {{...}}, 'default': label}}")
+
+
+def compile_rules(rules, source_hash=''):
+    """Validate a parsed rule file and compile each of its rulesets"""
+    if not isinstance(rules, dict) or not isinstance(rules.get('rulesets'), dict):
+        raise ValueError("Rule file must be an object with a 'rulesets' object")
+    category_map = rules.get('category_map', {})
+
+    rulesets = {}
+    for name, ruleset in rules['rulesets'].items():
+        tables = ruleset.get('keyword_tables', {})
+        dimensions = {}
+        for dimension, spec in ruleset.get('dimensions', {}).items():
+            where = f"{name}.{dimension}"
+            tiers = []
+            for index, tier in enumerate(spec.get('tiers', [])):
+                if not isinstance(tier, dict) or not isinstance(tier.get('label'), str):
+                    raise ValueError(f"{where} tier {index}: missing label")
+                tiers.append((tier['label'], _keywords(tier.get('keywords'), tables, f"{where} tier {index}")))
+            if 'fallback' not in spec:
+                raise ValueError(f"{where}: missing fallback")
+            dimensions[dimension] = (tiers, _fallback(spec['fallback'], where))
+        if not dimensions:
+            raise ValueError(f"{name}: no dimensions")
+        rulesets[name] = CompiledRuleset(name, category_map, dimensions)
+
+    return CompiledRules(rules.get('version'), source_hash, rulesets)
+
+
+def _compiler_hash():
+    """Hash of the code that builds compiled rules, so a code change invalidates the cache"""
+    digest = hashlib.sha256()
+    for module_path in (keyword_matcher.__file__, __file__):
+        with open(module_path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _write_cache(cache_path, rules):
+    """Write a compiled rules file atomically and evict the oldest entries; the cache is best-effort"""
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=cache_dir, suffix='.tmp', delete=False) as f:
+            pickle.dump(rules, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, cache_path)
+
+        entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.pickle')]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for stale in entries[MAX_CACHED_RULES:]:
+            os.remove(stale)
+    except OSError:
+        pass
+
+
+def load_rules(path=RULES_PATH, cache_dir=CACHE_DIR):
+    """Load a rule file, reusing its compiled form from `cache_dir` when the content is unchanged
+
+    Raises ValueError (json.JSONDecodeError included) for an invalid rule file.
+    Pass cache_dir=None to always compile.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    source_hash = hashlib.sha256(content).hexdigest()
+
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"{source_hash[:32]}-{_compiler_hash()}.pickle")
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            # Missing, truncated or unreadable entries are simply compiled again
+            pass
+
+    rules = compile_rules(json.loads(content), source_hash)
+    if cache_path:
+        _write_cache(cache_path, rules)
+    return rules
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class RuleWatcher:
+    """Keep a long-running process on the latest compiled rules of a rule file
+
+    `rules` always refers to a complete CompiledRules. A reload compiles the
+    new file to the side and swaps the reference in one assignment, so a
+    reader that takes `watcher.rules` once per job or batch never sees a
+    half-built ruleset. A rule file that fails to parse or compile is
+    reported and the previous rules stay in place.
+    """
+
+    def __init__(self, path=RULES_PATH, cache_dir=CACHE_DIR, on_reload=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.on_reload = on_reload
+        self.signature = _signature(path)
+        self.rules = load_rules(path, cache_dir)
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def check(self):
+        """Reload the rules if the file has changed; returns True when new rules were swapped in"""
+        signature = _signature(self.path)
+        if signature == self.signature:
+            return False
+        self.signature = signature
+
+        try:
+            rules = load_rules(self.path, self.cache_dir)
+        except (OSError, ValueError) as error:
+            self.error = error
+            print(f"Keeping the current rules; {self.path} could not be loaded: {error}", file=sys.stderr)
+            return False
+        self.error = None
+        if rules.source_hash == self.rules.source_hash:
+            return False
+
+        self.rules = rules
+        if self.on_reload:
+            self.on_reload(rules)
+        return True
+
+    def start(self, interval=POLL_INTERVAL):
+        """Check the file every `interval` seconds on a daemon thread"""
+        def poll():
+            while not self.stopped.wait(interval):
+                self.check()
+
+        self.thread = threading.Thread(target=poll, name='rule-watcher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and compile a classification rule file")
+    parser.add_argument('path', nargs='?', default=RULES_PATH)
+    parser.add_argument('--no-cache', action='store_true', help="Compile without reading or writing the cache")
+    args = parser.parse_args()
+
+    try:
+        rules = load_rules(args.path, None if args.no_cache else CACHE_DIR)
+    except ValueError as error:
+        sys.exit(f"{args.path}: {error}")
+
+    print(f"{args.path}: version {rules.version}, content {rules.source_hash[:12]}")
+    for name, ruleset in rules.rulesets.items():
+        print(f"  {name} (ruleset {ruleset.version})")
+        for dimension, tiers in ruleset.tiers.items():
+            keywords = sum(len(keywords) for label, keywords in tiers)
+            print(f"    {dimension}: {len(tiers)} tiers, {keywords} keywords, "
+                  f"fallback {json.dumps(ruleset.fallbacks[dimension])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+
+import classification_engine
+from crosstab import crosstab
+from job_reader import iter_jobs
+from job_table import JobTable
+from learned_classifier import BATCH_SIZE, INFERENCE_BACKEND, LearnedClassifier
+from result_formats import write_rows
+from synthetic_jobs import SyntheticJobGenerator, write_csv
+
+DATASETS = ['company_jobs_array.json', 'all_jobs.csv']
+
+# Synthetic corpus sizes for the pipeline benchmark
+PIPELINE_SIZES = [10000, 100000, 1000000]
+
+# Pipeline stages in the order they run for each job
+STAGES = ['load', 'normalise', 'scan', 'classify_work_type', 'classify_urgency',
+          'classify_property_type', 'aggregate', 'serialise']
+
+def load_jobs(path):
+    """Load jobs from a JSON array export or a CSV export (held in memory so every round sees the same list)"""
+    return list(iter_jobs(path))
+
+def literal_first_tier(text, tiers):
+    """The original per-keyword `in` scan, tier by tier (regex-style keywords never match)"""
+    for label, keywords in tiers:
+        if any(keyword in text for keyword in keywords):
+            return label
+    return None
+
+def classify_with_literal_scan(job):
+    desc_lower = job['job_description'].lower()
+    address_lower = job.get('job_address', '').lower()
+    combined = f"{desc_lower} {address_lower}"
+    return (
+        literal_first_tier(desc_lower, classification_engine.WORK_TYPE_TIERS) or "Electrical",
+        literal_first_tier(desc_lower, classification_engine.URGENCY_TIERS) or "Standard",
+        literal_first_tier(combined, classification_engine.PROPERTY_TYPE_TIERS) or "Residential"
+    )
+
+def classify_with_engine(job):
+    return classification_engine.classify_job(job)
+
+def best_times(classifiers, jobs, rounds=9):
+    """Best wall-clock time of a full pass over the jobs for each classifier
+
+    Rounds alternate between the classifiers so that background load on the
+    machine affects them equally.
+    """
+    timings = [[] for _ in classifiers]
+    for _ in range(rounds):
+        for index, classify in enumerate(classifiers):
+            start = time.perf_counter()
+            for job in jobs:
+                classify(job)
+            timings[index].append(time.perf_counter() - start)
+    return [min(times) for times in timings]
+
+def compare_classifiers():
+    print(f"{'Dataset':<28}{'Jobs':>8}{'Literal scan':>15}{'Engine':>12}{'Speed-up':>10}")
+    for path in DATASETS:
+        jobs = load_jobs(path)
+        literal_time, engine_time = best_times([classify_with_literal_scan, classify_with_engine], jobs)
+        print(f"{path:<28}{len(jobs):>8}{literal_time * 1000:>13.1f}ms{engine_time * 1000:>10.1f}ms"
+              f"{literal_time / engine_time:>9.2f}x")
+
+def run_pipeline(path, output_dir):
+    """Stream a corpus through the classification pipeline, timing every stage
+
+    Runs in its own process so that peak RSS belongs to this corpus alone.
+    """
+    rules = classification_engine.RULES
+    matcher = rules.matcher
+    stages = dict.fromkeys(STAGES, 0.0)
+    table = JobTable(
+        categorical=['current_category', 'work_type', 'urgency_level', 'property_type', 'status'],
+        fields=['job_number', 'job_description', 'amount'],
+        numeric=['amount_value']
+    )
+    perf_counter = time.perf_counter
+    jobs = iter_jobs(path)
+
+    while True:
+        start = perf_counter()
+        job = next(jobs, None)
+        loaded = perf_counter()
+        stages['load'] += loaded - start
+        if job is None:
+            break
+
+        # The engine's own stage functions on one shared scan, as ClassifierMetrics.classify_job runs them
+        current_category = rules.current_category(job)
+        desc_lower = job['job_description'].lower()
+        address_lower = (job.get('job_address') or '').lower()
+        normalised = perf_counter()
+        desc_keywords = matcher.scan_keywords(desc_lower)
+        desc_hits = matcher.scan(desc_lower)
+        scanned = perf_counter()
+        work_type, _ = classification_engine.classify_work_type(desc_hits, desc_keywords, rules)
+        work_typed = perf_counter()
+        urgency_level, _ = classification_engine.classify_urgency(desc_hits, desc_keywords, current_category, rules)
+        urgency_classified = perf_counter()
+        property_type, _ = classification_engine.classify_property_type(desc_lower, address_lower, rules)
+        classified = perf_counter()
+        table.append(
+            job_number=job['generated_job_id'],
+            current_category=current_category,
+            work_type=work_type,
+            urgency_level=urgency_level,
+            property_type=property_type,
+            status=job['status'],
+            job_description=job['job_description'],
+            amount=job['total_invoice_amount'],
+            amount_value=float(job['total_invoice_amount'] or 0)
+        )
+        appended = perf_counter()
+
+        stages['normalise'] += normalised - loaded
+        stages['scan'] += scanned - normalised
+        stages['classify_work_type'] += work_typed - scanned
+        stages['classify_urgency'] += urgency_classified - work_typed
+        stages['classify_property_type'] += classified - urgency_classified
+        stages['aggregate'] += appended - classified
+
+    start = perf_counter()
+    crosstab(table, 'work_type', weights='amount_value')
+    crosstab(table, 'urgency_level')
+    crosstab(table, 'property_type')
+    crosstab(table, ['work_type', 'urgency_level', 'property_type']).top(20)
+    stages['aggregate'] += perf_counter() - start
+
+    start = perf_counter()
+    write_rows(os.path.join(output_dir, 'results'), map(table.row, range(len(table))), 'ndjson')
+    stages['serialise'] += perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    return len(table), stages, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def benchmark_pipeline(sizes, source, seed):
+    """Generate each synthetic corpus, run the pipeline over it in a fresh process, and report"""
+    generator = SyntheticJobGenerator(source, seed)
+    results = []
+    print(f"{'Jobs':>10}{'Total':>10}{'Jobs/sec':>12}{'Peak RSS':>12}  Slowest stages")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for size in sizes:
+            path = os.path.join(output_dir, 'jobs.csv')
+            write_csv(path, generator.jobs(size))
+            # A spawned (not forked) process does not inherit the generator's memory
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                jobs, stages, peak_rss = executor.submit(run_pipeline, path, output_dir).result()
+            os.remove(path)
+
+            total = sum(stages.values())
+            slowest = sorted(stages.items(), key=lambda item: item[1], reverse=True)[:3]
+            print(f"{jobs:>10}{total:>9.2f}s{jobs / total:>12.0f}{peak_rss / 2 ** 20:>10.1f}MB  "
+                  + ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in slowest))
+            results.append({
+                'jobs': jobs,
+                'total_seconds': round(total, 4),
+                'jobs_per_second': round(jobs / total, 1),
+                'peak_rss_bytes': peak_rss,
+                'stage_seconds': {stage: round(seconds, 4) for stage, seconds in stages.items()}
+            })
+    return results
+
+def benchmark_learned(model_path, sizes, source, seed):
+    """Throughput of the keyword engine and of batched learned inference over the same synthetic jobs
+
+    Jobs are generated in batches, so a million-job run needs no more
+    memory than one batch; generation is not timed.
+    """
+    classifier = LearnedClassifier.load(model_path)
+    generator = SyntheticJobGenerator(source, seed)
+    results = []
+    print(f"Learned inference backend: {INFERENCE_BACKEND}, {BATCH_SIZE} jobs per batch")
+    print(f"{'Jobs':>10}{'Engine':>12}{'Jobs/sec':>12}{'Model':>12}{'Jobs/sec':>12}")
+    for size in sizes:
+        jobs = generator.jobs(size)
+        engine_time = model_time = 0.0
+        while True:
+            batch = list(islice(jobs, BATCH_SIZE))
+            if not batch:
+                break
+            start = time.perf_counter()
+            for job in batch:
+                classification_engine.classify_job(job)
+            engine_time += time.perf_counter() - start
+            start = time.perf_counter()
+            for dimension in classifier.models:
+                classifier.predict(batch, dimension)
+            model_time += time.perf_counter() - start
+
+        print(f"{size:>10}{engine_time:>11.2f}s{size / engine_time:>12.0f}{model_time:>11.2f}s{size / model_time:>12.0f}")
+        results.append({
+            'jobs': size,
+            'engine_seconds': round(engine_time, 4),
+            'engine_jobs_per_second': round(size / engine_time, 1),
+            'model_seconds': round(model_time, 4),
+            'model_jobs_per_second': round(size / model_time, 1)
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Benchmark the full pipeline on synthetic corpora instead of comparing classifiers")
+    parser.add_argument('--learned', metavar='MODEL',
+                        help="Compare the keyword engine with batched inference of this learned model on "
+                             "synthetic corpora instead")
+    parser.add_argument('--sizes', type=int, nargs='+', default=PIPELINE_SIZES)
+    parser.add_argument('--source', default='all_jobs.csv', help="Real export the synthetic jobs are sampled from")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='classifier_benchmark_results.ndjson',
+                        help="File each pipeline run is appended to, one JSON record per line")
+    args = parser.parse_args()
+
+    if not args.pipeline and not args.learned:
+        compare_classifiers()
+        return
+
+    record = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'ruleset_version': classification_engine.RULESET_VERSION,
+        'seed': args.seed
+    }
+    if args.learned:
+        record.update(learned_model=args.learned, inference_backend=INFERENCE_BACKEND,
+                      runs=benchmark_learned(args.learned, args.sizes, args.source, args.seed))
+    else:
+        record['runs'] = benchmark_pipeline(args.sizes, args.source, args.seed)
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    print(f"\nAppended results to {args.output}")
+
+if __name__ == "__main__":
+    main()
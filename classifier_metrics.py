@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+import json
+import math
+import time
+from collections import Counter
+
+from classification_engine import (RULES, ClassificationResult, classify_property_type, classify_urgency,
+                                   classify_work_type)
+
+# Upper bounds (seconds) of the per-job latency histogram buckets
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, math.inf)
+
+STAGES = ['normalise', 'scan', 'work_type', 'urgency', 'property_type']
+
+DIMENSIONS = ['work_type', 'urgency', 'property_type']
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+class ClassifierMetrics:
+    """Opt-in instrumentation for classification_engine
+
+    `classify_job` takes the same arguments as classification_engine.classify_job
+    and times the engine's own per-dimension functions, so the uninstrumented
+    path carries no checks at all; callers switch by choosing which function
+    to call. Jobs are classified with `rules` unless a call passes others,
+    which then become the rules reported on. It records how many jobs each
+    keyword matched, which tier decided each dimension, time per stage (the
+    three dimensions share one keyword scan, so tiers are timed per
+    dimension) and a per-job latency histogram.
+    """
+
+    def __init__(self, rules=RULES):
+        self.rules = rules
+        self.jobs = 0
+        self.keyword_hits = Counter()
+        self.address_keyword_hits = Counter()
+        self.tier_decisions = Counter()
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.latency_counts = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+
+    def classify_job(self, job, rules=None):
+        rules = self.rules = rules or self.rules
+        matcher = rules.matcher
+        perf_counter = time.perf_counter
+
+        start = perf_counter()
+        current_category = rules.current_category(job)
+        desc_lower = job['job_description'].lower()
+        address_lower = (job.get('job_address') or '').lower()
+        normalised = perf_counter()
+        desc_keywords = matcher.scan_keywords(desc_lower)
+        desc_hits = matcher.scan(desc_lower)
+        scanned = perf_counter()
+        work_type, work_type_evidence = classify_work_type(desc_hits, desc_keywords, rules)
+        work_typed = perf_counter()
+        urgency_level, urgency_evidence = classify_urgency(desc_hits, desc_keywords, current_category, rules)
+        urgency_classified = perf_counter()
+        property_type, property_type_evidence = classify_property_type(desc_lower, address_lower, rules)
+        finished = perf_counter()
+
+        stages = self.stage_seconds
+        stages['normalise'] += normalised - start
+        stages['scan'] += scanned - normalised
+        stages['work_type'] += work_typed - scanned
+        stages['urgency'] += urgency_classified - work_typed
+        stages['property_type'] += finished - urgency_classified
+
+        latency = finished - start
+        self.latency_sum += latency
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.latency_counts[index] += 1
+                break
+
+        # Outside the timed region; property type is matched against the description and address
+        self.jobs += 1
+        self.keyword_hits.update(desc_keywords)
+        self.address_keyword_hits.update(matcher.scan_joined_keywords(desc_lower, address_lower))
+        self.tier_decisions.update([
+            ('work_type', work_type), ('urgency', urgency_level), ('property_type', property_type)])
+
+        return ClassificationResult(
+            current_category, work_type, urgency_level, property_type,
+            work_type_evidence, urgency_evidence, property_type_evidence
+        )
+
+    def _tier_keyword_hits(self):
+        """Yield (dimension, tier index, tier label, keyword, jobs matched) for every keyword in the tables"""
+        for dimension in DIMENSIONS:
+            hits = self.address_keyword_hits if dimension == 'property_type' else self.keyword_hits
+            for index, (label, keywords) in enumerate(self.rules.tiers[dimension]):
+                for keyword in keywords:
+                    yield dimension, index, label, keyword, hits[keyword.lower()]
+
+    def report(self):
+        """Metrics as a JSON-serialisable dict, including the keywords that never matched"""
+        keywords = {}
+        dead_keywords = []
+        for dimension, index, label, keyword, hits in self._tier_keyword_hits():
+            tier = keywords.setdefault(dimension, {}).setdefault(f"{index}: {label}", {})
+            tier[keyword] = hits
+            if not hits:
+                dead_keywords.append({'dimension': dimension, 'tier': label, 'keyword': keyword})
+
+        cumulative = 0
+        histogram = {}
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_counts):
+            cumulative += count
+            histogram['+Inf' if bound == math.inf else repr(bound)] = cumulative
+
+        return {
+            'jobs': self.jobs,
+            'stage_seconds': {stage: round(seconds, 6) for stage, seconds in self.stage_seconds.items()},
+            'job_latency_seconds': {
+                'sum': round(self.latency_sum, 6),
+                'mean': round(self.latency_sum / self.jobs, 9) if self.jobs else 0,
+                'cumulative_buckets': histogram
+            },
+            'tier_decisions': {f"{dimension}: {label}": count
+                               for (dimension, label), count in self.tier_decisions.most_common()},
+            'keyword_hits': keywords,
+            'dead_keywords': dead_keywords
+        }
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            '# HELP classifier_jobs_total Jobs classified with instrumentation enabled.',
+            '# TYPE classifier_jobs_total counter',
+            f'classifier_jobs_total {self.jobs}',
+            '# HELP classifier_stage_seconds_total Time spent per classification stage.',
+            '# TYPE classifier_stage_seconds_total counter'
+        ]
+        lines += [f'classifier_stage_seconds_total{_labels(stage=stage)} {seconds!r}'
+                  for stage, seconds in self.stage_seconds.items()]
+
+        lines += ['# HELP classifier_tier_decisions_total Jobs whose dimension was decided by each label.',
+                  '# TYPE classifier_tier_decisions_total counter']
+        lines += [f'classifier_tier_decisions_total{_labels(dimension=dimension, label=label)} {count}'
+                  for (dimension, label), count in sorted(self.tier_decisions.items())]
+
+        lines += ['# HELP classifier_keyword_hits_total Jobs in which each keyword matched.',
+                  '# TYPE classifier_keyword_hits_total counter']
+        lines += [f'classifier_keyword_hits_total{_labels(dimension=dimension, tier=index, label=label, keyword=keyword)} {hits}'
+                  for dimension, index, label, keyword, hits in self._tier_keyword_hits()]
+
+        lines += ['# HELP classifier_job_latency_seconds Classification latency per job.',
+                  '# TYPE classifier_job_latency_seconds histogram']
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_counts):
+            cumulative += count
+            le = '+Inf' if bound == math.inf else repr(bound)
+            lines.append(f'classifier_job_latency_seconds_bucket{_labels(le=le)} {cumulative}')
+        lines.append(f'classifier_job_latency_seconds_sum {self.latency_sum!r}')
+        lines.append(f'classifier_job_latency_seconds_count {self.jobs}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the JSON report to `path` and the Prometheus metrics next to it with a .prom extension"""
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        prometheus_path = (path[:-5] if path.endswith('.json') else path) + '.prom'
+        with open(prometheus_path, 'w') as f:
+            f.write(self.prometheus())
+        return prometheus_path
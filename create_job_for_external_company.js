@@ -12,6 +12,9 @@ const SERVICEM8_API_BASE = 'https://api.servicem8.com/api_1.0';
 const EMAIL = 'YOUR_SERVICEM8_EMAIL@example.com';        // UPDATE THIS
 const PASSWORD = 'YOUR_SERVICEM8_PASSWORD';              // UPDATE THIS
 
+// Optional classification daemon (python3 classification_daemon.py) that suggests a category
+const CLASSIFIER_URL = process.env.CLASSIFIER_URL || 'http://127.0.0.1:8765';
+
 // Helper function to get authentication headers
 function getAuthHeaders() {
   const credentials = btoa(`${EMAIL}:${PASSWORD}`);
@@ -67,6 +70,37 @@ function loadJobTemplate() {
   }
 }
 
+// Function to fill in a suggested category when the template has none
+async function suggestCategory(jobData) {
+  if (jobData.category_uuid) {
+    return;
+  }
+
+  try {
+    const response = await fetch(`${CLASSIFIER_URL}/classify`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ job_description: jobData.job_description, job_address: jobData.job_address }),
+      signal: AbortSignal.timeout(2000)
+    });
+
+    if (!response.ok) {
+      throw new Error(`${response.status} - ${await response.text()}`);
+    }
+
+    const { result } = await response.json();
+    console.log(`🏷️  Suggested category: ${result.recommended_category} ` +
+                `(${result.work_type}, ${result.urgency_level}, ${result.property_type})`);
+    if (result.recommended_category_uuid) {
+      jobData.category_uuid = result.recommended_category_uuid;
+    }
+
+  } catch (error) {
+    // The classifier is optional; without it the job is created uncategorised as before
+    console.log(`⚠️  No category suggestion (classifier unavailable: ${error.message})`);
+  }
+}
+
 // Function to create the job
 async function createJob(jobData) {
   try {
@@ -158,6 +192,9 @@ async function createJobWithContacts() {
     // Step 1: Load and validate template
     const jobData = loadJobTemplate();
 
+    // Suggest a category if the template does not set one
+    await suggestCategory(jobData);
+
     // Step 2: Create the job
     const jobUuid = await createJob(jobData);
 
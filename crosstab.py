@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+from collections import Counter
+
+# NumPy is optional: with it cells are tallied with bincount, without it with Counter
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class CrossTab:
+    """Counts (and optional weight sums) per cell of one or more categorical columns
+
+    Cells are keyed by value for a single column and by a tuple of values
+    for several, in the order they first appear among the visited rows.
+    """
+
+    def __init__(self, counts, sums=None):
+        self.counts = counts
+        self.sums = sums
+
+    def top(self, limit=None):
+        """Cells by descending count; ties keep first-appearance order"""
+        ranked = dict(sorted(self.counts.items(), key=lambda item: item[1], reverse=True))
+        return dict(list(ranked.items())[:limit]) if limit is not None else ranked
+
+    def percentages(self, total=None):
+        """Share of the rows in each cell, as a percentage rounded to one decimal place"""
+        total = total if total is not None else sum(self.counts.values())
+        return {cell: round(count / total * 100, 1) for cell, count in self.counts.items()}
+
+    def rounded_sums(self, digits=2):
+        """Weight sums per cell, in the same order as top()"""
+        return {cell: round(self.sums[cell], digits) for cell in self.top()}
+
+    def labelled(self, separator):
+        """The same cross-tab with multi-column cells joined into strings such as 'Electrical - Standard'"""
+        def label(cell):
+            return separator.join(cell) if isinstance(cell, tuple) else cell
+        sums = {label(cell): total for cell, total in self.sums.items()} if self.sums is not None else None
+        return CrossTab({label(cell): count for cell, count in self.counts.items()}, sums)
+
+
+def crosstab(table, names, order=None, weights=None):
+    """Tally the rows of a JobTable by one or more categorical columns in a single pass
+
+    `order` lists the row indices to visit (all rows in table order by
+    default); `weights` names a numeric column to sum per cell.
+    """
+    names = [names] if isinstance(names, str) else list(names)
+    columns = [table.columns[name] for name in names]
+    weight_column = table.columns[weights] if weights else None
+    tally = _numpy_tally if np is not None else _python_tally
+    cells, counts, sums = tally(columns, order, weight_column)
+
+    values = table.values
+    if len(names) == 1:
+        keys = [values[codes[0]] for codes in cells]
+    else:
+        keys = [tuple(values[code] for code in codes) for codes in cells]
+    return CrossTab(dict(zip(keys, counts)), dict(zip(keys, sums)) if sums is not None else None)
+
+
+def _python_tally(columns, order, weight_column):
+    if order is not None:
+        columns = [[column[index] for index in order] for column in columns]
+        if weight_column is not None:
+            weight_column = [weight_column[index] for index in order]
+
+    counts = Counter(zip(*columns))
+    sums = None
+    if weight_column is not None:
+        sums = dict.fromkeys(counts, 0.0)
+        for cell, weight in zip(zip(*columns), weight_column):
+            sums[cell] += weight
+        sums = list(sums.values())
+    return list(counts), list(counts.values()), sums
+
+
+def _numpy_tally(columns, order, weight_column):
+    arrays = [np.frombuffer(column, dtype=np.dtype(column.typecode)) for column in columns]
+    if order is not None:
+        order = np.asarray(order, dtype=np.intp)
+        arrays = [codes[order] for codes in arrays]
+    if not len(arrays[0]):
+        return [], [], [] if weight_column is not None else None
+
+    # Encode each combination of codes as one flat cell index
+    shape = tuple(int(codes.max()) + 1 for codes in arrays)
+    flat = np.ravel_multi_index(arrays, shape)
+    counts = np.bincount(flat)
+    sums = None
+    if weight_column is not None:
+        weights = np.frombuffer(weight_column, dtype=np.float64)
+        sums = np.bincount(flat, weights=weights[order] if order is not None else weights)
+
+    # Report cells in order of first appearance, as the Counter path does
+    occupied, first_seen = np.unique(flat, return_index=True)
+    occupied = occupied[np.argsort(first_seen, kind='stable')]
+    cells = list(zip(*(index.tolist() for index in np.unravel_index(occupied, shape))))
+    return (cells, counts[occupied].tolist(),
+            sums[occupied].tolist() if sums is not None else None)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    row INTEGER PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    uuid TEXT,
+    job_number TEXT,
+    job_number_value INTEGER
+);
+CREATE INDEX IF NOT EXISTS records_by_uuid ON records (uuid);
+CREATE INDEX IF NOT EXISTS records_by_job_number ON records (job_number);
+CREATE INDEX IF NOT EXISTS records_by_job_number_value ON records (job_number_value);
+CREATE TABLE IF NOT EXISTS index_state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Bytes before the indexed end whose hash shows that the indexed part of the file is unchanged
+TAIL_CHECK_BYTES = 4096
+
+
+def _parse_record(data):
+    """Parse the bytes of one CSV record (which may span lines) into its field values"""
+    return next(csv.reader(io.StringIO(data.decode('utf-8'), newline='')), [])
+
+
+def scan_records(f, start):
+    """Yield (offset, length) of each CSV record from byte `start`, which must begin a record
+
+    A newline ends a record only outside quotes. Quotes are counted per line:
+    an escaped quote ("") adds two, so the running count is even exactly when
+    the position is outside a quoted field. A final record without a trailing
+    newline is yielded too.
+    """
+    f.seek(start)
+    offset = position = start
+    quotes = 0
+    for line in f:
+        quotes += line.count(b'"')
+        position += len(line)
+        if quotes % 2 == 0 and line.endswith(b'\n'):
+            yield offset, position - offset
+            offset = position
+            quotes = 0
+    if position > offset:
+        yield offset, position - offset
+
+
+class CsvJobIndex:
+    """Byte-offset index of a CSV export, for random access without parsing the whole file
+
+    The offset and length of every logical record (descriptions may hold
+    quoted newlines) are kept in SQLite next to the CSV, with the record's
+    uuid and job number. Lookups read just that record from a memory map of
+    the file. When the file has only grown by appended rows, `refresh`
+    indexes the new rows alone; any other change rebuilds the index. A file
+    replaced by write-and-rename (a new inode at the path) is reopened and
+    indexed afresh. One instance may be shared between threads.
+    """
+
+    def __init__(self, csv_path, index_path=None):
+        self.csv_path = csv_path
+        self.connection = sqlite3.connect(index_path or csv_path + '.idx', check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.executescript(SCHEMA)
+        self.file = open(csv_path, 'rb')
+        self.map = None
+        self.header = None
+        self.refresh()
+
+    def _state(self, name):
+        row = self.connection.execute("SELECT value FROM index_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, name, value):
+        self.connection.execute("INSERT OR REPLACE INTO index_state (name, value) VALUES (?, ?)", (name, str(value)))
+
+    def _tail_hash(self, end):
+        self.file.seek(max(0, end - TAIL_CHECK_BYTES))
+        return hashlib.sha256(self.file.read(min(end, TAIL_CHECK_BYTES))).hexdigest()
+
+    def _reopen_if_replaced(self):
+        """Open the file now at the path if it is not the one held open"""
+        try:
+            current = os.stat(self.csv_path)
+        except FileNotFoundError:
+            # Keep serving the open file until a replacement appears
+            return
+        opened = os.fstat(self.file.fileno())
+        if (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.file.close()
+            self.file = open(self.csv_path, 'rb')
+
+    def _remap(self, size):
+        if self.map is not None:
+            self.map.close()
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def refresh(self):
+        """Bring the index up to date with the file; returns the number of records (re)indexed"""
+        with self.lock:
+            return self._refresh()
+
+    def _refresh(self):
+        self._reopen_if_replaced()
+        stat = os.fstat(self.file.fileno())
+        size = stat.st_size
+        file_id = f"{stat.st_dev}:{stat.st_ino}"
+        indexed_size = int(self._state('indexed_size') or 0)
+        header = self._state('header')
+
+        # Appending changes the size, so the same size with a new modification time is a rewrite in place
+        rewritten = self._state('size') == str(size) and self._state('mtime_ns') != str(stat.st_mtime_ns)
+        unchanged = (header is not None and self._state('file_id') == file_id and not rewritten
+                     and indexed_size <= size and self._state('tail_hash') == self._tail_hash(indexed_size))
+        if unchanged and indexed_size == size:
+            self._remap(size)
+            self.header = json.loads(header)
+            return 0
+        if not unchanged:
+            self.connection.execute("DELETE FROM records")
+            indexed_size = 0
+        self._remap(size)
+
+        # A last record without a trailing newline may have grown, so it is indexed again
+        self.connection.execute("DELETE FROM records WHERE offset >= ?", (indexed_size,))
+        next_row = self.connection.execute("SELECT COALESCE(MAX(row), -1) + 1 FROM records").fetchone()[0]
+
+        records = scan_records(self.file, indexed_size)
+        if indexed_size == 0:
+            offset, length = next(records, (0, 0))
+            self.header = _parse_record(self.map[offset:offset + length]) if length else []
+            indexed_size = offset + length
+        else:
+            self.header = json.loads(header)
+        uuid_column = self.header.index('uuid') if 'uuid' in self.header else None
+        number_column = self.header.index('generated_job_id') if 'generated_job_id' in self.header else None
+
+        rows = []
+        for offset, length in records:
+            if self.map[offset + length - 1:offset + length] == b'\n':
+                indexed_size = offset + length
+            values = _parse_record(self.map[offset:offset + length])
+            if not values:
+                # Blank lines, which csv.DictReader skips as well
+                continue
+            uuid = values[uuid_column] if uuid_column is not None and uuid_column < len(values) else None
+            number = values[number_column] if number_column is not None and number_column < len(values) else None
+            rows.append((next_row + len(rows), offset, length, uuid, number,
+                         int(number) if number and number.isdigit() else None))
+        self.connection.executemany(
+            "INSERT INTO records (row, offset, length, uuid, job_number, job_number_value) VALUES (?, ?, ?, ?, ?, ?)",
+            rows)
+
+        self._set_state('header', json.dumps(self.header))
+        self._set_state('indexed_size', indexed_size)
+        self._set_state('tail_hash', self._tail_hash(indexed_size))
+        self._set_state('file_id', file_id)
+        self._set_state('size', size)
+        self._set_state('mtime_ns', stat.st_mtime_ns)
+        self.connection.commit()
+        return len(rows)
+
+    def _job(self, offset, length):
+        # Short and long records are filled in the way csv.DictReader does it
+        values = _parse_record(self.map[offset:offset + length])
+        job = dict(zip(self.header, values))
+        for name in self.header[len(values):]:
+            job[name] = None
+        if len(values) > len(self.header):
+            job[None] = values[len(self.header):]
+        return job
+
+    def _jobs(self, query, parameters):
+        with self.lock:
+            return [self._job(offset, length) for offset, length in self.connection.execute(query, parameters)]
+
+    def get(self, job_number=None, uuid=None):
+        """The job with this job number or uuid (the last one in the file if repeated), or None"""
+        column, value = ('job_number', job_number) if job_number is not None else ('uuid', uuid)
+        jobs = self._jobs(f"SELECT offset, length FROM records WHERE {column} = ? ORDER BY row DESC LIMIT 1", (value,))
+        return jobs[0] if jobs else None
+
+    def rows(self, start=0, stop=None):
+        """Jobs in file order from row `start` up to, not including, row `stop`"""
+        return self._jobs("SELECT offset, length FROM records WHERE row >= ? AND row < ? ORDER BY row",
+                          (start, len(self) if stop is None else stop))
+
+    def job_number_range(self, low, high):
+        """Jobs with numeric job numbers from `low` to `high` inclusive, in job number order"""
+        return self._jobs("SELECT offset, length FROM records WHERE job_number_value BETWEEN ? AND ? "
+                          "ORDER BY job_number_value, row", (low, high))
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default='all_jobs.csv', help="CSV export to index")
+    parser.add_argument('--index', help="Index file (default: the CSV path plus .idx)")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    subcommands.add_parser('update', help="Index the file, or just the rows appended since the last update")
+    get = subcommands.add_parser('get', help="Print one job by job number or uuid")
+    get.add_argument('key')
+    scan = subcommands.add_parser('range', help="Print the jobs with job numbers in a range")
+    scan.add_argument('low', type=int)
+    scan.add_argument('high', type=int)
+    args = parser.parse_args()
+
+    with CsvJobIndex(args.csv, args.index) as index:
+        if args.command == 'update':
+            print(f"Index of {args.csv} holds {len(index)} jobs")
+        elif args.command == 'get':
+            job = index.get(job_number=args.key) or index.get(uuid=args.key)
+            if job is None:
+                raise SystemExit(f"No job {args.key} in {args.csv}")
+            print(json.dumps(job, indent=2, ensure_ascii=False))
+        else:
+            for job in index.job_number_range(args.low, args.high):
+                print(json.dumps(job, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
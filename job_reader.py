@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import csv
+import json
+
+from job_store import STORE_EXTENSIONS, JobStore
+
+# Characters read from a JSON export per refill of the parse buffer
+JSON_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+def _skip_whitespace(buffer, index):
+    while index < len(buffer) and buffer[index] in ' \t\r\n':
+        index += 1
+    return index
+
+
+def iter_json_array(f, chunk_size=JSON_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array one at a time
+
+    The file is read in chunks and each element is decoded as soon as it is
+    complete, so only one element (plus one chunk) is held in memory.
+    """
+    buffer = ''
+    index = 0
+    eof = False
+
+    def refill():
+        nonlocal buffer, index, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[index:] + chunk
+        index = 0
+
+    refill()
+    index = _skip_whitespace(buffer, index)
+    while index >= len(buffer) and not eof:
+        refill()
+        index = _skip_whitespace(buffer, index)
+    if buffer[index:index + 1] != '[':
+        raise ValueError("Expected a JSON array of jobs")
+    index += 1
+
+    expect_element = True
+    while True:
+        index = _skip_whitespace(buffer, index)
+        if index >= len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            refill()
+            continue
+
+        char = buffer[index]
+        if char == ']':
+            return
+        if not expect_element:
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in JSON array, found {char!r}")
+            index += 1
+            expect_element = True
+            continue
+
+        try:
+            element, end = _decoder.raw_decode(buffer, index)
+        except ValueError:
+            # The element runs past the end of the buffer
+            if eof:
+                raise
+            refill()
+            continue
+        if end == len(buffer) and not eof:
+            # A number may continue in the next chunk
+            refill()
+            continue
+
+        yield element
+        index = end
+        expect_element = False
+
+
+def iter_csv_jobs(f):
+    """Yield jobs from a CSV export, one row at a time (quoted multi-line fields included)"""
+    yield from csv.DictReader(f)
+
+
+def iter_jobs(path):
+    """Yield job records from a CSV export, a JSON array export or a synced job store without loading them all"""
+    if path.endswith(STORE_EXTENSIONS):
+        with JobStore(path) as store:
+            yield from store.iter_jobs()
+    elif path.endswith('.csv'):
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            yield from iter_csv_jobs(f)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from iter_json_array(f)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import re
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from job_reader import iter_jobs
+from job_store import JobStore
+from servicem8_client import ServiceM8Client
+from servicem8_sync import SERVICEM8_API_BASE
+
+# Per-job resources: endpoint, field naming the job, and any condition every record must meet
+RESOURCES = {
+    'attachments': ('attachment.json', 'related_object_uuid', "related_object eq 'job'"),
+    'contacts': ('jobcontact.json', 'job_uuid', None),
+    'notes': ('note.json', 'related_object_uuid', "related_object eq 'job'"),
+    # Badges are a JSON list of badge uuids on the job record itself
+    'badges': ('job.json', 'uuid', None)
+}
+
+# Job uuids combined into one `$filter`; keeps the URL well under common length limits
+BATCH_SIZE = 40
+
+# Only these characters are placed inside filter string literals
+UUID = re.compile(r'^[0-9A-Za-z-]+$')
+
+
+def batch_filter(field, job_uuids, condition=None):
+    """OData filter matching records of any of the jobs, e.g. "job_uuid eq 'a' or job_uuid eq 'b'\""""
+    clause = ' or '.join(f"{field} eq '{job_uuid}'" for job_uuid in job_uuids)
+    if condition:
+        return f"{condition} and ({clause})" if len(job_uuids) > 1 else f"{condition} and {clause}"
+    return clause
+
+
+def _badge_records(job):
+    try:
+        badges = json.loads(job.get('badges') or '[]')
+    except ValueError:
+        badges = []
+    return [{'uuid': badge} for badge in badges if isinstance(badge, str)]
+
+
+class JobResourceFetcher:
+    """Fetches per-job related records concurrently and streams them into a JobStore
+
+    Jobs are requested in batches of `batch_size` with one `$filter` of
+    or'ed clauses, and the records are distributed back to their jobs by
+    the filter field. If the API refuses a batched filter for a resource
+    (400), that resource falls back to one request per job for the rest
+    of the run. Every job in a successful request is stored with its full
+    set of records, so jobs without any are recorded as fetched too.
+    """
+
+    def __init__(self, client, store, batch_size=BATCH_SIZE):
+        self.client = client
+        self.store = store
+        self.batch_size = batch_size
+        self.unbatched = set()
+        self.counts = {}
+
+    async def _get(self, resource, job_uuids):
+        endpoint, field, condition = RESOURCES[resource]
+        path = f"/{endpoint}?$filter=" + quote(batch_filter(field, job_uuids, condition))
+        status, body, error = await self.client.request('GET', path)
+        return status, (json.loads(body) if error is None else None), error
+
+    async def fetch_batch(self, resource, job_uuids):
+        if len(job_uuids) > 1 and resource not in self.unbatched:
+            status, records, error = await self._get(resource, job_uuids)
+            if status == 400:
+                if resource not in self.unbatched:
+                    self.unbatched.add(resource)
+                    print(f"⚠️  {resource}: batched $filter refused ({error}); fetching one job per request")
+            else:
+                self._store(resource, job_uuids, status, records, error)
+                return
+        for job_uuid in job_uuids:
+            status, records, error = await self._get(resource, [job_uuid])
+            self._store(resource, [job_uuid], status, records, error)
+
+    def _store(self, resource, job_uuids, status, records, error):
+        counts = self.counts[resource]
+        counts['requests'] += 1
+        if error is not None:
+            counts['failed_jobs'] += len(job_uuids)
+            print(f"❌ {resource} for {len(job_uuids)} jobs: {status or 'no response'} {error}")
+            return
+
+        field = RESOURCES[resource][1]
+        records_by_job = {job_uuid: [] for job_uuid in job_uuids}
+        for record in records:
+            job_uuid = record.get(field)
+            if job_uuid in records_by_job:
+                if resource == 'badges':
+                    records_by_job[job_uuid].extend(_badge_records(record))
+                else:
+                    records_by_job[job_uuid].append(record)
+
+        self.store.replace_resources(resource, records_by_job, datetime.now(timezone.utc).isoformat(timespec='seconds'))
+        self.store.commit()
+        counts['jobs'] += len(job_uuids)
+        counts['records'] += sum(map(len, records_by_job.values()))
+
+    async def fetch(self, jobs_by_resource):
+        """Fetch each resource for its list of job uuids; the client's pool bounds the requests in flight"""
+        batches = []
+        for resource, job_uuids in jobs_by_resource.items():
+            job_uuids = [job_uuid for job_uuid in job_uuids if UUID.match(job_uuid)]
+            self.counts[resource] = {'jobs': 0, 'records': 0, 'requests': 0, 'failed_jobs': 0}
+            batches.extend((resource, job_uuids[start:start + self.batch_size])
+                           for start in range(0, len(job_uuids), self.batch_size))
+        await asyncio.gather(*(self.fetch_batch(resource, batch) for resource, batch in batches))
+        return self.counts
+
+
+async def fetch_resources(store, jobs_by_resource, api_base, batch_size, concurrency, rate):
+    async with ServiceM8Client(api_base, concurrency=concurrency, rate=rate) as client:
+        counts = await JobResourceFetcher(client, store, batch_size).fetch(jobs_by_resource)
+        return counts, client.requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--store', default='servicem8_jobs.db', help="SQLite job store the records are written to")
+    parser.add_argument('--jobs', help="Export or job store listing the jobs to fetch for (default: the --store jobs)")
+    parser.add_argument('--resources', nargs='+', choices=list(RESOURCES), default=list(RESOURCES))
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Jobs per $filter request")
+    parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight at once")
+    parser.add_argument('--rate', type=float, default=10.0, help="Maximum requests per second")
+    parser.add_argument('--only-missing', action='store_true',
+                        help="Skip jobs whose records of a resource were fetched before")
+    parser.add_argument('--api-base', default=SERVICEM8_API_BASE)
+    args = parser.parse_args()
+
+    with JobStore(args.store) as store:
+        source = iter_jobs(args.jobs) if args.jobs else store.iter_jobs()
+        job_uuids = list(dict.fromkeys(job['uuid'] for job in source if job.get('uuid')))
+        jobs_by_resource = {}
+        for resource in args.resources:
+            fetched = store.fetched_jobs(resource) if args.only_missing else set()
+            jobs_by_resource[resource] = [job_uuid for job_uuid in job_uuids if job_uuid not in fetched]
+        print(f"🔄 Fetching {', '.join(args.resources)} for {len(job_uuids)} jobs "
+              f"in batches of {args.batch_size}...")
+
+        started = time.monotonic()
+        counts, requests = asyncio.run(fetch_resources(
+            store, jobs_by_resource, args.api_base, args.batch_size, args.concurrency, args.rate))
+        for resource, resource_counts in counts.items():
+            print(f"  {resource}: {resource_counts['records']} records for {resource_counts['jobs']} jobs "
+                  f"in {resource_counts['requests']} requests"
+                  + (f", {resource_counts['failed_jobs']} jobs failed" if resource_counts['failed_jobs'] else ''))
+        print(f"✅ {requests} API calls in {time.monotonic() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
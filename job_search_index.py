@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import math
+import re
+import sqlite3
+from array import array
+
+from classification_cache import job_key
+from job_reader import iter_jobs
+
+TOKEN = re.compile(r'\w+')
+
+# Query syntax: "quoted phrases", prefix* terms, plain terms and NEAR or NEAR/k between two clauses
+QUERY_TOKEN = re.compile(r'"([^"]*)"|(NEAR(?:/(\d+))?)\b|(\S+)')
+
+# Position gap between the description and the address so phrases cannot span both
+FIELD_GAP = 16
+
+# Default window (in tokens) for NEAR
+NEAR_DISTANCE = 10
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id INTEGER PRIMARY KEY,
+    job_key TEXT UNIQUE NOT NULL,
+    job_number TEXT,
+    text_hash TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_doc ON postings (doc_id);
+"""
+
+
+def tokenize(text):
+    """Lower-cased word tokens of the text"""
+    return TOKEN.findall(text.lower())
+
+
+def job_text_positions(job):
+    """Map each term of a job's description and address to its token positions"""
+    positions = {}
+    description = tokenize(job['job_description'])
+    address = tokenize(job.get('job_address') or '')
+    for position, term in enumerate(description):
+        positions.setdefault(term, array('I')).append(position)
+    for position, term in enumerate(address, len(description) + FIELD_GAP):
+        positions.setdefault(term, array('I')).append(position)
+    return positions, len(description) + len(address)
+
+
+class Clause:
+    """A query clause: a term, a prefix, a phrase, or two clauses NEAR each other"""
+
+    def __init__(self, kind, terms, distance=None, left=None, right=None):
+        self.kind = kind
+        self.terms = terms
+        self.distance = distance
+        self.left = left
+        self.right = right
+
+
+def parse_query(query):
+    """Parse a query into clauses that must all match
+
+    `storm damage` matches both words anywhere, `"storm damage"` the phrase,
+    `switch*` any word starting with 'switch', and
+    `"storm damage" NEAR/5 switchboard` both within 5 words of each other.
+    """
+    clauses = []
+    pending_near = None
+    for phrase, near, distance, word in QUERY_TOKEN.findall(query):
+        if near:
+            pending_near = int(distance) if distance else NEAR_DISTANCE
+            continue
+
+        if phrase:
+            terms = tokenize(phrase)
+            clause = Clause('phrase' if len(terms) > 1 else 'term', terms) if terms else None
+        elif word.endswith('*') and tokenize(word):
+            clause = Clause('prefix', tokenize(word)[:1])
+        else:
+            terms = tokenize(word)
+            clause = Clause('phrase', terms) if len(terms) > 1 else Clause('term', terms) if terms else None
+        if clause is None:
+            continue
+
+        if pending_near is not None and clauses:
+            clauses.append(Clause('near', [], pending_near, clauses.pop(), clause))
+        else:
+            clauses.append(clause)
+        pending_near = None
+    return clauses
+
+
+class JobSearchIndex:
+    """Persistent positional inverted index over job descriptions and addresses
+
+    Postings (term -> doc -> token positions) live in SQLite, so a query only
+    reads the postings of its own terms. Jobs are added or updated by key
+    (uuid, or job number for exports without one); unchanged jobs are skipped.
+    Results are ranked with BM25.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.query_postings = {}
+
+    def add(self, job):
+        """Index or re-index one job; returns False when its text is unchanged"""
+        key = job_key(job)
+        text_hash = hashlib.sha256(
+            f"{job['job_description']}\x1f{job.get('job_address') or ''}".encode('utf-8')).hexdigest()
+        row = self.connection.execute("SELECT doc_id, text_hash FROM docs WHERE job_key = ?", (key,)).fetchone()
+        if row and row[1] == text_hash:
+            return False
+
+        positions, length = job_text_positions(job)
+        if row:
+            doc_id = row[0]
+            self.connection.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            self.connection.execute(
+                "UPDATE docs SET job_number = ?, text_hash = ?, length = ? WHERE doc_id = ?",
+                (job.get('generated_job_id'), text_hash, length, doc_id))
+        else:
+            doc_id = self.connection.execute(
+                "INSERT INTO docs (job_key, job_number, text_hash, length) VALUES (?, ?, ?, ?)",
+                (key, job.get('generated_job_id'), text_hash, length)).lastrowid
+        self.connection.executemany(
+            "INSERT INTO postings (term, doc_id, positions) VALUES (?, ?, ?)",
+            [(term, doc_id, term_positions.tobytes()) for term, term_positions in positions.items()])
+        return True
+
+    def add_all(self, jobs):
+        """Index every job, committing once at the end; returns the number (re)indexed"""
+        changed = sum(self.add(job) for job in jobs)
+        self.connection.commit()
+        return changed
+
+    def remove(self, key):
+        row = self.connection.execute("SELECT doc_id FROM docs WHERE job_key = ?", (key,)).fetchone()
+        if row:
+            self.connection.execute("DELETE FROM postings WHERE doc_id = ?", row)
+            self.connection.execute("DELETE FROM docs WHERE doc_id = ?", row)
+
+    def _postings(self, term):
+        # Memoised per search: clause evaluation and scoring read the same terms
+        postings = self.query_postings.get(term)
+        if postings is None:
+            rows = self.connection.execute("SELECT doc_id, positions FROM postings WHERE term = ?", (term,))
+            postings = self.query_postings[term] = {doc_id: _positions(blob) for doc_id, blob in rows}
+        return postings
+
+    def _prefix_terms(self, prefix):
+        # Terms sort as text, so every term with the prefix lies in [prefix, prefix + U+10FFFF)
+        rows = self.connection.execute(
+            "SELECT DISTINCT term FROM postings WHERE term >= ? AND term < ?", (prefix, prefix + '\U0010ffff'))
+        return [term for (term,) in rows]
+
+    def _evaluate(self, clause, scored_terms):
+        """Return {doc_id: sorted start positions} for a clause, noting the terms it scores on"""
+        if clause.kind == 'term':
+            scored_terms.append(clause.terms[0])
+            return self._postings(clause.terms[0])
+
+        if clause.kind == 'prefix':
+            matches = {}
+            for term in self._prefix_terms(clause.terms[0]):
+                scored_terms.append(term)
+                for doc_id, positions in self._postings(term).items():
+                    matches.setdefault(doc_id, []).extend(positions)
+            return {doc_id: sorted(positions) for doc_id, positions in matches.items()}
+
+        if clause.kind == 'phrase':
+            postings = [self._postings(term) for term in clause.terms]
+            scored_terms.extend(clause.terms)
+            docs = set(postings[0]).intersection(*postings[1:])
+            matches = {}
+            for doc_id in docs:
+                later = [set(posting[doc_id]) for posting in postings[1:]]
+                starts = [start for start in postings[0][doc_id]
+                          if all(start + offset in positions for offset, positions in enumerate(later, 1))]
+                if starts:
+                    matches[doc_id] = starts
+            return matches
+
+        left = self._evaluate(clause.left, scored_terms)
+        right = self._evaluate(clause.right, scored_terms)
+        left_span = len(clause.left.terms) if clause.left.kind == 'phrase' else 1
+        right_span = len(clause.right.terms) if clause.right.kind == 'phrase' else 1
+        matches = {}
+        for doc_id in left.keys() & right.keys():
+            starts = [a for a in left[doc_id]
+                      if any(b - (a + left_span - 1) <= clause.distance and a - (b + right_span - 1) <= clause.distance
+                             for b in right[doc_id])]
+            if starts:
+                matches[doc_id] = starts
+        return matches
+
+    def search(self, query, limit=20):
+        """Return up to `limit` (job_number, job_key, score) tuples ranked by BM25"""
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+        self.query_postings = {}
+
+        scored_terms = []
+        results = None
+        for clause in clauses:
+            matches = self._evaluate(clause, scored_terms)
+            results = set(matches) if results is None else results & set(matches)
+            if not results:
+                return []
+
+        doc_count, total_length = self.connection.execute("SELECT COUNT(*), SUM(length) FROM docs").fetchone()
+        average_length = total_length / doc_count if doc_count else 0
+        lengths = dict(self.connection.execute(
+            f"SELECT doc_id, length FROM docs WHERE doc_id IN ({','.join('?' * len(results))})", list(results)))
+
+        scores = dict.fromkeys(results, 0.0)
+        for term in dict.fromkeys(scored_terms):
+            postings = self._postings(term)
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id in results:
+                positions = postings.get(doc_id)
+                if positions:
+                    frequency = len(positions)
+                    norm = K1 * (1 - B + B * lengths[doc_id] / average_length)
+                    scores[doc_id] += idf * frequency * (K1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        labels = dict((doc_id, (job_number, key)) for doc_id, job_number, key in self.connection.execute(
+            f"SELECT doc_id, job_number, job_key FROM docs WHERE doc_id IN ({','.join('?' * len(ranked))})",
+            [doc_id for doc_id, _ in ranked]))
+        return [(*labels[doc_id], round(score, 4)) for doc_id, score in ranked]
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def _positions(blob):
+    positions = array('I')
+    positions.frombytes(blob)
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--index', default='job_search_index.db', help="SQLite index file")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    build = subcommands.add_parser('update', help="Add new and edited jobs to the index")
+    build.add_argument('--input', default='all_jobs.csv',
+                       help="Jobs to index: a JSON array, a CSV such as all_jobs.csv, or a servicem8_sync.py job store")
+    search = subcommands.add_parser('search', help='Query the index, e.g. \'"storm damage" NEAR switchboard\'')
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    with JobSearchIndex(args.index) as index:
+        if args.command == 'update':
+            changed = index.add_all(iter_jobs(args.input))
+            print(f"Indexed {changed} new or edited jobs from {args.input}")
+        else:
+            for job_number, key, score in index.search(args.query, args.limit):
+                print(f"Job {job_number}: {score} ({key})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import json
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    uuid TEXT PRIMARY KEY,
+    generated_job_id TEXT,
+    edit_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_resources (
+    resource TEXT NOT NULL,
+    job_uuid TEXT NOT NULL,
+    record_uuid TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (resource, job_uuid, record_uuid)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS job_resource_fetches (
+    resource TEXT NOT NULL,
+    job_uuid TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (resource, job_uuid)
+) WITHOUT ROWID;
+"""
+
+# File extensions that job_reader.iter_jobs treats as a job store
+STORE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+class JobStore:
+    """Local SQLite copy of ServiceM8 job records, kept current by delta syncs
+
+    Each job is stored whole as JSON under its uuid. The high-water mark is
+    the largest `edit_date` seen so far; ServiceM8 formats it as
+    'YYYY-MM-DD HH:MM:SS', so plain string comparison orders it correctly.
+    Per-job related records (attachments, contacts, notes, badges) are kept
+    by resource name alongside the jobs.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def high_water_mark(self):
+        row = self.connection.execute("SELECT value FROM sync_state WHERE name = 'high_water_mark'").fetchone()
+        return row[0] if row else None
+
+    def set_high_water_mark(self, edit_date):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sync_state (name, value) VALUES ('high_water_mark', ?)", (edit_date,))
+
+    def upsert(self, jobs):
+        """Insert or replace job records; returns the number written and the latest edit_date among them"""
+        rows = [(job['uuid'], job.get('generated_job_id'), job.get('edit_date'), json.dumps(job)) for job in jobs]
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO jobs (uuid, generated_job_id, edit_date, data) VALUES (?, ?, ?, ?)", rows)
+        latest = max((edit_date for _, _, edit_date, _ in rows if edit_date), default=None)
+        return len(rows), latest
+
+    def iter_jobs(self):
+        """Yield stored job records one at a time, ordered by uuid"""
+        for (data,) in self.connection.execute("SELECT data FROM jobs ORDER BY uuid"):
+            yield json.loads(data)
+
+    def replace_resources(self, resource, records_by_job, fetched_at):
+        """Store the complete set of one resource's records for each job, replacing what was there
+
+        `records_by_job` maps job uuids to lists of records; a job with an
+        empty list is recorded as fetched with no records.
+        """
+        job_uuids = [(resource, job_uuid) for job_uuid in records_by_job]
+        self.connection.executemany("DELETE FROM job_resources WHERE resource = ? AND job_uuid = ?", job_uuids)
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO job_resources (resource, job_uuid, record_uuid, data) VALUES (?, ?, ?, ?)",
+            [(resource, job_uuid, record.get('uuid') or job_uuid, json.dumps(record))
+             for job_uuid, records in records_by_job.items() for record in records])
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO job_resource_fetches (resource, job_uuid, fetched_at) VALUES (?, ?, ?)",
+            [(resource, job_uuid, fetched_at) for _, job_uuid in job_uuids])
+
+    def fetched_jobs(self, resource):
+        """Uuids of the jobs whose records of this resource have been fetched"""
+        rows = self.connection.execute("SELECT job_uuid FROM job_resource_fetches WHERE resource = ?", (resource,))
+        return {job_uuid for (job_uuid,) in rows}
+
+    def iter_resources(self, resource, job_uuid=None):
+        """Yield (job_uuid, record) for a resource, for one job or all of them"""
+        if job_uuid is None:
+            rows = self.connection.execute(
+                "SELECT job_uuid, data FROM job_resources WHERE resource = ? ORDER BY job_uuid", (resource,))
+        else:
+            rows = self.connection.execute(
+                "SELECT job_uuid, data FROM job_resources WHERE resource = ? AND job_uuid = ?", (resource, job_uuid))
+        for job_uuid, data in rows:
+            yield job_uuid, json.loads(data)
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+from array import array
+from operator import ne
+
+
+class JobTable:
+    """Column-oriented table of classified jobs
+
+    Categorical fields (status, categories, labels) are interned: each
+    distinct value is stored once and the column holds small integer codes
+    in an array. All categorical columns share one value table, so codes
+    can be compared across columns. Numeric fields are stored as doubles;
+    other fields are kept in plain lists that reference the job's own
+    strings rather than copying them. Cross-tabs over the code columns are
+    computed by crosstab.crosstab.
+    """
+
+    def __init__(self, categorical, fields, numeric=()):
+        self.values = []
+        self.value_codes = {}
+        self.categorical = frozenset(categorical)
+        self.columns = {name: array('i') for name in categorical}
+        self.columns.update((name, array('d')) for name in numeric)
+        self.columns.update((name, []) for name in fields)
+        self.length = 0
+
+    def intern(self, value):
+        """Return the code of a categorical value, assigning the next code to new values"""
+        code = self.value_codes.get(value)
+        if code is None:
+            code = self.value_codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, **row):
+        for name, column in self.columns.items():
+            value = row[name]
+            column.append(self.intern(value) if name in self.categorical else value)
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def get(self, name, index):
+        value = self.columns[name][index]
+        return self.values[value] if name in self.categorical else value
+
+    def row(self, index):
+        """Return one job as a dict of field values"""
+        return {name: self.get(name, index) for name in self.columns}
+
+    def sorted_order(self, name, key):
+        """Row indices sorted (stably) by key(value) of one column"""
+        column = self.columns[name]
+        return sorted(range(self.length), key=lambda index: key(column[index]))
+
+    def count_differing(self, first, second):
+        """Number of rows where two categorical columns hold different values"""
+        return sum(map(ne, self.columns[first], self.columns[second]))
+
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import re
+
+# Characters that mark a keyword as a regex pattern rather than a plain literal
+REGEX_METACHARACTERS = set('.^$*+?{}[]\\|()')
+
+# Distinct tokens remembered before the token cache is reset
+MAX_CACHED_TOKENS = 200000
+
+
+def is_pattern(keyword):
+    """Return True if the keyword uses regex syntax such as '.*', '.?' or '[0-9]'"""
+    return any(char in REGEX_METACHARACTERS for char in keyword)
+
+
+def _required_literal(pattern):
+    """Return the longest literal run that every match of the pattern must contain
+
+    Returns '' when no such run can be found cheaply (alternations and
+    groups), in which case the pattern is evaluated for every text.
+    """
+    if '|' in pattern or '(' in pattern:
+        return ''
+
+    runs = []
+    current = ''
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            escaped = pattern[index + 1:index + 2]
+            literal = escaped if escaped and not escaped.isalnum() else None
+            index += 2
+        elif char == '[':
+            literal = None
+            index = pattern.index(']', index + 1) + 1
+        elif char in '.^$':
+            literal = None
+            index += 1
+        else:
+            literal = char
+            index += 1
+
+        quantifier = pattern[index:index + 1]
+        if quantifier and quantifier in '?*+{':
+            index = pattern.index('}', index) + 1 if quantifier == '{' else index + 1
+            if pattern[index:index + 1] == '?':
+                index += 1
+            # '+' still needs one copy of the atom; any other quantifier makes it optional
+            if quantifier == '+' and literal is not None:
+                current += literal
+            runs.append(current)
+            current = ''
+        elif literal is None:
+            runs.append(current)
+            current = ''
+        else:
+            current += literal
+
+    runs.append(current)
+    return max(runs, key=len)
+
+
+def _trie_pattern(node):
+    """Render a keyword trie as a regex that prefers the longest keyword at a position"""
+    terminal = '' in node
+    branches = [re.escape(char) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char != '']
+
+    if not branches:
+        return ''
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+
+    alternation = '(?:' + '|'.join(branches) + ')'
+    return alternation + '?' if terminal else alternation
+
+
+class KeywordMatcher:
+    """Precompiled multi-keyword matcher that finds every keyword group hit in one pass
+
+    Groups are given as (key, keywords) pairs. Plain keywords are matched as
+    lower-case substrings, exactly like the `keyword in desc_lower` checks
+    they replace, and keywords written with regex syntax ('relocate.*pole',
+    'air.?condition', 'stage [0-9]') are compiled as real patterns.
+
+    Every keyword is reduced to an anchor: the longest whitespace-free run
+    it cannot match without. A text is split on whitespace in one pass and
+    each distinct token is resolved, once per process, to the anchors it
+    contains using a single trie-shaped regex. A keyword without whitespace
+    can only occur inside a single token, so it is proven by its anchor
+    alone; everything else (multi-word keywords, patterns) is only confirmed
+    against the text when its anchor is present.
+    """
+
+    def __init__(self, groups):
+        self.groups = {}
+        self.keywords_by_group = {}
+        for key, keywords in groups:
+            for keyword in keywords:
+                self.groups.setdefault(keyword.lower(), set()).add(key)
+            self.keywords_by_group[key] = frozenset(keyword.lower() for keyword in keywords)
+
+        self.compiled_patterns = {}
+        self.single_line_patterns = set()
+        self.keywords_by_anchor = {}
+        self.candidates_by_anchor = {}
+        self.unanchored_keywords = set()
+        for keyword in self.groups:
+            if is_pattern(keyword):
+                self.compiled_patterns[keyword] = re.compile(keyword)
+                if not any(token in keyword for token in ('\\', '[^', '\n', '(?')):
+                    self.single_line_patterns.add(keyword)
+                required = _required_literal(keyword)
+            else:
+                required = keyword
+
+            anchor = max(required.split(), key=len, default='')
+            if not anchor:
+                self.unanchored_keywords.add(keyword)
+            elif anchor == keyword:
+                self.keywords_by_anchor.setdefault(anchor, set()).add(keyword)
+            else:
+                self.candidates_by_anchor.setdefault(anchor, set()).add(keyword)
+
+        anchors = set(self.keywords_by_anchor) | set(self.candidates_by_anchor)
+        trie = {}
+        for anchor in anchors:
+            node = trie
+            for char in anchor:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        # The regex reports the longest anchor starting at each offset, so every
+        # shorter anchor that is a prefix of it has matched there too
+        self.anchor_prefixes = {
+            anchor: [other for other in anchors if anchor.startswith(other)]
+            for anchor in anchors
+        }
+        # A lookahead lets findall report overlapping anchors in a single pass
+        self.anchor_pattern = re.compile('(?=(' + _trie_pattern(trie) + '))')
+
+        # Per distinct token: keywords it proves, and keywords it makes worth confirming
+        self.token_keywords = {}
+        self.token_candidates = {}
+        self.last_scan = (None, frozenset(), frozenset(), frozenset())
+
+    def __getstate__(self):
+        # The per-token caches are rebuilt as texts are scanned; pickle only the compiled matcher
+        state = self.__dict__.copy()
+        state.update(token_keywords={}, token_candidates={}, last_scan=(None, frozenset(), frozenset(), frozenset()))
+        return state
+
+    def _resolve_tokens(self, tokens):
+        """Work out the keywords and candidates of tokens not seen before"""
+        if len(self.token_keywords) > MAX_CACHED_TOKENS:
+            self.token_keywords.clear()
+            self.token_candidates.clear()
+
+        for token in tokens:
+            keywords = set()
+            candidates = set()
+            for reported in set(self.anchor_pattern.findall(token)):
+                for anchor in self.anchor_prefixes[reported]:
+                    keywords.update(self.keywords_by_anchor.get(anchor, ()))
+                    candidates.update(self.candidates_by_anchor.get(anchor, ()))
+            self.token_keywords[token] = frozenset(keywords)
+            self.token_candidates[token] = frozenset(candidates)
+
+    def _confirm(self, keyword, text, line_start=0):
+        """Check a multi-word keyword or pattern against the full text"""
+        compiled = self.compiled_patterns.get(keyword)
+        if compiled is None:
+            return keyword in text
+        # A pattern that cannot match a newline only needs searching from `line_start`
+        return compiled.search(text, line_start if keyword in self.single_line_patterns else 0) is not None
+
+    def _tokens(self, text):
+        """Return the keywords proven by the text's tokens and the candidates still to confirm"""
+        tokens = set(text.split())
+        unseen = tokens.difference(self.token_keywords)
+        if unseen:
+            self._resolve_tokens(unseen)
+        keywords = set().union(*map(self.token_keywords.__getitem__, tokens))
+        candidates = self.unanchored_keywords.union(*map(self.token_candidates.__getitem__, tokens))
+        return keywords, candidates
+
+    def hits_for(self, keywords):
+        """Return the group keys of a set of matched keywords"""
+        return frozenset().union(*map(self.groups.__getitem__, keywords))
+
+    def _scan(self, text):
+        """Scan the text, reusing the previous result when the same text is scanned again"""
+        # Several classifiers usually scan the same description back to back
+        if text == self.last_scan[0]:
+            return self.last_scan
+
+        keywords, candidates = self._tokens(text)
+        keywords.update(keyword for keyword in candidates if self._confirm(keyword, text))
+        self.last_scan = (text, frozenset(keywords), self.hits_for(keywords), frozenset(candidates))
+        return self.last_scan
+
+    def scan_keywords(self, text):
+        """Return the set of keywords and patterns found in the (lower-cased) text"""
+        return self._scan(text)[1]
+
+    def scan(self, text):
+        """Return the set of group keys with at least one keyword in the text"""
+        return self._scan(text)[2]
+
+    def scan_joined_keywords(self, first, second):
+        """Return the keywords in f"{first} {second}" while reusing the scan of `first`
+
+        The joining space ends every token, so only `second` needs splitting.
+        Candidates that failed within `first` are confirmed again against the
+        joined text, since they may match across the join.
+        """
+        _, first_keywords, _, first_candidates = self._scan(first)
+
+        keywords, candidates = self._tokens(second)
+        candidates = (candidates | first_candidates) - first_keywords - keywords
+        joined = f"{first} {second}"
+        line_start = first.rfind('\n') + 1
+        keywords.update(keyword for keyword in candidates if self._confirm(keyword, joined, line_start))
+        return first_keywords | keywords
+
+    def first_tier_match(self, hits, keywords, dimension, tiers):
+        """Return the highest priority tier label present in the hits and the keywords that fired it"""
+        for index, (label, tier_keywords) in enumerate(tiers):
+            if (dimension, index) in hits:
+                return label, tuple(sorted(keywords & self.keywords_by_group[(dimension, index)]))
+        return None, ()
+
+    def scan_joined(self, first, second):
+        """Return the group keys with at least one keyword in the joined text"""
+        return self.hits_for(self.scan_joined_keywords(first, second))
+
+
+def tier_groups(dimension, tiers):
+    """Key each tier's keywords by (dimension, tier index) for the shared matcher"""
+    return [((dimension, index), keywords) for index, (label, keywords) in enumerate(tiers)]
+
+
+def first_tier_hit(hits, dimension, tiers):
+    """Return the label of the highest priority tier present in the hit set"""
+    for index, (label, keywords) in enumerate(tiers):
+        if (dimension, index) in hits:
+            return label
+    return None
+
+
+def ruleset_version(*tables):
+    """Short content hash of the keyword tables and mappings a classifier depends on"""
+    encoded = json.dumps(tables, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
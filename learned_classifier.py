@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import operator
+import os
+import random
+import re
+import tempfile
+import zlib
+from collections import Counter
+from itertools import islice
+
+from classification_cache import job_key
+from classification_engine import RULES, RULESET_VERSION, classify_job, determine_recommended_category
+from job_reader import iter_jobs
+
+# NumPy and SciPy are optional: with both a batch is one sparse matrix product, with NumPy alone
+# a gather and segment sum, and without either a loop over each job's features (same predictions)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+INFERENCE_BACKEND = 'scipy' if sparse is not None and np is not None else 'numpy' if np is not None else 'python'
+
+# Dimensions the model learns; urgency stays with the keyword rules
+DIMENSIONS = ('work_type', 'property_type')
+
+EVIDENCE_FIELDS = {'work_type': 'work_type_evidence', 'property_type': 'property_type_evidence'}
+
+# Hashed feature space; only the buckets seen in training are kept in the model
+HASH_BUCKETS = 2 ** 20
+
+# Buckets in fewer training jobs than this are dropped; terms seen once only teach the model that job
+MIN_DOCUMENT_FREQUENCY = 2
+
+BATCH_SIZE = 4096
+EPOCHS = 8
+LEARNING_RATE = 0.5
+
+# Predictions below this probability leave the keyword engine's fallback in place
+MIN_CONFIDENCE = 0.6
+
+# One job in this many is held out of training to measure accuracy
+HOLDOUT_EVERY = 10
+
+# Terms whose column a model remembers before the memo is cleared
+MAX_CACHED_TERMS = 500000
+
+TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def term_counts(text):
+    """Counts of a text's words and adjacent word pairs"""
+    words = TOKEN.findall(text.lower())
+    counts = Counter(words)
+    counts.update(map(' '.join, zip(words, words[1:])))
+    return counts
+
+
+def term_bucket(term):
+    return zlib.crc32(term.encode('utf-8')) % HASH_BUCKETS
+
+
+def hashed_features(text):
+    """Term counts of a text's words and word pairs, by hash bucket"""
+    counts = {}
+    for term, count in term_counts(text).items():
+        bucket = term_bucket(term)
+        counts[bucket] = counts.get(bucket, 0) + count
+    return counts
+
+
+def dimension_text(job, dimension):
+    """The text a dimension is learned from: the description, plus the address for property type"""
+    if dimension == 'property_type':
+        return f"{job['job_description']} {job.get('job_address') or ''}"
+    return job['job_description']
+
+
+def training_label(job, result, dimension, labels_by_category):
+    """A job's label for training: its ServiceM8 category where that names a work type, else the rule that fired
+
+    Jobs that only reached a fallback are not labelled, since the fallback
+    is a default rather than evidence.
+    """
+    if dimension == 'work_type' and result.current_category in labels_by_category:
+        return labels_by_category[result.current_category]
+    if getattr(result, EVIDENCE_FIELDS[dimension]):
+        return getattr(result, dimension)
+    return None
+
+
+def _softmax(scores):
+    top = max(scores)
+    exponentials = [math.exp(score - top) for score in scores]
+    total = sum(exponentials)
+    return [value / total for value in exponentials]
+
+
+class LinearModel:
+    """Softmax regression over L2-normalised TF-IDF vectors of hashed terms, for one dimension
+
+    `columns` maps each hash bucket seen in training to a row of
+    `weights` (one weight per label) and its IDF. Buckets never seen in
+    training have no weight, so they are dropped when vectorising.
+    """
+
+    def __init__(self, labels, columns, idf, weights, bias):
+        self.labels = labels
+        self.columns = columns
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        # Per label, the weight of every column, so the pure Python path sums with map()
+        self.label_weights = [list(column) for column in zip(*weights)] or [[] for _ in labels]
+        self.term_columns = {}
+        if np is not None:
+            self.weight_matrix = np.array(weights, dtype=np.float64).reshape(len(weights), len(labels))
+            self.bias_vector = np.array(bias, dtype=np.float64)
+
+    def vectorise(self, text):
+        """(columns, values) of a text's normalised TF-IDF vector"""
+        if len(self.term_columns) > MAX_CACHED_TERMS:
+            self.term_columns.clear()
+        counts = term_counts(text)
+        for term in [term for term in counts if term not in self.term_columns]:
+            self.term_columns[term] = self.columns.get(term_bucket(term))
+        vector = {}
+        for column, count in zip(map(self.term_columns.__getitem__, counts), counts.values()):
+            if column is not None:
+                # Two terms may share a bucket; their counts add up as they do in training
+                vector[column] = vector.get(column, 0) + count
+        columns = list(vector)
+        values = [(1 + math.log(count)) * idf for count, idf in zip(vector.values(), map(self.idf.__getitem__, columns))]
+        norm = math.sqrt(sum(map(operator.mul, values, values))) or 1.0
+        return columns, [value / norm for value in values]
+
+    def scores(self, vectors):
+        """Label scores for a batch of vectors, as one sparse product where SciPy is available"""
+        if np is None:
+            return [[bias + sum(map(operator.mul, map(weights.__getitem__, columns), values))
+                     for weights, bias in zip(self.label_weights, self.bias)] for columns, values in vectors]
+
+        indptr = np.cumsum([0] + [len(columns) for columns, _ in vectors])
+        indices = np.fromiter((column for columns, _ in vectors for column in columns), dtype=np.int64,
+                              count=indptr[-1])
+        data = np.fromiter((value for _, values in vectors for value in values), dtype=np.float64, count=indptr[-1])
+        if INFERENCE_BACKEND == 'scipy':
+            matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(vectors), len(self.weights)))
+            scores = matrix @ self.weight_matrix
+        else:
+            scores = np.zeros((len(vectors), len(self.labels)))
+            rows = np.repeat(np.arange(len(vectors)), np.diff(indptr))
+            np.add.at(scores, rows, self.weight_matrix[indices] * data[:, None])
+        return (scores + self.bias_vector).tolist()
+
+    def predict(self, texts):
+        """(label, probability) of each text's most likely label"""
+        predictions = []
+        for scores in self.scores([self.vectorise(text) for text in texts]):
+            probabilities = _softmax(scores)
+            best = max(range(len(probabilities)), key=probabilities.__getitem__)
+            predictions.append((self.labels[best], probabilities[best]))
+        return predictions
+
+    @classmethod
+    def train(cls, texts, labels, epochs=EPOCHS, learning_rate=LEARNING_RATE, seed=0):
+        """Fit by stochastic gradient descent on the cross-entropy, in a fixed shuffled order per seed"""
+        label_names = sorted(set(labels))
+        label_index = {label: index for index, label in enumerate(label_names)}
+        counts = [hashed_features(text) for text in texts]
+
+        document_frequency = {}
+        for features in counts:
+            for bucket in features:
+                document_frequency[bucket] = document_frequency.get(bucket, 0) + 1
+        kept = sorted(bucket for bucket, frequency in document_frequency.items() if frequency >= MIN_DOCUMENT_FREQUENCY)
+        columns = {bucket: column for column, bucket in enumerate(kept)}
+        idf = [math.log((1 + len(texts)) / (1 + document_frequency[bucket])) + 1 for bucket in kept]
+
+        model = cls(label_names, columns, idf, [[0.0] * len(label_names) for _ in columns], [0.0] * len(label_names))
+        examples = [(model.vectorise(text), label_index[label]) for text, label in zip(texts, labels)]
+        order = list(range(len(examples)))
+        generator = random.Random(seed)
+        for epoch in range(epochs):
+            generator.shuffle(order)
+            rate = learning_rate / (1 + epoch)
+            for position in order:
+                (columns_of_job, values), target = examples[position]
+                scores = list(model.bias)
+                for column, value in zip(columns_of_job, values):
+                    row = model.weights[column]
+                    for index in range(len(scores)):
+                        scores[index] += row[index] * value
+                gradient = _softmax(scores)
+                gradient[target] -= 1
+                for index, step in enumerate(gradient):
+                    model.bias[index] -= rate * step
+                for column, value in zip(columns_of_job, values):
+                    row = model.weights[column]
+                    for index, step in enumerate(gradient):
+                        row[index] -= rate * step * value
+        return cls(label_names, columns, idf, model.weights, model.bias)
+
+    def to_dict(self):
+        # Six decimals keep predictions unchanged in practice at a fraction of the file size
+        return {'labels': self.labels, 'buckets': list(self.columns), 'idf': [round(value, 6) for value in self.idf],
+                'weights': [[round(weight, 6) for weight in row] for row in self.weights],
+                'bias': [round(bias, 6) for bias in self.bias]}
+
+    @classmethod
+    def from_dict(cls, data):
+        columns = {bucket: column for column, bucket in enumerate(data['buckets'])}
+        return cls(data['labels'], columns, data['idf'], data['weights'], data['bias'])
+
+
+class LearnedClassifier:
+    """Learned work type and property type models, used alongside the keyword engine
+
+    In the default tie-break mode the keyword rules decide, and the model
+    only replaces a fallback label (no tier fired) when it is at least
+    `min_confidence` sure. The model's label then carries evidence such as
+    ('model 0.87',) in the same ClassificationResult record.
+    """
+
+    def __init__(self, models, trained_with, min_confidence=MIN_CONFIDENCE):
+        self.models = models
+        self.trained_with = trained_with
+        self.min_confidence = min_confidence
+
+    @classmethod
+    def load(cls, path, min_confidence=MIN_CONFIDENCE):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('hash_buckets') != HASH_BUCKETS:
+            raise ValueError(f"{path} was trained with {data.get('hash_buckets')} hash buckets, not {HASH_BUCKETS}")
+        models = {dimension: LinearModel.from_dict(model) for dimension, model in data['models'].items()}
+        return cls(models, data.get('ruleset_version'), min_confidence)
+
+    def save(self, path):
+        data = {'hash_buckets': HASH_BUCKETS, 'ruleset_version': self.trained_with,
+                'models': {dimension: model.to_dict() for dimension, model in self.models.items()}}
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump(data, f)
+        os.replace(f.name, path)
+
+    def predict(self, jobs, dimension):
+        return self.models[dimension].predict([dimension_text(job, dimension) for job in jobs])
+
+    def tie_break(self, classified, batch_size=BATCH_SIZE, prepare=None):
+        """Fill fallback labels of (job, result) pairs with confident model predictions, a batch at a time
+
+        `prepare`, if given, maps each job to the one whose text is scored
+        (e.g. with its boilerplate stripped); the pairs yielded keep the
+        original jobs.
+        """
+        classified = iter(classified)
+        while True:
+            batch = list(islice(classified, batch_size))
+            if not batch:
+                return
+            results = [result for _, result in batch]
+            for dimension, model in self.models.items():
+                evidence_field = EVIDENCE_FIELDS[dimension]
+                undecided = [index for index, result in enumerate(results) if not getattr(result, evidence_field)]
+                if not undecided:
+                    continue
+                jobs = [batch[index][0] for index in undecided]
+                predictions = self.predict(list(map(prepare, jobs)) if prepare else jobs, dimension)
+                for index, (label, probability) in zip(undecided, predictions):
+                    if probability >= self.min_confidence:
+                        results[index] = results[index]._replace(
+                            **{dimension: label, evidence_field: (f"model {probability:.2f}",)})
+            yield from ((job, result) for (job, _), result in zip(batch, results))
+
+
+def decided_by_model(result, dimension):
+    """Whether a result's label for the dimension came from the model rather than the keyword rules"""
+    evidence = getattr(result, EVIDENCE_FIELDS[dimension])
+    return len(evidence) == 1 and evidence[0].startswith('model ')
+
+
+def train_classifier(jobs, rules=RULES, seed=0):
+    """Train on labelled jobs; returns the classifier and held-out accuracy per dimension"""
+    labels = [label for label, _ in rules.tiers['work_type']] + [rules.fallback('work_type')]
+    labels_by_category = {determine_recommended_category(label, None): label for label in labels}
+
+    examples = {dimension: ([], [], [], []) for dimension in DIMENSIONS}
+    for job in jobs:
+        result = classify_job(job, rules)
+        # Hold out by job identity so that a rerun splits the same way
+        held_out = zlib.crc32(job_key(job).encode('utf-8')) % HOLDOUT_EVERY == 0
+        for dimension in DIMENSIONS:
+            label = training_label(job, result, dimension, labels_by_category)
+            if label is not None:
+                train_texts, train_labels, test_texts, test_labels = examples[dimension]
+                (test_texts if held_out else train_texts).append(dimension_text(job, dimension))
+                (test_labels if held_out else train_labels).append(label)
+
+    models, accuracy = {}, {}
+    for dimension, (train_texts, train_labels, test_texts, test_labels) in examples.items():
+        if len(set(train_labels)) < 2:
+            raise ValueError(f"Need at least two {dimension} labels to train on")
+        models[dimension] = LinearModel.train(train_texts, train_labels, seed=seed)
+        predictions = models[dimension].predict(test_texts)
+        correct = sum(label == expected for (label, _), expected in zip(predictions, test_labels))
+        accuracy[dimension] = {'train': len(train_texts), 'held_out': len(test_texts),
+                               'accuracy': round(correct / len(test_texts), 3) if test_texts else None}
+    return LearnedClassifier(models, RULESET_VERSION), accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or apply the learned work type and property type models")
+    parser.add_argument('--model', default='learned_model.json')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    train = subcommands.add_parser('train', help="Train on labelled jobs")
+    train.add_argument('--input', nargs='+', default=['all_jobs.csv', 'company_jobs_array.json'])
+    train.add_argument('--seed', type=int, default=0)
+    apply = subcommands.add_parser('tie-break', help="Classify jobs, letting the model decide where no keyword fires")
+    apply.add_argument('--input', default='all_jobs.csv')
+    apply.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        jobs = (job for path in args.input for job in iter_jobs(path))
+        classifier, accuracy = train_classifier(jobs, seed=args.seed)
+        classifier.save(args.model)
+        print(f"Model written to {args.model}")
+        for dimension, counts in accuracy.items():
+            print(f"  {dimension}: {len(classifier.models[dimension].labels)} labels, {counts['train']} training jobs, "
+                  f"{counts['accuracy']} accuracy on {counts['held_out']} held out")
+        return
+
+    classifier = LearnedClassifier.load(args.model, args.min_confidence)
+    decided = {dimension: {} for dimension in DIMENSIONS}
+    jobs = 0
+    for job, result in classifier.tie_break((job, classify_job(job)) for job in iter_jobs(args.input)):
+        jobs += 1
+        for dimension in DIMENSIONS:
+            if decided_by_model(result, dimension):
+                label = getattr(result, dimension)
+                decided[dimension][label] = decided[dimension].get(label, 0) + 1
+    print(f"{jobs} jobs classified from {args.input}")
+    for dimension, labels in decided.items():
+        print(f"  {dimension}: {sum(labels.values())} fallbacks decided by the model {json.dumps(labels)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+from array import array
+
+from job_reader import iter_jobs
+
+# NumPy is optional: with it the minimums are taken over one array, without it slot by slot (same signatures)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+# 16 bands of 4 rows: pairs above ~0.5 similarity usually share a band and are compared
+BANDS = 16
+THRESHOLD = 0.8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+WORD = re.compile(r'[a-z0-9]+')
+DIGITS = re.compile(r'[0-9]+')
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """The overlapping `size`-word runs of a description, as bytes
+
+    Words are lowercased and every run of digits counts as the same digit,
+    so insurer templates that differ only in claim numbers, limits and
+    dates shingle alike. Text shorter than one shingle has none.
+    """
+    words = [DIGITS.sub('0', word) for word in WORD.findall(text.lower())]
+    return {' '.join(words[start:start + size]).encode('utf-8') for start in range(len(words) - size + 1)}
+
+
+def _key_order(key):
+    return (0, int(key), '') if key.isdigit() else (1, 0, key)
+
+
+class NearDuplicateIndex:
+    """Clusters near-duplicate descriptions with MinHash signatures and LSH banding
+
+    Each description's shingle set is reduced to a MinHash signature whose
+    matching slots estimate Jaccard similarity. Signatures are split into
+    bands; jobs sharing any band are compared, and those whose estimated
+    similarity reaches `threshold` are joined into one cluster. Insertion is
+    incremental, and each band bucket keeps one representative job per
+    cluster, so a new job is compared with at most one job of each other
+    cluster sharing a band; even thousands of copies of one template
+    cluster in roughly linear time.
+
+    With a `path`, signatures are kept in SQLite keyed by job and reused
+    while the description is unchanged, so a rerun only signs new or
+    edited jobs; the banding itself is redone for the jobs added. Stored
+    signatures of jobs not added in a run (deleted or renumbered jobs) are
+    evicted by `prune()`, which `close()` calls.
+    """
+
+    def __init__(self, path=None, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+        if num_perm % bands:
+            raise ValueError(f"{num_perm} permutations do not split into {bands} bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        self.signatures = {}
+        self.buckets = {}
+        self.root_buckets = {}
+        self.parent = {}
+        self.smallest = {}
+        self.stored = {}
+        self.stale = []
+        self.pending = []
+        self.computed = 0
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path)
+            self.connection.executescript(SCHEMA)
+            self._load()
+
+    def _load(self):
+        parameters = {'shingle_words': SHINGLE_WORDS, 'num_perm': self.num_perm, 'hash': 'shake_128'}
+        stored = dict(self.connection.execute("SELECT name, value FROM parameters"))
+        if stored != {name: str(value) for name, value in parameters.items()}:
+            # Signatures from other parameters are not comparable, so start again
+            self.connection.execute("DELETE FROM signatures")
+            self.connection.execute("DELETE FROM parameters")
+            self.connection.executemany("INSERT INTO parameters (name, value) VALUES (?, ?)",
+                                        [(name, str(value)) for name, value in parameters.items()])
+            self.connection.commit()
+            return
+        for key, digest, blob in self.connection.execute("SELECT key, digest, signature FROM signatures"):
+            signature = array('I')
+            signature.frombytes(blob)
+            self.stored[key] = (digest, tuple(signature))
+
+    def signature(self, shingle_set):
+        """MinHash signature of a set of shingles: the minimum of each of `num_perm` hash functions over the set
+
+        One SHAKE-128 digest per shingle supplies all the hash values at
+        once, read as native unsigned 32-bit integers.
+        """
+        digests = [hashlib.shake_128(shingle).digest(4 * self.num_perm) for shingle in shingle_set]
+        if np is not None:
+            values = np.frombuffer(b''.join(digests), dtype=np.uint32).reshape(len(digests), self.num_perm)
+            return tuple(values.min(axis=0).tolist())
+        return tuple(map(min, zip(*(memoryview(digest).cast('I') for digest in digests))))
+
+    def similarity(self, first, second):
+        """Estimated Jaccard similarity of two jobs' descriptions"""
+        a, b = self.signatures[first], self.signatures[second]
+        return sum(x == y for x, y in zip(a, b)) / self.num_perm
+
+    def _find(self, key):
+        root = key
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[key] != root:
+            self.parent[key], key = root, self.parent[key]
+        return root
+
+    def _union(self, first, second):
+        first, second = self._find(first), self._find(second)
+        if first == second:
+            return
+        # The root in more buckets stays root, so fewer buckets are re-keyed
+        if len(self.root_buckets.get(first, ())) < len(self.root_buckets.get(second, ())):
+            first, second = second, first
+        self.parent[second] = first
+        self.smallest[first] = min(self.smallest[first], self.smallest.pop(second), key=_key_order)
+        for bucket_key in self.root_buckets.pop(second, ()):
+            bucket = self.buckets[bucket_key]
+            representative = bucket.pop(second)
+            if first not in bucket:
+                bucket[first] = representative
+                self.root_buckets.setdefault(first, set()).add(bucket_key)
+
+    def _insert(self, key, signature):
+        self.signatures[key] = signature
+        self.parent[key] = key
+        self.smallest[key] = key
+        for band in range(self.bands):
+            bucket_key = (band, signature[band * self.rows:(band + 1) * self.rows])
+            # One representative job per cluster root, so a band shared by a whole cluster costs one comparison
+            bucket = self.buckets.setdefault(bucket_key, {})
+            for other in list(bucket.values()):
+                if self._find(other) != self._find(key) and self.similarity(key, other) >= self.threshold:
+                    self._union(key, other)
+            root = self._find(key)
+            if root not in bucket:
+                bucket[root] = key
+                self.root_buckets.setdefault(root, set()).add(bucket_key)
+
+    def add(self, key, text):
+        """Add a job's description and return its cluster id
+
+        Descriptions too short to shingle are never clustered. Clusters are
+        never split, so adding a key again keeps its first description.
+        """
+        key = str(key)
+        if key in self.parent:
+            return self.cluster_id(key)
+        text = text or ''
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        stored = self.stored.pop(key, None)
+        if stored is not None and stored[0] == digest:
+            signature = stored[1]
+        else:
+            shingle_set = shingles(text)
+            if not shingle_set:
+                if stored is not None:
+                    self.stale.append(key)
+                return key
+            signature = self.signature(shingle_set)
+            self.computed += 1
+            if self.connection is not None:
+                self.pending.append((key, digest, array('I', signature).tobytes()))
+        self._insert(key, signature)
+        return self.cluster_id(key)
+
+    def cluster_id(self, key):
+        """The smallest job number in the job's cluster (its own key when it has no near-duplicates)"""
+        key = str(key)
+        return self.smallest[self._find(key)] if key in self.parent else key
+
+    def clusters(self):
+        """Clusters of two or more jobs, as cluster id -> member keys in key order"""
+        members = {}
+        for key in self.parent:
+            members.setdefault(self.cluster_id(key), []).append(key)
+        return {cluster: sorted(keys, key=_key_order) for cluster, keys in members.items() if len(keys) > 1}
+
+    def prune(self):
+        """Evict stored signatures of jobs that were not added in this run; returns the number removed"""
+        stale = list(self.stored) + self.stale
+        if self.connection is not None:
+            self.connection.executemany("DELETE FROM signatures WHERE key = ?", [(key,) for key in stale])
+        self.stored, self.stale = {}, []
+        return len(stale)
+
+    def commit(self):
+        if self.connection is not None:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO signatures (key, digest, signature) VALUES (?, ?, ?)", self.pending)
+            self.connection.commit()
+        self.pending = []
+
+    def close(self):
+        if self.connection is not None:
+            self.prune()
+            self.commit()
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default='all_jobs.csv',
+                        help="Jobs to cluster: a JSON array, a CSV such as all_jobs.csv, or a job store")
+    parser.add_argument('--store', help="SQLite file of signatures; only new or edited descriptions are signed again")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="Estimated Jaccard similarity at which two descriptions count as near-duplicates")
+    parser.add_argument('--output', default='near_duplicate_clusters.json')
+    parser.add_argument('--top', type=int, default=10, help="Largest clusters to print")
+    args = parser.parse_args()
+
+    descriptions = {}
+    with NearDuplicateIndex(args.store, args.threshold) as index:
+        for job in iter_jobs(args.input):
+            key = job.get('generated_job_id') or job.get('uuid')
+            if key and key not in descriptions:
+                index.add(key, job.get('job_description', ''))
+                descriptions[key] = job.get('job_description', '')
+        clusters = index.clusters()
+        evicted = index.prune()
+
+    ordered = sorted(clusters.items(), key=lambda item: (-len(item[1]), _key_order(item[0])))
+    with open(args.output, 'w') as f:
+        json.dump([{'cluster_id': cluster, 'jobs': keys} for cluster, keys in ordered], f, indent=2)
+
+    print(f"{sum(map(len, clusters.values()))} of {len(descriptions)} jobs fall into {len(clusters)} "
+          f"near-duplicate clusters ({index.computed} signatures computed, {evicted} stale evicted); "
+          f"written to {args.output}")
+    for cluster, keys in ordered[:args.top]:
+        snippet = ' '.join(descriptions.get(cluster, '').split())[:80]
+        print(f"  {cluster} ({len(keys)} jobs): {snippet}")
+
+if __name__ == "__main__":
+    main()
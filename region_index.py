@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import sqlite3
+import time
+from array import array
+from datetime import date, timedelta
+
+from classification_cache import job_key
+from classification_engine import classify_job
+from job_reader import iter_jobs
+
+LEVELS = ('postcode', 'city', 'state')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    job_key TEXT NOT NULL UNIQUE,
+    job_number TEXT NOT NULL,
+    postcode TEXT NOT NULL,
+    city TEXT NOT NULL,
+    state TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    work_type TEXT NOT NULL,
+    urgency_level TEXT NOT NULL,
+    amount REAL NOT NULL
+);
+"""
+
+
+def job_day(value):
+    """Proleptic ordinal of a job's date, or 0 when it is missing or a placeholder such as 0000-00-00"""
+    try:
+        return date.fromisoformat((value or '')[:10]).toordinal()
+    except ValueError:
+        return 0
+
+
+def _amount(value):
+    try:
+        return float(value or 0)
+    except ValueError:
+        return 0.0
+
+
+class RegionIndex:
+    """Per-region posting lists and rollups of classified jobs
+
+    Each job gets a dense integer id. For every postcode, city and state
+    (and every work type and urgency level) the ids of its jobs are kept as
+    a sorted array('I'); the job's day, codes and invoice amount sit in
+    parallel arrays. Job counts and invoice totals per region, work type and
+    urgency are kept up to date as jobs are added, so undated queries read
+    them directly. Dated queries filter the shortest applicable posting
+    list.
+
+    With a `path`, the jobs are kept in SQLite and the index is rebuilt from
+    them on load; adding a job that is already there with the same values
+    changes nothing.
+    """
+
+    def __init__(self, path=None):
+        self.ids = {}
+        self.job_numbers = []
+        self.days = array('i')
+        self.amounts = array('d')
+        self.codes = {name: array('I') for name in LEVELS + ('work_type', 'urgency_level')}
+        self.values = {name: [] for name in self.codes}
+        self.value_codes = {name: {} for name in self.codes}
+        self.postings = {name: {} for name in self.codes}
+        self.rollups = {level: {} for level in LEVELS}
+        self.pending = []
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path)
+            self.connection.executescript(SCHEMA)
+            for row in self.connection.execute(
+                    "SELECT job_key, job_number, postcode, city, state, day, work_type, urgency_level, amount "
+                    "FROM jobs ORDER BY id"):
+                self._set(*row)
+
+    def _code(self, name, value):
+        codes = self.value_codes[name]
+        if value not in codes:
+            codes[value] = len(self.values[name])
+            self.values[name].append(value)
+        return codes[value]
+
+    def _roll(self, job_id, sign):
+        work_type = self.codes['work_type'][job_id]
+        urgency_level = self.codes['urgency_level'][job_id]
+        for level in LEVELS:
+            cells = self.rollups[level].setdefault(self.codes[level][job_id], {})
+            cell = cells.setdefault((work_type, urgency_level), [0, 0.0])
+            cell[0] += sign
+            cell[1] += sign * self.amounts[job_id]
+            if not cell[0]:
+                del cells[(work_type, urgency_level)]
+
+    def _set(self, key, job_number, postcode, city, state, day, work_type, urgency_level, amount):
+        """Add a job or move an existing one to its new values; returns whether anything changed"""
+        values = {'postcode': postcode, 'city': city, 'state': state,
+                  'work_type': work_type, 'urgency_level': urgency_level}
+        job_id = self.ids.get(key)
+        if job_id is None:
+            job_id = self.ids[key] = len(self.job_numbers)
+            self.job_numbers.append(job_number)
+            self.days.append(day)
+            self.amounts.append(amount)
+            for name, value in values.items():
+                code = self._code(name, value)
+                self.codes[name].append(code)
+                # New ids are the largest yet, so appending keeps every posting list sorted
+                self.postings[name].setdefault(code, array('I')).append(job_id)
+            self._roll(job_id, 1)
+            return True
+
+        if (self.job_numbers[job_id] == job_number and self.days[job_id] == day and self.amounts[job_id] == amount
+                and all(self.values[name][self.codes[name][job_id]] == value for name, value in values.items())):
+            return False
+        self._roll(job_id, -1)
+        self.job_numbers[job_id] = job_number
+        self.days[job_id] = day
+        self.amounts[job_id] = amount
+        for name, value in values.items():
+            code = self._code(name, value)
+            old = self.codes[name][job_id]
+            if code != old:
+                self.postings[name][old].remove(job_id)
+                postings = self.postings[name].setdefault(code, array('I'))
+                postings.insert(bisect.bisect(postings, job_id), job_id)
+                self.codes[name][job_id] = code
+        self._roll(job_id, 1)
+        return True
+
+    def add(self, job, work_type, urgency_level):
+        """Index a classified job from an export row; re-adding a job updates it in place"""
+        row = (job_key(job), job['generated_job_id'], job.get('geo_postcode') or '', job.get('geo_city') or '',
+               job.get('geo_state') or '', job_day(job.get('date')), work_type, urgency_level,
+               _amount(job.get('total_invoice_amount')))
+        if self._set(*row) and self.connection is not None:
+            self.pending.append(row)
+
+    def __len__(self):
+        return len(self.job_numbers)
+
+    def latest_day(self):
+        return max(self.days, default=0)
+
+    def _matching(self, level, region, work_type, urgency_level, since, until):
+        """Ids of the jobs meeting every given condition, in id order"""
+        conditions = [(name, value) for name, value in
+                      ((level, region), ('work_type', work_type), ('urgency_level', urgency_level)) if value is not None]
+        lists = []
+        for name, value in conditions:
+            code = self.value_codes[name].get(value)
+            if code is None:
+                return []
+            lists.append((self.postings[name][code], name, code))
+        if lists:
+            candidates, narrowest, _ = min(lists, key=lambda item: len(item[0]))
+            checks = [(self.codes[name], code) for _, name, code in lists if name != narrowest]
+        else:
+            candidates, checks = range(len(self)), []
+        low = since.toordinal() if since else None
+        high = until.toordinal() if until else None
+        days = self.days
+        return [job_id for job_id in candidates
+                if all(codes[job_id] == code for codes, code in checks)
+                and (low is None or days[job_id] >= low) and (high is None or 0 < days[job_id] <= high)]
+
+    def rollup(self, level='postcode', region=None, work_type=None, urgency_level=None, since=None, until=None):
+        """Job count and invoice total per region of `level`, largest first
+
+        Without a date range the precomputed rollups answer directly;
+        `since` and `until` are inclusive dates, and undated jobs fall
+        outside any range.
+        """
+        totals = {}
+        if since is None and until is None:
+            work_type_code = self.value_codes['work_type'].get(work_type)
+            urgency_code = self.value_codes['urgency_level'].get(urgency_level)
+            rollups = self.rollups[level]
+            if region is not None:
+                code = self.value_codes[level].get(region)
+                rollups = {code: rollups[code]} if code in rollups else {}
+            for code, cells in rollups.items():
+                name = self.values[level][code]
+                for (cell_work_type, cell_urgency), (jobs, amount) in cells.items():
+                    if ((work_type is None or cell_work_type == work_type_code)
+                            and (urgency_level is None or cell_urgency == urgency_code)):
+                        total = totals.setdefault(name, [0, 0.0])
+                        total[0] += jobs
+                        total[1] += amount
+        else:
+            region_codes, region_values = self.codes[level], self.values[level]
+            for job_id in self._matching(level, region, work_type, urgency_level, since, until):
+                total = totals.setdefault(region_values[region_codes[job_id]], [0, 0.0])
+                total[0] += 1
+                total[1] += self.amounts[job_id]
+        return {name: {'jobs': jobs, 'invoice_total': round(amount, 2)}
+                for name, (jobs, amount) in sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))}
+
+    def job_numbers_in(self, level='postcode', region=None, work_type=None, urgency_level=None, since=None,
+                       until=None):
+        """Job numbers of the jobs meeting every given condition"""
+        return [self.job_numbers[job_id]
+                for job_id in self._matching(level, region, work_type, urgency_level, since, until)]
+
+    def commit(self):
+        if self.connection is not None:
+            self.connection.executemany(
+                "INSERT INTO jobs (job_key, job_number, postcode, city, state, day, work_type, urgency_level, amount) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (job_key) DO UPDATE SET "
+                "job_number = excluded.job_number, postcode = excluded.postcode, city = excluded.city, "
+                "state = excluded.state, day = excluded.day, work_type = excluded.work_type, "
+                "urgency_level = excluded.urgency_level, amount = excluded.amount", self.pending)
+            self.connection.commit()
+        self.pending = []
+
+    def close(self):
+        if self.connection is not None:
+            self.commit()
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--store', default='region_index.db', help="SQLite file the index is kept in")
+    parser.add_argument('--input', help="Classify the jobs in this export and add them to the index first")
+    parser.add_argument('--level', choices=LEVELS, default='postcode')
+    parser.add_argument('--region', help="Only this postcode, city or state")
+    parser.add_argument('--work-type')
+    parser.add_argument('--urgency')
+    parser.add_argument('--days', type=int, help="Only jobs dated in the last N days up to --as-of")
+    parser.add_argument('--as-of', type=date.fromisoformat,
+                        help="Last day of the --days window (default: the newest job date in the index)")
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    with RegionIndex(args.store) as index:
+        if args.input:
+            started = time.perf_counter()
+            for job in iter_jobs(args.input):
+                result = classify_job(job)
+                index.add(job, result.work_type, result.urgency_level)
+            added = len(index.pending)
+            index.commit()
+            print(f"Indexed {added} new or changed jobs from {args.input} in {time.perf_counter() - started:.1f}s; "
+                  f"{len(index)} jobs in {args.store}")
+
+        since = until = None
+        if args.days:
+            until = args.as_of or (date.fromordinal(index.latest_day()) if index.latest_day() else date.today())
+            since = until - timedelta(days=args.days - 1)
+        started = time.perf_counter()
+        totals = index.rollup(args.level, args.region, args.work_type, args.urgency, since, until)
+        elapsed = (time.perf_counter() - started) * 1000
+
+    window = f" from {since} to {until}" if since else ''
+    print(f"{sum(total['jobs'] for total in totals.values())} jobs in {len(totals)} {args.level} regions{window} "
+          f"({elapsed:.2f} ms)")
+    for region, total in list(totals.items())[:args.top]:
+        print(f"  {region or '(none)'}: {total['jobs']} jobs, ${total['invoice_total']:,.2f}")
+
+if __name__ == "__main__":
+    main()
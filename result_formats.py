@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import json
+import struct
+from array import array
+from itertools import islice
+
+FORMATS = ('json', 'ndjson', 'columnar')
+
+# File extension written for each output format
+EXTENSIONS = {'json': '.json', 'ndjson': '.ndjson', 'columnar': '.jcol'}
+
+COLUMNAR_MAGIC = b'JCOL1\n'
+
+# Rows buffered per row group when writing the columnar format
+ROW_GROUP_SIZE = 8192
+
+
+def write_json_rows(f, rows):
+    """Write dict rows as a JSON array, byte-identical to json.dump(list(rows), f, indent=2)"""
+    empty = True
+    for row in rows:
+        f.write('[\n  ' if empty else ',\n  ')
+        f.write(json.dumps(row, indent=2).replace('\n', '\n  '))
+        empty = False
+    f.write('[]' if empty else '\n]')
+
+
+def write_ndjson_rows(f, rows):
+    """Write one compact JSON object per line"""
+    for row in rows:
+        f.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')))
+        f.write('\n')
+
+
+def iter_ndjson_rows(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _encode_column(values):
+    """Encode one column chunk, picking the most compact of bool, dictionary and plain UTF-8 layouts"""
+    if all(value is True or value is False for value in values):
+        return 'bool', bytes(values)
+
+    if all(isinstance(value, str) for value in values):
+        distinct = list(dict.fromkeys(values))
+        if len(distinct) <= max(1, len(values) // 2):
+            codes = {value: code for code, value in enumerate(distinct)}
+            code_array = array('H' if len(distinct) <= 0xFFFF else 'I', map(codes.__getitem__, values))
+            header = json.dumps([code_array.typecode, distinct], ensure_ascii=False).encode('utf-8')
+            return 'dict', struct.pack('<I', len(header)) + header + code_array.tobytes()
+
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = array('I', [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        return 'utf8', offsets.tobytes() + b''.join(encoded)
+
+    return 'json', json.dumps(values, ensure_ascii=False).encode('utf-8')
+
+
+def _decode_column(encoding, data, rows):
+    if encoding == 'bool':
+        return [bool(byte) for byte in data]
+    if encoding == 'dict':
+        (header_length,) = struct.unpack_from('<I', data)
+        typecode, distinct = json.loads(data[4:4 + header_length])
+        codes = array(typecode)
+        codes.frombytes(data[4 + header_length:])
+        return [distinct[code] for code in codes]
+    if encoding == 'utf8':
+        offsets = array('I')
+        offsets.frombytes(data[:(rows + 1) * 4])
+        blob = data[(rows + 1) * 4:]
+        return [blob[offsets[index]:offsets[index + 1]].decode('utf-8') for index in range(rows)]
+    return json.loads(data)
+
+
+def write_columnar_rows(f, rows, index_field=None):
+    """Write dict rows in the columnar layout, one row group at a time
+
+    Layout: magic, then row groups of column chunks, then a JSON footer
+    listing each chunk's offset, size and encoding (and, when
+    `index_field` is given, the row number of each value of that field),
+    then the footer length and the magic again. Only one row group is
+    held in memory while writing.
+    """
+    f.write(COLUMNAR_MAGIC)
+    offset = len(COLUMNAR_MAGIC)
+    footer = {'columns': None, 'rows': 0, 'row_groups': [], 'index': {} if index_field else None}
+
+    rows = iter(rows)
+    while True:
+        group = list(islice(rows, ROW_GROUP_SIZE))
+        if not group:
+            break
+        if footer['columns'] is None:
+            footer['columns'] = list(group[0])
+
+        chunks = {}
+        for name in footer['columns']:
+            encoding, data = _encode_column([row[name] for row in group])
+            f.write(data)
+            chunks[name] = [offset, len(data), encoding]
+            offset += len(data)
+
+        if index_field:
+            for position, row in enumerate(group, footer['rows']):
+                footer['index'][row[index_field]] = position
+        footer['row_groups'].append({'rows': len(group), 'chunks': chunks})
+        footer['rows'] += len(group)
+
+    encoded_footer = json.dumps(footer, ensure_ascii=False).encode('utf-8')
+    f.write(encoded_footer)
+    f.write(struct.pack('<Q', len(encoded_footer)))
+    f.write(COLUMNAR_MAGIC)
+
+
+class ColumnarFile:
+    """Reader for the columnar layout that only decodes the columns asked for"""
+
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        tail_size = 8 + len(COLUMNAR_MAGIC)
+        self.f.seek(-tail_size, 2)
+        tail = self.f.read(tail_size)
+        if tail[8:] != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} is not a columnar results file")
+        (footer_length,) = struct.unpack('<Q', tail[:8])
+        self.f.seek(-(tail_size + footer_length), 2)
+        self.footer = json.loads(self.f.read(footer_length))
+        self.columns = self.footer['columns'] or []
+        self.index = self.footer['index']
+
+    def __len__(self):
+        return self.footer['rows']
+
+    def column(self, name):
+        """Return every value of one column"""
+        values = []
+        for group in self.footer['row_groups']:
+            offset, size, encoding = group['chunks'][name]
+            self.f.seek(offset)
+            values.extend(_decode_column(encoding, self.f.read(size), group['rows']))
+        return values
+
+    def iter_rows(self, names=None):
+        """Yield rows as dicts, decoding one row group at a time"""
+        names = names or self.columns
+        for group in self.footer['row_groups']:
+            columns = []
+            for name in names:
+                offset, size, encoding = group['chunks'][name]
+                self.f.seek(offset)
+                columns.append(_decode_column(encoding, self.f.read(size), group['rows']))
+            for values in zip(*columns):
+                yield dict(zip(names, values))
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def write_rows(basename, rows, output_format='json', index_field=None):
+    """Write result rows to basename + the format's extension; returns the path written"""
+    path = basename + EXTENSIONS[output_format]
+    if output_format == 'columnar':
+        with open(path, 'wb') as f:
+            write_columnar_rows(f, rows, index_field)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            if output_format == 'ndjson':
+                write_ndjson_rows(f, rows)
+            else:
+                write_json_rows(f, rows)
+    return path
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from csv_index import CsvJobIndex
+from result_formats import ColumnarFile, iter_ndjson_rows
+
+# Fields the viewers filter on; each gets an inverted index of value -> row ids
+FILTER_FIELDS = ['work_type', 'urgency_level', 'property_type', 'status', 'needs_change',
+                 'current_category', 'recommended_category']
+
+# Fields the viewer's search box matches against (case-insensitive substring)
+SEARCH_FIELDS = ['job_number', 'job_description_snippet', 'job_address']
+
+# Static files served next to the API
+STATIC_EXTENSIONS = ('.html', '.json', '.ndjson', '.jcol')
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def load_results(path):
+    """Load classification result rows written in any of the result_formats formats"""
+    if path.endswith('.jcol'):
+        with ColumnarFile(path) as columnar:
+            return list(columnar.iter_rows())
+    if path.endswith('.ndjson'):
+        return list(iter_ndjson_rows(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+WORD = re.compile(r'\w+')
+
+
+class ResultIndex:
+    """Classification results with inverted indexes for filtered, paginated queries
+
+    Each filter field maps its values to the set of row ids holding them,
+    so a filter is a set intersection starting from the smallest posting
+    set. Search is case-insensitive substring matching, like the viewers'
+    search box. Any text containing the term has the term's longest word
+    inside one of its word tokens, so the token index narrows the rows to
+    those with such a token and the candidates are then checked field by
+    field.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.all_rows = frozenset(range(len(rows)))
+        self.postings = {field: {} for field in FILTER_FIELDS}
+        self.search_text = []
+        self.tokens = {}
+
+        for row_id, row in enumerate(rows):
+            for field in FILTER_FIELDS:
+                if field in row:
+                    self.postings[field].setdefault(_filter_value(row[field]), set()).add(row_id)
+
+            fields = tuple((row.get(field) or '').lower() for field in SEARCH_FIELDS)
+            self.search_text.append(fields)
+            for token in set(WORD.findall(' '.join(fields))):
+                postings = self.tokens.get(token)
+                if postings is None:
+                    postings = self.tokens[token] = set()
+                postings.add(row_id)
+
+        self.full_counts = {
+            field: {value: len(rows) for value, rows in posting.items()}
+            for field, posting in self.postings.items()
+        }
+
+    def _rows_with_word(self, word):
+        """Rows having a token that contains the word; the vocabulary is much smaller than the text"""
+        return set().union(*(rows for token, rows in self.tokens.items() if word in token))
+
+    def _search(self, term, candidates):
+        term = term.lower()
+        words = WORD.findall(term)
+        if words:
+            candidates = candidates & self._rows_with_word(max(words, key=len))
+        return {row_id for row_id in candidates
+                if any(term in text for text in self.search_text[row_id])}
+
+    def query(self, filters=None, search='', offset=0, limit=DEFAULT_PAGE_SIZE):
+        """Return one page of matching rows, the total match count and per-field counts
+
+        `filters` maps field names to a value (or a list of accepted values).
+        Rows keep their order in the results file.
+        """
+        posting_sets = []
+        for field, accepted in (filters or {}).items():
+            if field not in self.postings:
+                raise ValueError(f"Unknown filter field: {field}")
+            accepted = accepted if isinstance(accepted, (list, tuple)) else [accepted]
+            posting = self.postings[field]
+            posting_sets.append(set().union(*(posting.get(_filter_value(value), ()) for value in accepted)))
+
+        posting_sets.sort(key=len)
+        matches = set(posting_sets[0]) if posting_sets else set(self.all_rows)
+        for posting in posting_sets[1:]:
+            matches &= posting
+        if search:
+            matches = self._search(search, matches)
+
+        ordered = sorted(matches)
+        if len(matches) == len(self.rows):
+            counts = self.full_counts
+        else:
+            counts = {
+                field: {value: len(rows & matches) for value, rows in posting.items() if not rows.isdisjoint(matches)}
+                for field, posting in self.postings.items()
+            }
+        return {
+            'total': len(ordered),
+            'offset': offset,
+            'counts': counts,
+            'jobs': [self.rows[row_id] for row_id in ordered[offset:offset + limit]]
+        }
+
+
+def _filter_value(value):
+    """Normalise filter values so that JSON booleans and query-string 'true'/'false' agree"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+class QueryRequestHandler(SimpleHTTPRequestHandler):
+    """Serves /api/jobs queries from the index, /api/job source records, and everything else as static files"""
+
+    def __init__(self, *args, index, jobs=None, **kwargs):
+        self.index = index
+        self.jobs = jobs
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/api/job':
+            return self._send_job(parse_qs(url.query))
+        if url.path != '/api/jobs':
+            # Only the viewers and result files; never scripts such as config.js
+            if not url.path.endswith(STATIC_EXTENSIONS):
+                return self.send_error(404)
+            return super().do_GET()
+
+        params = parse_qs(url.query)
+        try:
+            offset = max(0, int(params.pop('offset', ['0'])[0]))
+            limit = min(MAX_PAGE_SIZE, max(0, int(params.pop('limit', [str(DEFAULT_PAGE_SIZE)])[0])))
+            search = params.pop('q', [''])[0]
+            result = self.index.query(params, search, offset, limit)
+        except ValueError as error:
+            return self._send_json({'error': str(error)}, 400)
+        self._send_json(result)
+
+    def _send_job(self, params):
+        """The full exported record of one job, by job_number or uuid, read from the indexed CSV"""
+        if self.jobs is None:
+            return self._send_json({'error': "No job export is being served"}, 404)
+        if 'job_number' not in params and 'uuid' not in params:
+            return self._send_json({'error': "Give a job_number or uuid"}, 400)
+        # Picks up rows appended to the export since the last request
+        self.jobs.refresh()
+        job = self.jobs.get(job_number=params.get('job_number', [None])[0], uuid=params.get('uuid', [None])[0])
+        if job is None:
+            return self._send_json({'error': "No such job"}, 404)
+        self._send_json(job)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--results', default='three_dimensional_job_classification.json',
+                        help="Classification results to serve (.json, .ndjson or .jcol)")
+    parser.add_argument('--jobs', default='all_jobs.csv',
+                        help="CSV export whose full records /api/job serves, through a byte-offset index")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    index = ResultIndex(load_results(args.results))
+    jobs = CsvJobIndex(args.jobs) if os.path.exists(args.jobs) else None
+    handler = partial(QueryRequestHandler, index=index, jobs=jobs, directory=os.path.dirname(os.path.abspath(__file__)))
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Serving {len(index.rows)} jobs from {args.results} at http://{args.host}:{args.port}/")
+    print(f"  Viewer: http://{args.host}:{args.port}/three_dimensional_viewer.html")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import asyncio
+import http.client
+import random
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from servicem8_sync import SERVICEM8_API_BASE, get_auth_headers
+
+# Statuses worth retrying; anything else in the 4xx range is returned to the caller
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+MAX_BACKOFF = 60.0
+
+
+class RateLimiter:
+    """Spaces requests across all workers to at most `rate` per second
+
+    A 429 or 503 pauses every worker until the server's Retry-After has
+    passed, not just the one that was refused.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self.paused_until > now:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            if self.paused_until <= loop.time():
+                return
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, asyncio.get_running_loop().time() + seconds)
+
+
+class ApiConnection:
+    """One persistent HTTP(S) connection to the API, reconnected after any transport error"""
+
+    def __init__(self, api_base, timeout):
+        url = urlsplit(api_base)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.base_path = url.path.rstrip('/')
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, body, headers):
+        """Blocking request; returns (status, headers, body)"""
+        if self.connection is None:
+            self.connection = self.connection_class(self.netloc, timeout=self.timeout)
+        try:
+            self.connection.request(method, self.base_path + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.headers, response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def _retry_after(headers):
+    try:
+        return max(0.0, float(headers.get('Retry-After', '')))
+    except ValueError:
+        return None
+
+
+class ServiceM8Client:
+    """Asynchronous ServiceM8 API access over a pool of keep-alive connections
+
+    At most `concurrency` requests are in flight, each on a pooled
+    connection and a thread of its own, and requests are spaced by a shared
+    RateLimiter. Failed requests are retried with exponential backoff and
+    full jitter, or after the server's Retry-After. Use as an async context
+    manager so the connections and threads are released.
+    """
+
+    def __init__(self, api_base=SERVICEM8_API_BASE, headers=None, concurrency=8, rate=10.0, max_attempts=6,
+                 timeout=30):
+        self.api_base = api_base
+        self.headers = headers if headers is not None else get_auth_headers()
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.requests = 0
+        self.retries = 0
+        self.executor = None
+        self.pool = None
+
+    async def __aenter__(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.pool = asyncio.Queue()
+        for _ in range(self.concurrency):
+            self.pool.put_nowait(ApiConnection(self.api_base, self.timeout))
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+        self.executor.shutdown()
+
+    async def request(self, method, path, body=None):
+        """Send a request, retrying transient failures; returns (status, body, error)
+
+        `error` is None for a 2xx response. `status` is None when no response
+        arrived at all.
+        """
+        loop = asyncio.get_running_loop()
+        status, error = None, None
+        connection = await self.pool.get()
+        try:
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    self.retries += 1
+                await self.limiter.acquire()
+                self.requests += 1
+                try:
+                    status, headers, response = await loop.run_in_executor(
+                        self.executor, connection.request, method, path, body, self.headers)
+                except (OSError, http.client.HTTPException) as transport_error:
+                    status, error, delay = None, str(transport_error), None
+                else:
+                    if 200 <= status < 300:
+                        return status, response, None
+                    error = response.decode('utf-8', 'replace')[:500]
+                    if status not in RETRY_STATUSES:
+                        return status, response, error
+                    delay = _retry_after(headers)
+                    if delay is not None:
+                        self.limiter.pause(delay)
+
+                # No wait after the last attempt; the caller has the failure at once
+                if attempt + 1 < self.max_attempts:
+                    if delay is None:
+                        delay = random.uniform(0, min(MAX_BACKOFF, 0.5 * 2 ** attempt))
+                    await asyncio.sleep(delay)
+            return status, None, error
+        finally:
+            self.pool.put_nowait(connection)
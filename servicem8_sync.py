@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import argparse
+import base64
+import json
+import os
+import urllib.parse
+import urllib.request
+
+from job_store import JobStore
+
+SERVICEM8_API_BASE = os.environ.get('SERVICEM8_API_BASE', 'https://api.servicem8.com/api_1.0')
+
+def get_auth_headers(api_key=None):
+    """ServiceM8 uses Basic Auth with the API key as username and 'x' as password"""
+    api_key = api_key or os.environ.get('SERVICEM8_API_KEY')
+    if not api_key:
+        raise SystemExit("SERVICEM8_API_KEY is not set; export the ServiceM8 API key to call the API")
+    credentials = base64.b64encode(f"{api_key}:x".encode('utf-8')).decode('ascii')
+    return {
+        'Authorization': f'Basic {credentials}',
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+
+def fetch_jobs(api_base, headers, since=None, timeout=120):
+    """Fetch job records, only those edited at or after `since` when it is given"""
+    url = f"{api_base}/job.json"
+    if since:
+        # 'ge' rather than 'gt': jobs edited in the same second as the last
+        # sync are fetched again, and the upsert makes that harmless
+        url += '?$filter=' + urllib.parse.quote(f"edit_date ge '{since}'")
+    request = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+def sync_jobs(store, api_base=SERVICEM8_API_BASE, headers=None, full=False):
+    """Pull jobs changed since the store's high-water mark and upsert them
+
+    Returns the number of records received.
+    """
+    since = None if full else store.high_water_mark()
+    jobs = fetch_jobs(api_base, headers if headers is not None else get_auth_headers(), since)
+    written, latest = store.upsert(jobs)
+    if latest and (since is None or latest > since):
+        store.set_high_water_mark(latest)
+    store.commit()
+    return written
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--store', default='servicem8_jobs.db',
+                        help="SQLite job store to update (classifiers read it with --input)")
+    parser.add_argument('--full', action='store_true',
+                        help="Ignore the high-water mark and pull every job")
+    parser.add_argument('--api-base', default=SERVICEM8_API_BASE)
+    args = parser.parse_args()
+
+    headers = get_auth_headers()
+    with JobStore(args.store) as store:
+        since = store.high_water_mark()
+        print(f"🔄 Syncing jobs {'(full pull)' if args.full or not since else f'edited since {since}'}...")
+        received = sync_jobs(store, args.api_base, headers, args.full)
+        print(f"✅ Received {received} changed jobs; store now holds {store.count()} jobs")
+        print(f"High-water mark: {store.high_water_mark()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import time
+
+from classification_engine import classify_scanned, determine_recommended_category, rules_version
+from classification_rules import RULES_PATH, load_rules
+from job_reader import iter_jobs
+from keyword_matcher import KeywordMatcher
+from result_formats import write_ndjson_rows
+
+FIELDS = ('work_type', 'urgency_level', 'property_type', 'recommended_category')
+
+EVIDENCE_FIELDS = {'work_type': 'work_type_evidence', 'urgency_level': 'urgency_evidence',
+                   'property_type': 'property_type_evidence'}
+
+
+def _labels(result):
+    labels = result._asdict()
+    labels['recommended_category'] = determine_recommended_category(result.work_type, result.urgency_level)
+    return labels
+
+
+class ShadowEvaluator:
+    """Classifies jobs with a baseline and a candidate ruleset from one scan of each job's text
+
+    A single KeywordMatcher over the union of both rulesets' keywords finds
+    every keyword in the normalised description (and description plus
+    address) once; each ruleset then picks its tiers from those keywords.
+    Jobs are compared as they stream past, so only the changed ones and the
+    confusion matrices are kept.
+    """
+
+    def __init__(self, baseline, candidate):
+        self.baseline = baseline
+        self.candidate = candidate
+        self.matcher = KeywordMatcher([('shadow', set(baseline.matcher.groups) | set(candidate.matcher.groups))])
+        self.jobs = 0
+        self.changed = 0
+        self.changes = {field: 0 for field in FIELDS}
+        self.confusion = {field: {} for field in FIELDS}
+
+    def classify(self, job):
+        """(baseline result, candidate result) for one job"""
+        desc_lower = job['job_description'].lower()
+        address_lower = (job.get('job_address') or '').lower()
+        desc_keywords = self.matcher.scan_keywords(desc_lower)
+        joined_keywords = self.matcher.scan_joined_keywords(desc_lower, address_lower)
+        return tuple(classify_scanned(rules.current_category(job), desc_keywords, joined_keywords, rules)
+                     for rules in (self.baseline, self.candidate))
+
+    def compare(self, job):
+        """Tally one job in the confusion matrices; returns its diff row, or None when nothing changed"""
+        baseline, candidate = map(_labels, self.classify(job))
+        self.jobs += 1
+        changed = [field for field in FIELDS if baseline[field] != candidate[field]]
+        for field in FIELDS:
+            row = self.confusion[field].setdefault(baseline[field], {})
+            row[candidate[field]] = row.get(candidate[field], 0) + 1
+        if not changed:
+            return None
+
+        self.changed += 1
+        diff = {'job_number': job['generated_job_id'], 'current_category': baseline['current_category'],
+                'changed': changed}
+        for field in FIELDS:
+            diff[field] = {'baseline': baseline[field], 'candidate': candidate[field]}
+            evidence = EVIDENCE_FIELDS.get(field)
+            if evidence and field in changed:
+                diff[field]['baseline_evidence'] = list(baseline[evidence])
+                diff[field]['candidate_evidence'] = list(candidate[evidence])
+            if field in changed:
+                self.changes[field] += 1
+        description = job['job_description']
+        diff['job_description_snippet'] = description[:200] + '...' if len(description) > 200 else description
+        return diff
+
+    def diffs(self, jobs):
+        """Stream the diff rows of the jobs whose labels changed"""
+        for job in jobs:
+            diff = self.compare(job)
+            if diff is not None:
+                yield diff
+
+    def summary(self):
+        return {
+            'baseline_ruleset': rules_version(self.baseline),
+            'candidate_ruleset': rules_version(self.candidate),
+            'total_jobs': self.jobs,
+            'jobs_changed': self.changed,
+            'changes_by_field': self.changes,
+            'confusion': self.confusion
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two rule files over the same jobs and list the jobs whose labels change")
+    parser.add_argument('--baseline', default=RULES_PATH, help="Rule file in use now")
+    parser.add_argument('--candidate', required=True, help="Edited rule file to evaluate")
+    parser.add_argument('--input', default='all_jobs.csv',
+                        help="Jobs to classify: a JSON array, a CSV such as all_jobs.csv, or a job store")
+    parser.add_argument('--diff', default='shadow_diff.ndjson', help="Changed jobs, one JSON object per line")
+    parser.add_argument('--summary', default='shadow_summary.json', help="Change counts and confusion matrices")
+    args = parser.parse_args()
+
+    try:
+        evaluator = ShadowEvaluator(load_rules(args.baseline)['job_dimensions'],
+                                    load_rules(args.candidate)['job_dimensions'])
+    except ValueError as error:
+        raise SystemExit(f"Invalid rule file: {error}")
+
+    started = time.perf_counter()
+    with open(args.diff, 'w', encoding='utf-8') as f:
+        write_ndjson_rows(f, evaluator.diffs(iter_jobs(args.input)))
+    elapsed = time.perf_counter() - started
+
+    summary = evaluator.summary()
+    with open(args.summary, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Shadow run of {summary['candidate_ruleset']} against {summary['baseline_ruleset']}: "
+          f"{summary['jobs_changed']} of {summary['total_jobs']} jobs change ({elapsed:.1f}s)")
+    for field in FIELDS:
+        moves = [(count, baseline, candidate) for baseline, row in summary['confusion'][field].items()
+                 for candidate, count in row.items() if baseline != candidate]
+        print(f"  {field}: {summary['changes_by_field'][field]} changed")
+        for count, baseline, candidate in sorted(moves, reverse=True)[:5]:
+            print(f"    {baseline} -> {candidate}: {count}")
+    print(f"Diff written to {args.diff}, confusion matrices to {args.summary}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import random
+import re
+import uuid
+
+from classification_engine import CATEGORY_MAP
+from job_reader import iter_jobs
+
+# Descriptions are recombined from the sentences and lines of real ones
+FRAGMENT_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+
+# Share of a synthetic description's fragments taken from its own source job
+SOURCE_FRAGMENT_SHARE = 0.5
+
+FIELDNAMES = ['uuid', 'generated_job_id', 'status', 'category_uuid', 'job_address',
+              'job_description', 'total_invoice_amount']
+
+
+class SyntheticJobGenerator:
+    """Generate job records whose text statistics follow a real export
+
+    Every synthetic job starts from a randomly chosen real job and has the
+    same number of description fragments (sentences or lines), so the
+    description-length distribution is preserved. Half of the fragments
+    come from the source job and half from the whole corpus, so keywords
+    occur at their real rates but in new combinations. Addresses, amounts
+    and statuses are sampled from the corpus and categories uniformly from
+    the known ServiceM8 categories. Output is deterministic for a seed.
+    """
+
+    def __init__(self, source_path='all_jobs.csv', seed=0):
+        self.random = random.Random(seed)
+        self.sources = []
+        self.fragments = []
+        self.addresses = []
+        self.amounts = []
+        self.statuses = []
+        for job in iter_jobs(source_path):
+            fragments = [fragment for fragment in FRAGMENT_SPLIT.split(job['job_description']) if fragment.strip()]
+            if not fragments:
+                continue
+            self.sources.append(fragments)
+            self.fragments.extend(fragments)
+            self.addresses.append(job.get('job_address') or '')
+            self.amounts.append(job.get('total_invoice_amount') or '0.0000')
+            self.statuses.append(job.get('status') or 'Completed')
+        if not self.sources:
+            raise ValueError(f"No job descriptions found in {source_path}")
+        self.categories = list(CATEGORY_MAP)
+
+    def job(self, number):
+        rng = self.random
+        source = rng.choice(self.sources)
+        fragments = [rng.choice(source) if rng.random() < SOURCE_FRAGMENT_SHARE else rng.choice(self.fragments)
+                     for _ in source]
+        return {
+            'uuid': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'generated_job_id': str(number),
+            'status': rng.choice(self.statuses),
+            'category_uuid': rng.choice(self.categories),
+            'job_address': rng.choice(self.addresses),
+            'job_description': ' '.join(fragments),
+            'total_invoice_amount': rng.choice(self.amounts)
+        }
+
+    def jobs(self, count):
+        """Yield `count` synthetic jobs numbered from 1"""
+        for number in range(1, count + 1):
+            yield self.job(number)
+
+
+def write_csv(path, jobs):
+    """Write jobs as a CSV export that job_reader.iter_jobs can stream back"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('count', type=int, help="Number of jobs to generate")
+    parser.add_argument('--output', default='synthetic_jobs.csv')
+    parser.add_argument('--source', default='all_jobs.csv', help="Real export to sample from")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generator = SyntheticJobGenerator(args.source, args.seed)
+    write_csv(args.output, generator.jobs(args.count))
+    print(f"Wrote {args.count} synthetic jobs to {args.output}")
+
+if __name__ == "__main__":
+    main()
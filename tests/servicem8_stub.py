@@ -0,0 +1,127 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PATH = '/api_1.0'
+
+EDITED_SINCE = re.compile(r"^edit_date ge '(.+)'$")
+
+JOB_UPDATE = re.compile(rf"^{API_PATH}/job/([0-9A-Za-z-]+)\.json$")
+
+
+class StubServiceM8:
+    """The ServiceM8 job API on a local port, refusing and cutting off requests on demand
+
+    GET /job.json lists the jobs and POST /job/{uuid}.json updates one,
+    counting the updates made to each job in `updates`. A `rate_limited`
+    share of requests is refused with a 429 and Retry-After: 0, drawn from a
+    seeded generator so a run is repeatable. The next `stall_next` responses
+    that are not refused, and every update to a job in `stall_jobs`, send
+    half their body and then nothing for `stall_seconds`, so the client
+    times out mid-page; a stalled update is not made. Every request is
+    recorded as (method, path, status, headers).
+    """
+
+    def __init__(self, jobs=(), rate_limited=0.0, seed=0, stall_seconds=2.0):
+        self.jobs = {job['uuid']: dict(job) for job in jobs}
+        self.rate_limited = rate_limited
+        self.random = random.Random(seed)
+        self.stall_next = 0
+        self.stall_jobs = set()
+        self.stall_seconds = stall_seconds
+        self.updates = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{API_PATH}"
+
+    def statuses(self):
+        return [status for _, _, status, _ in self.requests]
+
+    def refuse(self):
+        with self.lock:
+            return self.random.random() < self.rate_limited
+
+    def stall(self):
+        with self.lock:
+            if self.stall_next:
+                self.stall_next -= 1
+                return True
+            return False
+
+    def job_list(self, query):
+        edit_filter = parse_qs(query).get('$filter')
+        since = EDITED_SINCE.match(edit_filter[0]).group(1) if edit_filter else None
+        with self.lock:
+            jobs = [dict(job) for job in self.jobs.values() if since is None or job['edit_date'] >= since]
+        return sorted(jobs, key=lambda job: job['uuid'])
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlsplit(self.path)
+        if url.path != f"{API_PATH}/job.json":
+            self.reply(404, {'errorCode': 404, 'message': 'Not found'})
+        elif stub.refuse():
+            self.reply(429, {'errorCode': 429, 'message': 'Rate limit exceeded'}, {'Retry-After': '0'})
+        else:
+            self.reply(200, stub.job_list(url.query), stall=stub.stall())
+
+    def do_POST(self):
+        stub = self.server.stub
+        changes = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        match = JOB_UPDATE.match(urlsplit(self.path).path)
+        if not match or match.group(1) not in stub.jobs:
+            self.reply(404, {'errorCode': 404, 'message': 'Not found'})
+        elif stub.refuse():
+            self.reply(429, {'errorCode': 429, 'message': 'Rate limit exceeded'}, {'Retry-After': '0'})
+        elif match.group(1) in stub.stall_jobs or stub.stall():
+            self.reply(200, {'errorCode': 0, 'message': 'OK'}, stall=True)
+        else:
+            job_uuid = match.group(1)
+            with stub.lock:
+                stub.jobs[job_uuid].update(changes)
+                stub.updates[job_uuid] = stub.updates.get(job_uuid, 0) + 1
+            self.reply(200, {'errorCode': 0, 'message': 'OK'})
+
+    def reply(self, status, payload, headers=None, stall=False):
+        stub = self.server.stub
+        with stub.lock:
+            stub.requests.append((self.command, self.path, status, dict(self.headers)))
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if stall:
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            time.sleep(stub.stall_seconds)
+            self.close_connection = True
+            return
+        self.wfile.write(body)
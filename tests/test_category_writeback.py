@@ -0,0 +1,52 @@
+import asyncio
+
+from category_writeback import CategoryWriteback, WritebackCheckpoint, index_jobs, plan_updates
+from servicem8_client import ServiceM8Client
+from servicem8_stub import StubServiceM8
+
+OLD_CATEGORY = 'category-old'
+NEW_CATEGORY = 'category-new'
+
+
+def _jobs(count):
+    return [{'uuid': f"job-{number:04d}", 'generated_job_id': str(number), 'category_uuid': OLD_CATEGORY}
+            for number in range(count)]
+
+
+def _apply(checkpoint, updates, api_base, max_attempts):
+    async def run():
+        async with ServiceM8Client(api_base, headers={}, concurrency=4, rate=500.0, max_attempts=max_attempts,
+                                   timeout=0.5) as client:
+            return await CategoryWriteback(checkpoint, client).run(updates)
+    return asyncio.run(run())
+
+
+def test_interrupted_writeback_resumes_from_the_checkpoint(tmp_path):
+    jobs = _jobs(40)
+    job_uuids, categories = index_jobs(jobs)
+    rows = [{'job_number': job['generated_job_id'], 'recommended_category': 'Maintenance'} for job in jobs]
+    updates, _ = plan_updates(rows, job_uuids, categories, {'Maintenance': NEW_CATEGORY})
+    path = str(tmp_path / 'writeback.db')
+
+    with StubServiceM8(jobs, rate_limited=0.3, seed=11) as stub:
+        # The first run gives up early: two jobs always time out mid-response, and others may be refused twice
+        stub.stall_jobs = {'job-0003', 'job-0017'}
+        with WritebackCheckpoint(path) as checkpoint:
+            counts = _apply(checkpoint, updates, stub.api_base, max_attempts=2)
+        with WritebackCheckpoint(path) as checkpoint:
+            applied = checkpoint.applied()
+        assert counts == {'applied': len(applied), 'failed': len(updates) - len(applied)}
+        assert 'job-0003' not in applied and 'job-0017' not in applied
+        assert set(stub.updates) == set(applied)
+
+        stub.stall_jobs = set()
+        with WritebackCheckpoint(path) as checkpoint:
+            remaining = [update for update in updates if applied.get(update[0]) != update[3]]
+            counts = _apply(checkpoint, remaining, stub.api_base, max_attempts=10)
+            assert counts == {'applied': len(remaining), 'failed': 0}
+            assert checkpoint.applied() == {job['uuid']: NEW_CATEGORY for job in jobs}
+
+    # The resumed run wrote only what the first had not, so no job was updated twice
+    assert stub.updates == {job['uuid']: 1 for job in jobs}
+    assert all(job['category_uuid'] == NEW_CATEGORY for job in stub.jobs.values())
+    assert 429 in stub.statuses()
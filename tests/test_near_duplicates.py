@@ -0,0 +1,32 @@
+import time
+
+from near_duplicates import NearDuplicateIndex
+
+TEMPLATE = ("Pre-approval limit: $300 + GST for all works outlined in work order. Electrical make safe, "
+            "power points not working at the property. Attend, isolate and report.")
+
+
+def _cluster_seconds(count):
+    index = NearDuplicateIndex()
+    started = time.perf_counter()
+    for key in range(count):
+        index.add(str(key), TEMPLATE)
+    elapsed = time.perf_counter() - started
+    assert index.clusters() == {'0': [str(key) for key in range(count)]}
+    return elapsed
+
+
+def test_identical_descriptions_cluster_in_roughly_linear_time():
+    small = min(_cluster_seconds(2000) for _ in range(2))
+    large = _cluster_seconds(8000)
+    # Four times the jobs: about 4x when linear, 16x when every job is compared with every other
+    assert large < small * 8, f"2000 jobs took {small:.2f}s but 8000 took {large:.2f}s"
+
+
+def test_distinct_descriptions_stay_apart():
+    index = NearDuplicateIndex()
+    index.add('1', TEMPLATE)
+    index.add('2', "Install six LED downlights and two pendant lights in the kitchen of the new extension.")
+    index.add('3', TEMPLATE.replace('$300', '$250'))
+    assert index.clusters() == {'1': ['1', '3']}
+    assert index.cluster_id('2') == '2'
@@ -0,0 +1,64 @@
+import http.client
+from functools import partial
+
+import pytest
+
+import servicem8_sync
+from job_store import JobStore
+from servicem8_stub import StubServiceM8
+from servicem8_sync import sync_jobs
+
+
+def _job(number, edit_date, description='Replace smoke alarms'):
+    return {'uuid': f"job-{number:04d}", 'generated_job_id': str(number), 'edit_date': edit_date,
+            'job_description': description, 'category_uuid': ''}
+
+
+def _sync_until_done(store, api_base, attempts=50):
+    """Sync until a pull succeeds; each failed pull must leave the store as it was"""
+    failures = 0
+    for _ in range(attempts):
+        before = store.count(), store.high_water_mark()
+        try:
+            return sync_jobs(store, api_base, headers={}), failures
+        except (OSError, http.client.HTTPException):
+            failures += 1
+            assert (store.count(), store.high_water_mark()) == before
+    pytest.fail(f"no sync succeeded in {attempts} attempts")
+
+
+def test_interrupted_syncs_resume_from_the_high_water_mark(tmp_path, monkeypatch):
+    monkeypatch.setattr(servicem8_sync, 'fetch_jobs', partial(servicem8_sync.fetch_jobs, timeout=0.5))
+    jobs = [_job(number, f"2024-05-0{1 + number % 5} 09:00:00") for number in range(50)]
+    with StubServiceM8(jobs, rate_limited=0.3, seed=7) as stub, JobStore(str(tmp_path / 'jobs.db')) as store:
+        stub.stall_next = 1
+        received, failures = _sync_until_done(store, stub.api_base)
+        assert received == 50
+        assert store.count() == 50
+        assert store.high_water_mark() == '2024-05-05 09:00:00'
+
+        for number in range(3):
+            stub.jobs[f"job-{number:04d}"] = _job(number, '2024-06-01 10:00:00', 'Replace switchboard')
+        stub.jobs['job-0050'] = _job(50, '2024-06-01 10:30:00')
+        stub.stall_next = 1
+        received, more_failures = _sync_until_done(store, stub.api_base)
+        # The 10 jobs edited in the high-water mark's own second come again with the 4 changed since
+        assert received == 14
+        assert store.count() == 51
+        assert store.high_water_mark() == '2024-06-01 10:30:00'
+        assert next(store.iter_jobs())['job_description'] == 'Replace switchboard'
+
+    # Each sync was cut off mid-page once, and some pulls were refused
+    assert failures + more_failures >= 2
+    assert 429 in stub.statuses()
+
+
+def test_empty_headers_are_sent_as_given(tmp_path, monkeypatch):
+    monkeypatch.delenv('SERVICEM8_API_KEY', raising=False)
+    with StubServiceM8([_job(1, '2024-05-01 09:00:00')]) as stub, JobStore(str(tmp_path / 'jobs.db')) as store:
+        assert sync_jobs(store, stub.api_base, headers={}) == 1
+        (_, _, _, headers), = stub.requests
+        assert 'Authorization' not in headers
+
+        with pytest.raises(SystemExit, match='SERVICEM8_API_KEY'):
+            sync_jobs(store, stub.api_base)
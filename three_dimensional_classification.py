@@ -1,329 +1,167 @@
 #!/usr/bin/env python3
+import argparse
 import json
 import re
 
-# Define category mapping
-CATEGORY_MAP = {
-    "": "No Category Assigned",
-    "e459d11f-e77e-4b57-9daf-1f4c5f8aa52b": "Urgent",
-    "9b87f18b-5e5c-486f-99e5-1f4c5a3460fb": "Electrical",
-    "4e7b2af8-44a8-4570-b4cc-20deaa28a65b": "Make Safe",
-    "080733e2-a30a-4553-9e40-1f47cec7f6cb": "Solar, Battery, Standalone",
-    "5f08a40b-f578-465d-b3ee-1f4c5e4d900b": "Admin office time & Quotes",
-    "cfc84630-8c27-48cc-b6aa-1f47cfefaffb": "Level Two",
-    "75a20c1b-bc57-4251-92cf-21eca071128b": "Security, CCTV, Access control",
-    "067bdf55-7332-4103-9f72-1f4c5e18c70b": "Data, Phone"
-}
-
-def classify_property_type(description, job_address):
-    """Classify job based on property type: Commercial, Residential, Industrial, or Agricultural"""
-    desc_lower = description.lower()
-    address_lower = job_address.lower() if job_address else ""
-    combined = f"{desc_lower} {address_lower}"
-
-    # Commercial indicators
-    commercial_keywords = [
-        'qml', 'histology', 'laboratory', 'lab', 'medical', 'hospital', 'clinic',
-        'office', 'commercial', 'business', 'shop', 'store', 'retail', 'restaurant',
-        'hotel', 'motel', 'church', 'school', 'university', 'college', 'bank',
-        'warehouse', 'factory', 'workshop', 'dealership', 'salon', 'pharmacy',
-        'dental', 'veterinary', 'vet', 'gym', 'fitness', 'centre', 'center',
-        'plaza', 'mall', 'building', 'complex', 'facility', 'premises',
-        'tissue sample', 'blood bank', 'pathology', 'radiology', 'x-ray',
-        'consulting room', 'consultation room', 'reception', 'waiting room',
-        'boardroom', 'conference', 'meeting room', 'office block', 'tower',
-        'industrial estate', 'business park', 'showroom', 'garage door.*roller',
-        'commercial kitchen', 'cool room', 'freezer room', 'food prep'
-    ]
-
-    # Residential indicators
-    residential_keywords = [
-        'residence', 'home', 'house', 'unit', 'apartment', 'villa', 'townhouse',
-        'bathroom', 'bedroom', 'kitchen', 'living room', 'lounge', 'dining',
-        'laundry', 'ensuite', 'toilet', 'family room', 'study', 'garage',
-        'shed.*home', 'domestic', 'private', 'personal', 'family', 'couple',
-        'husband', 'wife', 'parkinson', 'elderly', 'disabled', 'wheelchair',
-        'hot water.*home', 'pool', 'spa', 'deck', 'patio', 'verandah',
-        'driveway', 'garden', 'backyard', 'front yard', 'fence', 'gate',
-        'carport', 'granny flat', 'studio', 'cottage', 'cabin', 'duplex',
-        'street', 'road', 'avenue', 'court', 'close', 'place', 'drive',
-        'circuit', 'crescent', 'lane', 'way'
-    ]
-
-    # Industrial indicators
-    industrial_keywords = [
-        'factory', 'plant', 'mill', 'foundry', 'manufacturing', 'production',
-        'assembly', 'processing', 'refinery', 'smelter', 'quarry', 'mine',
-        'depot', 'distribution', 'logistics', 'freight', 'transport',
-        'heavy machinery', 'crane', 'conveyor', 'pump station', 'compressor',
-        'generator', 'transformer', 'substation', 'switchyard', 'control room',
-        'boiler', 'furnace', 'kiln', 'press', 'industrial shed', 'loading dock',
-        'chemical', 'pharmaceutical', 'textile', 'automotive', 'aerospace',
-        'steel', 'aluminium', 'concrete', 'cement', 'oil', 'gas', 'petroleum'
-    ]
-
-    # Agricultural indicators
-    agricultural_keywords = [
-        'farm', 'farming', 'agricultural', 'agriculture', 'rural', 'pastoral',
-        'property.*acres', 'property.*hectares', 'station', 'ranch', 'orchard',
-        'vineyard', 'winery', 'dairy', 'cattle', 'sheep', 'pig', 'poultry',
-        'chicken', 'turkey', 'duck', 'goose', 'livestock', 'animal', 'stable',
-        'barn', 'silo', 'grain', 'wheat', 'corn', 'barley', 'oats', 'rice',
-        'cotton', 'sugar', 'fruit', 'vegetable', 'crop', 'harvest', 'irrigation',
-        'bore', 'pump.*water', 'tank.*water', 'trough', 'paddock', 'pasture',
-        'field', 'acreage', 'rural property', 'country property', 'farming operation',
-        'milking', 'shearing', 'feedlot', 'greenhouse', 'nursery.*plants'
-    ]
-
-    # Check for specific property type indicators
-    if any(keyword in combined for keyword in commercial_keywords):
-        return "Commercial"
-
-    if any(keyword in combined for keyword in industrial_keywords):
-        return "Industrial"
-
-    if any(keyword in combined for keyword in agricultural_keywords):
-        return "Agricultural"
-
-    if any(keyword in combined for keyword in residential_keywords):
-        return "Residential"
-
-    # Default classification based on job characteristics
-    # Shed work is often residential unless specified otherwise
-    if 'shed' in desc_lower and not any(word in desc_lower for word in ['industrial', 'commercial', 'business']):
-        return "Residential"
-
-    # QML and medical work is commercial
-    if any(word in desc_lower for word in ['qml', 'medical', 'hospital', 'clinic', 'lab']):
-        return "Commercial"
-
-    # Home assist programs are residential
-    if 'home assist' in desc_lower:
-        return "Residential"
-
-    # Make safe work in residential areas
-    if 'make safe' in desc_lower and any(word in desc_lower for word in ['home', 'house', 'residence']):
-        return "Residential"
-
-    # Default to residential for uncertain cases
-    return "Residential"
-
-def classify_work_type(description):
-    """Classify job based on the TYPE of work being done"""
-    desc_lower = description.lower()
-
-    # Make Safe work (safety-related)
-    make_safe_keywords = [
-        'make safe', 'makesafe', 'ms ', 'water entry', 'storm damage', 'flooding',
-        'unsafe', 'lightning strike', 'burst pipe', 'hanging wire', 'power line',
-        'isolate electric', 'secure electric', 'disconnect and secure', 'water damage',
-        'electrical box.*unsafe', 'secure electricals'
-    ]
-
-    # Level Two work (service connections)
-    level_two_keywords = [
-        'level 2', 'level two', 'l2 ', 'service mains', 'overhead service',
-        'meter connection', 'essential energy', 'reconnection', 'service fuse',
-        'disconnect reconnect', 'relocate.*pole'
-    ]
-
-    # Solar/Battery work
-    solar_keywords = [
-        'solar', 'battery', 'inverter', 'pv', 'photovoltaic', 'renewable',
-        'grid tie', 'standalone', 'off grid', 'panels', 'redback', 'fronius',
-        'vaulta', 'noark', 'canadian solar'
-    ]
-
-    # Admin work
-    admin_keywords = [
-        'meeting', 'office time', 'quote', 'admin', 'certification', 'ndis',
-        'paperwork', 'training', 'discuss.*taking on'
-    ]
-
-    # Security/CCTV work
-    security_keywords = [
-        'security', 'cctv', 'access control', 'starlink', 'camera', 'monitoring',
-        'surveillance'
-    ]
-
-    # Data/Phone work
-    data_keywords = [
-        'data', 'phone', 'telecommunications', 'network', 'ethernet', 'cat6',
-        'alarm test', 'communication', 'cabling.*monitoring', 'test alarm'
-    ]
-
-    # Air conditioning work
-    ac_keywords = [
-        'air.?condition', 'hvac', 'split system', 'cooling', 'heating',
-        'mitsubishi.*air', 'ac unit', 'ac tech'
-    ]
-
-    # Check work types in priority order
-    if any(keyword in desc_lower for keyword in make_safe_keywords):
-        return "Make Safe"
-
-    if any(keyword in desc_lower for keyword in level_two_keywords):
-        return "Level Two"
-
-    if any(keyword in desc_lower for keyword in solar_keywords):
-        return "Solar/Battery"
-
-    if any(keyword in desc_lower for keyword in admin_keywords):
-        return "Admin"
-
-    if any(keyword in desc_lower for keyword in security_keywords):
-        return "Security/CCTV"
-
-    if any(keyword in desc_lower for keyword in data_keywords):
-        return "Data/Phone"
-
-    if any(keyword in desc_lower for keyword in ac_keywords):
-        return "Air Conditioning"
-
-    # Default to Electrical for electrical work
-    return "Electrical"
-
-def classify_urgency_level(description, status, current_category):
-    """Classify job based on the URGENCY level"""
-    desc_lower = description.lower()
-
-    # Emergency indicators (immediate response needed)
-    emergency_keywords = [
-        'emergency', 'asap', 'urgent.*parkinson', 'stopped working.*asap',
-        'unsafe', 'hanging.*power line', 'lightning strike', 'burst pipe',
-        'water.*saturated', 'no power', 'no hot water.*asap'
-    ]
-
-    # Urgent indicators (same day response)
-    urgent_keywords = [
-        'urgent', 'stopped working', 'not working', 'failed', 'fault',
-        'breakdown', 'no power', 'no hot water', 'make safe', 'ms ',
-        'pre.?approval limit'
-    ]
-
-    # Standard work indicators
-    standard_keywords = [
-        'install', 'fit off', 'supply.*install', 'stage [0-9]', 'rough in',
-        'upgrade', 'replace.*service', 'compliance testing'
-    ]
-
-    # Planned work indicators
-    planned_keywords = [
-        'meeting', 'quote', 'admin', 'certification', 'stage.*works',
-        'for full details.*attached', 'scheduled'
-    ]
-
-    # Check for Emergency first
-    if any(keyword in desc_lower for keyword in emergency_keywords):
-        return "Emergency"
-
-    # Make Safe work is typically urgent
-    if 'make safe' in desc_lower or 'ms ' in desc_lower:
-        return "Urgent"
-
-    # Check for general urgent indicators
-    if any(keyword in desc_lower for keyword in urgent_keywords):
-        return "Urgent"
-
-    # Check for planned work
-    if any(keyword in desc_lower for keyword in planned_keywords):
-        return "Planned"
-
-    # Check for standard installation work
-    if any(keyword in desc_lower for keyword in standard_keywords):
-        return "Standard"
-
-    # Default based on current category
-    if current_category == "Urgent":
-        return "Urgent"
-    elif current_category in ["Admin office time & Quotes"]:
-        return "Planned"
-    else:
-        return "Standard"
-
-def determine_recommended_category(work_type, urgency_level):
-    """Determine recommended ServiceM8 category based on work type and urgency"""
-
-    # Priority mapping based on work type
-    if work_type == "Make Safe":
-        return "Make Safe"
-    elif work_type == "Level Two":
-        return "Level Two"
-    elif work_type == "Solar/Battery":
-        return "Solar, Battery, Standalone"
-    elif work_type == "Admin":
-        return "Admin office time & Quotes"
-    elif work_type == "Security/CCTV":
-        return "Security, CCTV, Access control"
-    elif work_type == "Data/Phone":
-        return "Data, Phone"
-    elif work_type == "Air Conditioning":
-        return "AC install"
-    elif work_type == "Electrical":
-        # All electrical work goes to Electrical category regardless of urgency
-        # (urgency is now tracked separately in urgency_level field)
-        return "Electrical"
-    else:
-        return "Electrical"
+from batch_classifier import classify_jobs
+from boilerplate import load_dictionary, stripped_classifier
+from classification_cache import ClassificationCache
+from classifier_metrics import ClassifierMetrics
+from classification_engine import RULESET_VERSION, ClassificationResult, classify_job, determine_recommended_category
+from crosstab import crosstab
+from job_reader import iter_jobs
+from job_table import JobTable
+from learned_classifier import LearnedClassifier
+from near_duplicates import NearDuplicateIndex
+from region_index import RegionIndex
+from result_formats import FORMATS, write_rows
+from time_rollups import TimeRollups
 
 def main():
-    # Load the jobs data
-    with open('company_jobs_array.json', 'r') as f:
-        jobs = json.load(f)
-
-    # Analyze each job
-    results = []
-    for job in jobs:
-        current_category = CATEGORY_MAP.get(job['category_uuid'], 'Unknown')
-
-        # Classify work type, urgency, and property type
-        work_type = classify_work_type(job['job_description'])
-        urgency_level = classify_urgency_level(job['job_description'], job['status'], current_category)
-        property_type = classify_property_type(job['job_description'], job.get('job_address', ''))
-
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default='company_jobs_array.json',
+                        help="Jobs to classify: a JSON array, a CSV such as all_jobs.csv, or a servicem8_sync.py job store")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes to classify with (output is identical to a serial run)")
+    parser.add_argument('--cache',
+                        help="SQLite file of earlier results; only new or edited jobs are reclassified")
+    parser.add_argument('--format', choices=FORMATS, default='json',
+                        help="Results format: indented json (what the HTML viewers load), ndjson, or columnar")
+    parser.add_argument('--metrics',
+                        help="Write per-keyword hits, stage timings and latency histograms to this JSON file "
+                             "(plus a .prom Prometheus file); classifies in-process")
+    parser.add_argument('--near-duplicates', metavar='STORE',
+                        help="Cluster near-duplicate descriptions and add a cluster_id to each result; "
+                             "MinHash signatures are kept in this SQLite file for the next run")
+    parser.add_argument('--regions', metavar='STORE',
+                        help="Add the classified jobs to this region index (see region_index.py for queries)")
+    parser.add_argument('--rollups', metavar='STORE',
+                        help="Fold the classified jobs into these day/week/month rollups (see time_rollups.py)")
+    parser.add_argument('--model',
+                        help="Learned model (learned_classifier.py train) that decides work and property types "
+                             "where no keyword fires")
+    parser.add_argument('--boilerplate', metavar='DICTIONARY',
+                        help="Strip the boilerplate segments learned by boilerplate.py from descriptions "
+                             "before classifying them")
+    args = parser.parse_args()
+
+    # Stream the jobs one at a time rather than loading the whole export
+    jobs = iter_jobs(args.input)
+    # Instrumentation is opt-in: the plain classify_job path has no metrics checks
+    metrics = ClassifierMetrics() if args.metrics else None
+    classify, workers = (metrics.classify_job, 1) if metrics else (classify_job, args.workers)
+    version = RULESET_VERSION
+    boilerplate = None
+    if args.boilerplate:
+        # Results are still reported against the full description; only the classifiers see the remainder
+        boilerplate = load_dictionary(args.boilerplate)
+        classify = stripped_classifier(args.boilerplate, classify)
+        version = f"{RULESET_VERSION}+{boilerplate.version}"
+    cache = ClassificationCache(args.cache, version, ClassificationResult._make) if args.cache else None
+    if cache:
+        classified = cache.classify_jobs(classify, jobs, workers)
+    else:
+        classified = classify_jobs(classify, jobs, workers)
+    if args.model:
+        # Rules first, cached or not; the model only fills in fallbacks, one batch at a time
+        classified = LearnedClassifier.load(args.model).tie_break(
+            classified, prepare=boilerplate.strip_job if boilerplate else None)
+    duplicates = NearDuplicateIndex(args.near_duplicates) if args.near_duplicates else None
+    regions = RegionIndex(args.regions) if args.regions else None
+    rollups = TimeRollups(args.rollups) if args.rollups else None
+
+    # Categorical fields are interned; descriptions and addresses are referenced, not copied
+    table = JobTable(
+        categorical=['current_category', 'work_type', 'urgency_level', 'property_type',
+                     'recommended_category', 'status'],
+        fields=['job_number', 'job_description', 'job_address', 'amount'],
+        numeric=['amount_value']
+    )
+    for job, classification in classified:
         # Determine recommended ServiceM8 category
-        recommended_category = determine_recommended_category(work_type, urgency_level)
+        recommended_category = determine_recommended_category(
+            classification.work_type, classification.urgency_level)
+
+        table.append(
+            job_number=job['generated_job_id'],
+            current_category=classification.current_category,
+            work_type=classification.work_type,
+            urgency_level=classification.urgency_level,
+            property_type=classification.property_type,
+            recommended_category=recommended_category,
+            job_description=job['job_description'],
+            job_address=job.get('job_address', ''),
+            amount=job['total_invoice_amount'],
+            amount_value=float(job['total_invoice_amount'] or 0),
+            status=job['status']
+        )
+        if duplicates:
+            duplicates.add(job['generated_job_id'], job['job_description'])
+        if regions is not None:
+            regions.add(job, classification.work_type, classification.urgency_level)
+        if rollups:
+            rollups.add(job, classification)
+
+    if cache:
+        pruned = cache.prune()
+        cache.close()
+        print(f"Cache: {cache.hits} reused, {cache.misses} classified, {pruned} stale entries evicted")
+
+    if metrics:
+        prometheus_path = metrics.write(args.metrics)
+        print(f"Metrics for {metrics.jobs} classified jobs written to {args.metrics} and {prometheus_path}")
+
+    if duplicates:
+        evicted = duplicates.prune()
+        duplicates.close()
+        near_duplicate_clusters = duplicates.clusters()
+        print(f"Near-duplicates: {sum(map(len, near_duplicate_clusters.values()))} jobs in "
+              f"{len(near_duplicate_clusters)} clusters ({duplicates.computed} new signatures, "
+              f"{evicted} stale evicted)")
+
+    if regions is not None:
+        changed = len(regions.pending)
+        regions.close()
+        print(f"Region index: {changed} new or changed jobs written to {args.regions} ({len(regions)} jobs)")
+
+    if rollups:
+        changed = len(rollups.changed)
+        rollups.close()
+        print(f"Rollups: {changed} new or changed jobs folded into {args.rollups}")
 
-        results.append({
-            'job_number': job['generated_job_id'],
-            'current_category': current_category,
-            'work_type': work_type,
-            'urgency_level': urgency_level,
-            'property_type': property_type,
-            'recommended_category': recommended_category,
-            'needs_change': current_category != recommended_category,
+    # Sort by job number
+    order = table.sorted_order('job_number', key=lambda job_number: int(job_number) if job_number.isdigit() else float('inf'))
+
+    def result_row(index):
+        job = table.row(index)
+        row = {
+            'job_number': job['job_number'],
+            'current_category': job['current_category'],
+            'work_type': job['work_type'],
+            'urgency_level': job['urgency_level'],
+            'property_type': job['property_type'],
+            'recommended_category': job['recommended_category'],
+            'needs_change': job['current_category'] != job['recommended_category'],
             'job_description_snippet': job['job_description'],
-            'job_address': job.get('job_address', ''),
-            'amount': job['total_invoice_amount'],
+            'job_address': job['job_address'],
+            'amount': job['amount'],
             'status': job['status'],
-            'classification_logic': f"{work_type} + {urgency_level} + {property_type} → {recommended_category}"
-        })
-
-    # Sort by job number
-    results.sort(key=lambda x: int(x['job_number']) if x['job_number'].isdigit() else float('inf'))
-
-    # Save results
-    with open('three_dimensional_job_classification.json', 'w') as f:
-        json.dump(results, f, indent=2)
-
-    # Create analysis summary
-    work_type_counts = {}
-    urgency_counts = {}
-    property_type_counts = {}
-    combination_counts = {}
+            'classification_logic': f"{job['work_type']} + {job['urgency_level']} + {job['property_type']} → {job['recommended_category']}"
+        }
+        if duplicates:
+            row['cluster_id'] = duplicates.cluster_id(job['job_number'])
+        return row
 
-    for result in results:
-        work_type = result['work_type']
-        urgency = result['urgency_level']
-        prop_type = result['property_type']
-        combo = f"{work_type} - {urgency} - {prop_type}"
+    # Save results, one row at a time
+    write_rows('three_dimensional_job_classification', map(result_row, order), args.format, index_field='job_number')
 
-        work_type_counts[work_type] = work_type_counts.get(work_type, 0) + 1
-        urgency_counts[urgency] = urgency_counts.get(urgency, 0) + 1
-        property_type_counts[prop_type] = property_type_counts.get(prop_type, 0) + 1
-        combination_counts[combo] = combination_counts.get(combo, 0) + 1
+    # Create analysis summary from cross-tabs over the code columns
+    work_type_counts = crosstab(table, 'work_type', order, weights='amount_value')
+    urgency_counts = crosstab(table, 'urgency_level', order).counts
+    property_type_counts = crosstab(table, 'property_type', order)
+    combination_counts = crosstab(table, ['work_type', 'urgency_level', 'property_type'], order).labelled(' - ')
 
-    changes_needed = [r for r in results if r['needs_change']]
+    changes_needed = table.count_differing('current_category', 'recommended_category')
 
     # Order urgency by priority: Emergency, Urgent, Standard, Planned
     urgency_priority_order = ['Emergency', 'Urgent', 'Standard', 'Planned']
@@ -333,14 +171,18 @@ def main():
             urgency_ordered[urgency] = urgency_counts[urgency]
 
     summary = {
-        'total_jobs': len(results),
-        'jobs_needing_reclassification': len(changes_needed),
-        'percentage_needing_change': round(len(changes_needed) / len(results) * 100, 1),
-        'work_type_breakdown': dict(sorted(work_type_counts.items(), key=lambda x: x[1], reverse=True)),
+        'total_jobs': len(table),
+        'jobs_needing_reclassification': changes_needed,
+        'percentage_needing_change': round(changes_needed / len(table) * 100, 1),
+        'work_type_breakdown': work_type_counts.top(),
         'urgency_breakdown': urgency_ordered,
-        'property_type_breakdown': dict(sorted(property_type_counts.items(), key=lambda x: x[1], reverse=True)),
-        'top_combinations': dict(sorted(combination_counts.items(), key=lambda x: x[1], reverse=True)[:20])
+        'property_type_breakdown': property_type_counts.top(),
+        'top_combinations': combination_counts.top(20),
+        'invoice_total_by_work_type': work_type_counts.rounded_sums()
     }
+    if duplicates:
+        summary['near_duplicate_clusters'] = len(near_duplicate_clusters)
+        summary['jobs_in_near_duplicate_clusters'] = sum(map(len, near_duplicate_clusters.values()))
 
     with open('three_dimensional_summary.json', 'w') as f:
         json.dump(summary, f, indent=2)
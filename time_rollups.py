@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import argparse
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+from classification_cache import job_key
+from classification_engine import classify_job
+from job_reader import iter_jobs
+
+GRAINS = ('day', 'week', 'month')
+
+# Every job is also counted under ('all', '') so overall trends need no summing across values
+DIMENSIONS = ('all', 'work_type', 'urgency_level', 'property_type')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_key TEXT PRIMARY KEY,
+    day TEXT,
+    work_type TEXT NOT NULL,
+    urgency_level TEXT NOT NULL,
+    property_type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    latency_hours INTEGER
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    grain TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    start TEXT NOT NULL,
+    jobs INTEGER NOT NULL,
+    invoice_total REAL NOT NULL,
+    PRIMARY KEY (grain, dimension, value, start)
+);
+CREATE TABLE IF NOT EXISTS latencies (
+    grain TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    start TEXT NOT NULL,
+    latency_hours INTEGER NOT NULL,
+    jobs INTEGER NOT NULL,
+    PRIMARY KEY (grain, dimension, value, start, latency_hours)
+);
+"""
+
+
+def parse_job_datetime(value):
+    """A job date field as a datetime, or None when empty or a placeholder such as 0000-00-00 00:00:00"""
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def bucket_start(day, grain):
+    """First day of the day, week (starting Monday) or month bucket holding `day`"""
+    if grain == 'week':
+        return day - timedelta(days=day.weekday())
+    if grain == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def quote_to_completion_hours(job):
+    """Whole hours from quote to completion, or None unless both dates are real and in order"""
+    quoted = parse_job_datetime(job.get('quote_date'))
+    completed = parse_job_datetime(job.get('completion_date'))
+    if quoted is None or completed is None or completed < quoted:
+        return None
+    return int((completed - quoted).total_seconds() // 3600)
+
+
+def _median(histogram):
+    """Median of a list of (value, count) pairs sorted by value"""
+    total = sum(count for _, count in histogram)
+    if not total:
+        return None
+    # Ranks of the two middle values, which are the same one for an odd total
+    low_rank, high_rank = (total - 1) // 2, total // 2
+    seen, low = 0, None
+    for value, count in histogram:
+        seen += count
+        if low is None and seen > low_rank:
+            low = value
+        if seen > high_rank:
+            return (low + value) / 2
+
+
+class TimeRollups:
+    """Day, week and month buckets of job counts, invoice totals and quote-to-completion latency
+
+    Buckets are kept per value of each classification dimension in
+    SQLite. Latencies are stored as per-bucket histograms of whole hours,
+    so medians stay exact as jobs come and go. Adding a job records what
+    it contributed; when it is added again with other values, only its old
+    and new buckets change. Jobs whose date is missing or a 0000-00-00
+    placeholder are kept but fall in no bucket, and placeholder quote or
+    completion dates leave a job out of the latency figures.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.jobs = {row[0]: row[1:] for row in self.connection.execute(
+            "SELECT job_key, day, work_type, urgency_level, property_type, amount, latency_hours FROM jobs")}
+        self.changed = {}
+        self.bucket_deltas = {}
+        self.latency_deltas = {}
+
+    def _apply(self, row, sign):
+        day, work_type, urgency_level, property_type, amount, latency_hours = row
+        if day is None:
+            return
+        values = {'all': '', 'work_type': work_type, 'urgency_level': urgency_level, 'property_type': property_type}
+        for grain in GRAINS:
+            start = bucket_start(date.fromisoformat(day), grain).isoformat()
+            for dimension, value in values.items():
+                delta = self.bucket_deltas.setdefault((grain, dimension, value, start), [0, 0.0])
+                delta[0] += sign
+                delta[1] += sign * amount
+                if latency_hours is not None:
+                    key = (grain, dimension, value, start, latency_hours)
+                    self.latency_deltas[key] = self.latency_deltas.get(key, 0) + sign
+
+    def add(self, job, result):
+        """Record a classified job; returns whether its buckets changed"""
+        started = parse_job_datetime(job.get('date'))
+        row = (started.date().isoformat() if started else None, result.work_type, result.urgency_level,
+               result.property_type, float(job.get('total_invoice_amount') or 0), quote_to_completion_hours(job))
+        key = job_key(job)
+        old = self.jobs.get(key)
+        if old == row:
+            return False
+        if old is not None:
+            self._apply(old, -1)
+        self._apply(row, 1)
+        self.jobs[key] = self.changed[key] = row
+        return True
+
+    def commit(self):
+        """Write the changed jobs and fold their bucket deltas into the stored buckets"""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO jobs (job_key, day, work_type, urgency_level, property_type, amount, latency_hours) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", [(key, *row) for key, row in self.changed.items()])
+        self.connection.executemany(
+            "INSERT INTO buckets (grain, dimension, value, start, jobs, invoice_total) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (grain, dimension, value, start) DO UPDATE SET "
+            "jobs = jobs + excluded.jobs, invoice_total = invoice_total + excluded.invoice_total",
+            [(*key, jobs, amount) for key, (jobs, amount) in self.bucket_deltas.items() if jobs or amount])
+        self.connection.executemany(
+            "INSERT INTO latencies (grain, dimension, value, start, latency_hours, jobs) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (grain, dimension, value, start, latency_hours) DO UPDATE SET jobs = jobs + excluded.jobs",
+            [(*key, jobs) for key, jobs in self.latency_deltas.items() if jobs])
+        # Only buckets a job has left can have emptied
+        self.connection.executemany(
+            "DELETE FROM buckets WHERE grain = ? AND dimension = ? AND value = ? AND start = ? AND jobs = 0",
+            [key for key, (jobs, _) in self.bucket_deltas.items() if jobs < 0])
+        self.connection.executemany(
+            "DELETE FROM latencies WHERE grain = ? AND dimension = ? AND value = ? AND start = ? "
+            "AND latency_hours = ? AND jobs = 0", [key for key, jobs in self.latency_deltas.items() if jobs < 0])
+        self.connection.commit()
+        self.changed, self.bucket_deltas, self.latency_deltas = {}, {}, {}
+
+    def series(self, grain='month', dimension='all', value=None, since=None, until=None):
+        """Buckets in time order, each with its value, job count, invoice total and median latency in days
+
+        Reads only the stored buckets (and their latency histograms) in the
+        range; `since` and `until` are inclusive ISO dates compared with
+        bucket starts.
+        """
+        conditions, parameters = "grain = ? AND dimension = ?", [grain, dimension]
+        if value is not None:
+            conditions += " AND value = ?"
+            parameters.append(value)
+        if since:
+            conditions += " AND start >= ?"
+            parameters.append(since)
+        if until:
+            conditions += " AND start <= ?"
+            parameters.append(until)
+
+        histograms = {}
+        for bucket_value, start, latency_hours, jobs in self.connection.execute(
+                f"SELECT value, start, latency_hours, jobs FROM latencies WHERE {conditions} "
+                f"ORDER BY value, start, latency_hours", parameters):
+            histograms.setdefault((bucket_value, start), []).append((latency_hours, jobs))
+
+        rows = []
+        for bucket_value, start, jobs, amount in self.connection.execute(
+                f"SELECT value, start, jobs, invoice_total FROM buckets WHERE {conditions} ORDER BY start, value",
+                parameters):
+            median = _median(histograms.get((bucket_value, start), []))
+            rows.append({'start': start, 'value': bucket_value, 'jobs': jobs, 'invoice_total': round(amount, 2),
+                         'median_quote_to_completion_days': round(median / 24, 1) if median is not None else None})
+        return rows
+
+    def undated(self):
+        """Number of jobs with no usable date, which appear in no bucket"""
+        return sum(1 for row in self.jobs.values() if row[0] is None)
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--store', default='time_rollups.db', help="SQLite file the rollups are kept in")
+    parser.add_argument('--input', help="Classify the jobs in this export and fold them into the rollups first")
+    parser.add_argument('--grain', choices=GRAINS, default='month')
+    parser.add_argument('--dimension', choices=DIMENSIONS, default='all')
+    parser.add_argument('--value', help="Only this work type, urgency level or property type")
+    parser.add_argument('--since', help="First bucket start to show (YYYY-MM-DD)")
+    parser.add_argument('--until', help="Last bucket start to show (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    with TimeRollups(args.store) as rollups:
+        if args.input:
+            started = time.perf_counter()
+            changed = sum(rollups.add(job, classify_job(job)) for job in iter_jobs(args.input))
+            rollups.commit()
+            print(f"Folded {changed} new or changed jobs from {args.input} into {args.store} "
+                  f"in {time.perf_counter() - started:.1f}s ({rollups.undated()} without a date)")
+
+        started = time.perf_counter()
+        rows = rollups.series(args.grain, args.dimension, args.value, args.since, args.until)
+        elapsed = (time.perf_counter() - started) * 1000
+
+    print(f"{len(rows)} {args.grain} buckets by {args.dimension} ({elapsed:.2f} ms)")
+    for row in rows:
+        median = row['median_quote_to_completion_days']
+        label = f"{row['start']} {row['value']}".rstrip()
+        print(f"  {label}: {row['jobs']} jobs, ${row['invoice_total']:,.2f}"
+              + (f", median {median} days quote to completion" if median is not None else ''))
+
+if __name__ == "__main__":
+    main()
@@ -1,152 +1,17 @@
 #!/usr/bin/env python3
+import argparse
 import json
 import re
 
-# Define category mapping
-CATEGORY_MAP = {
-    "": "No Category Assigned",
-    "e459d11f-e77e-4b57-9daf-1f4c5f8aa52b": "Urgent",
-    "9b87f18b-5e5c-486f-99e5-1f4c5a3460fb": "Electrical",
-    "4e7b2af8-44a8-4570-b4cc-20deaa28a65b": "Make Safe",
-    "080733e2-a30a-4553-9e40-1f47cec7f6cb": "Solar, Battery, Standalone",
-    "5f08a40b-f578-465d-b3ee-1f4c5e4d900b": "Admin office time & Quotes",
-    "cfc84630-8c27-48cc-b6aa-1f47cfefaffb": "Level Two",
-    "75a20c1b-bc57-4251-92cf-21eca071128b": "Security, CCTV, Access control",
-    "067bdf55-7332-4103-9f72-1f4c5e18c70b": "Data, Phone"
-}
-
-def classify_work_type(description):
-    """Classify job based on the TYPE of work being done"""
-    desc_lower = description.lower()
-
-    # Make Safe work (safety-related)
-    make_safe_keywords = [
-        'make safe', 'makesafe', 'ms ', 'water entry', 'storm damage', 'flooding',
-        'unsafe', 'lightning strike', 'burst pipe', 'hanging wire', 'power line',
-        'isolate electric', 'secure electric', 'disconnect and secure', 'water damage',
-        'electrical box.*unsafe', 'secure electricals'
-    ]
-
-    # Level Two work (service connections)
-    level_two_keywords = [
-        'level 2', 'level two', 'l2 ', 'service mains', 'overhead service',
-        'meter connection', 'essential energy', 'reconnection', 'service fuse',
-        'disconnect reconnect', 'relocate.*pole'
-    ]
-
-    # Solar/Battery work
-    solar_keywords = [
-        'solar', 'battery', 'inverter', 'pv', 'photovoltaic', 'renewable',
-        'grid tie', 'standalone', 'off grid', 'panels', 'redback', 'fronius',
-        'vaulta', 'noark', 'canadian solar'
-    ]
-
-    # Admin work
-    admin_keywords = [
-        'meeting', 'office time', 'quote', 'admin', 'certification', 'ndis',
-        'paperwork', 'training', 'discuss.*taking on'
-    ]
-
-    # Security/CCTV work
-    security_keywords = [
-        'security', 'cctv', 'access control', 'starlink', 'camera', 'monitoring',
-        'surveillance'
-    ]
-
-    # Data/Phone work
-    data_keywords = [
-        'data', 'phone', 'telecommunications', 'network', 'ethernet', 'cat6',
-        'alarm test', 'communication', 'cabling.*monitoring', 'test alarm'
-    ]
-
-    # Air conditioning work
-    ac_keywords = [
-        'air.?condition', 'hvac', 'split system', 'cooling', 'heating',
-        'mitsubishi.*air', 'ac unit', 'ac tech'
-    ]
-
-    # Check work types in priority order
-    if any(keyword in desc_lower for keyword in make_safe_keywords):
-        return "Make Safe"
-
-    if any(keyword in desc_lower for keyword in level_two_keywords):
-        return "Level Two"
-
-    if any(keyword in desc_lower for keyword in solar_keywords):
-        return "Solar/Battery"
-
-    if any(keyword in desc_lower for keyword in admin_keywords):
-        return "Admin"
-
-    if any(keyword in desc_lower for keyword in security_keywords):
-        return "Security/CCTV"
-
-    if any(keyword in desc_lower for keyword in data_keywords):
-        return "Data/Phone"
-
-    if any(keyword in desc_lower for keyword in ac_keywords):
-        return "Air Conditioning"
-
-    # Default to Electrical for electrical work
-    return "Electrical"
-
-def classify_urgency_level(description, status, current_category):
-    """Classify job based on the URGENCY level"""
-    desc_lower = description.lower()
-
-    # Emergency indicators (immediate response needed)
-    emergency_keywords = [
-        'emergency', 'asap', 'urgent.*parkinson', 'stopped working.*asap',
-        'unsafe', 'hanging.*power line', 'lightning strike', 'burst pipe',
-        'water.*saturated', 'no power', 'no hot water.*asap'
-    ]
-
-    # Urgent indicators (same day response)
-    urgent_keywords = [
-        'urgent', 'stopped working', 'not working', 'failed', 'fault',
-        'breakdown', 'no power', 'no hot water', 'make safe', 'ms ',
-        'pre.?approval limit'
-    ]
-
-    # Standard work indicators
-    standard_keywords = [
-        'install', 'fit off', 'supply.*install', 'stage [0-9]', 'rough in',
-        'upgrade', 'replace.*service', 'compliance testing'
-    ]
-
-    # Planned work indicators
-    planned_keywords = [
-        'meeting', 'quote', 'admin', 'certification', 'stage.*works',
-        'for full details.*attached', 'scheduled'
-    ]
-
-    # Check for Emergency first
-    if any(keyword in desc_lower for keyword in emergency_keywords):
-        return "Emergency"
-
-    # Make Safe work is typically urgent
-    if 'make safe' in desc_lower or 'ms ' in desc_lower:
-        return "Urgent"
-
-    # Check for general urgent indicators
-    if any(keyword in desc_lower for keyword in urgent_keywords):
-        return "Urgent"
-
-    # Check for planned work
-    if any(keyword in desc_lower for keyword in planned_keywords):
-        return "Planned"
-
-    # Check for standard installation work
-    if any(keyword in desc_lower for keyword in standard_keywords):
-        return "Standard"
-
-    # Default based on current category
-    if current_category == "Urgent":
-        return "Urgent"
-    elif current_category in ["Admin office time & Quotes"]:
-        return "Planned"
-    else:
-        return "Standard"
+from batch_classifier import classify_jobs
+from classification_cache import ClassificationCache
+from classifier_metrics import ClassifierMetrics
+from classification_engine import RULESET_VERSION, ClassificationResult, classify_job
+from crosstab import crosstab
+from job_reader import iter_jobs
+from job_table import JobTable
+from near_duplicates import NearDuplicateIndex
+from result_formats import FORMATS, write_rows
 
 def determine_recommended_category(work_type, urgency_level):
     """Determine recommended ServiceM8 category based on work type and urgency"""
@@ -176,66 +41,121 @@ def determine_recommended_category(work_type, urgency_level):
         return "Electrical"
 
 def main():
-    # Load the jobs data
-    with open('company_jobs_array.json', 'r') as f:
-        jobs = json.load(f)
-
-    # Analyze each job
-    results = []
-    for job in jobs:
-        current_category = CATEGORY_MAP.get(job['category_uuid'], 'Unknown')
-
-        # Classify work type and urgency separately
-        work_type = classify_work_type(job['job_description'])
-        urgency_level = classify_urgency_level(job['job_description'], job['status'], current_category)
-
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default='company_jobs_array.json',
+                        help="Jobs to classify: a JSON array, a CSV such as all_jobs.csv, or a servicem8_sync.py job store")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes to classify with (output is identical to a serial run)")
+    parser.add_argument('--cache',
+                        help="SQLite file of earlier results; only new or edited jobs are reclassified")
+    parser.add_argument('--format', choices=FORMATS, default='json',
+                        help="Results format: indented json (what the HTML viewers load), ndjson, or columnar")
+    parser.add_argument('--metrics',
+                        help="Write per-keyword hits, stage timings and latency histograms to this JSON file "
+                             "(plus a .prom Prometheus file); classifies in-process")
+    parser.add_argument('--near-duplicates', metavar='STORE',
+                        help="Cluster near-duplicate descriptions and add a cluster_id to each result; "
+                             "MinHash signatures are kept in this SQLite file for the next run")
+    args = parser.parse_args()
+
+    # Stream the jobs one at a time rather than loading the whole export
+    jobs = iter_jobs(args.input)
+    # Instrumentation is opt-in: the plain classify_job path has no metrics checks
+    metrics = ClassifierMetrics() if args.metrics else None
+    classify, workers = (metrics.classify_job, 1) if metrics else (classify_job, args.workers)
+    cache = ClassificationCache(args.cache, RULESET_VERSION, ClassificationResult._make) if args.cache else None
+    if cache:
+        classified = cache.classify_jobs(classify, jobs, workers)
+    else:
+        classified = classify_jobs(classify, jobs, workers)
+    duplicates = NearDuplicateIndex(args.near_duplicates) if args.near_duplicates else None
+
+    # Categorical fields are interned; descriptions are referenced, not copied
+    table = JobTable(
+        categorical=['current_category', 'work_type', 'urgency_level', 'recommended_category', 'status'],
+        fields=['job_number', 'job_description', 'amount'],
+        numeric=['amount_value']
+    )
+    for job, classification in classified:
         # Determine recommended ServiceM8 category
-        recommended_category = determine_recommended_category(work_type, urgency_level)
-
-        results.append({
-            'job_number': job['generated_job_id'],
-            'current_category': current_category,
-            'work_type': work_type,
-            'urgency_level': urgency_level,
-            'recommended_category': recommended_category,
-            'needs_change': current_category != recommended_category,
-            'job_description_snippet': job['job_description'][:200] + '...' if len(job['job_description']) > 200 else job['job_description'],
-            'amount': job['total_invoice_amount'],
-            'status': job['status'],
-            'classification_logic': f"{work_type} + {urgency_level} → {recommended_category}"
-        })
+        recommended_category = determine_recommended_category(
+            classification.work_type, classification.urgency_level)
+
+        table.append(
+            job_number=job['generated_job_id'],
+            current_category=classification.current_category,
+            work_type=classification.work_type,
+            urgency_level=classification.urgency_level,
+            recommended_category=recommended_category,
+            job_description=job['job_description'],
+            amount=job['total_invoice_amount'],
+            amount_value=float(job['total_invoice_amount'] or 0),
+            status=job['status']
+        )
+        if duplicates:
+            duplicates.add(job['generated_job_id'], job['job_description'])
+
+    if cache:
+        pruned = cache.prune()
+        cache.close()
+        print(f"Cache: {cache.hits} reused, {cache.misses} classified, {pruned} stale entries evicted")
+
+    if metrics:
+        prometheus_path = metrics.write(args.metrics)
+        print(f"Metrics for {metrics.jobs} classified jobs written to {args.metrics} and {prometheus_path}")
+
+    if duplicates:
+        evicted = duplicates.prune()
+        duplicates.close()
+        near_duplicate_clusters = duplicates.clusters()
+        print(f"Near-duplicates: {sum(map(len, near_duplicate_clusters.values()))} jobs in "
+              f"{len(near_duplicate_clusters)} clusters ({duplicates.computed} new signatures, "
+              f"{evicted} stale evicted)")
 
     # Sort by job number
-    results.sort(key=lambda x: int(x['job_number']) if x['job_number'].isdigit() else float('inf'))
-
-    # Save results
-    with open('two_dimensional_job_classification.json', 'w') as f:
-        json.dump(results, f, indent=2)
-
-    # Create analysis summary
-    work_type_counts = {}
-    urgency_counts = {}
-    combination_counts = {}
+    order = table.sorted_order('job_number', key=lambda job_number: int(job_number) if job_number.isdigit() else float('inf'))
+
+    def result_row(index):
+        job = table.row(index)
+        description = job['job_description']
+        row = {
+            'job_number': job['job_number'],
+            'current_category': job['current_category'],
+            'work_type': job['work_type'],
+            'urgency_level': job['urgency_level'],
+            'recommended_category': job['recommended_category'],
+            'needs_change': job['current_category'] != job['recommended_category'],
+            'job_description_snippet': description[:200] + '...' if len(description) > 200 else description,
+            'amount': job['amount'],
+            'status': job['status'],
+            'classification_logic': f"{job['work_type']} + {job['urgency_level']} → {job['recommended_category']}"
+        }
+        if duplicates:
+            row['cluster_id'] = duplicates.cluster_id(job['job_number'])
+        return row
 
-    for result in results:
-        work_type = result['work_type']
-        urgency = result['urgency_level']
-        combo = f"{work_type} - {urgency}"
+    # Save results, one row at a time
+    write_rows('two_dimensional_job_classification', map(result_row, order), args.format, index_field='job_number')
 
-        work_type_counts[work_type] = work_type_counts.get(work_type, 0) + 1
-        urgency_counts[urgency] = urgency_counts.get(urgency, 0) + 1
-        combination_counts[combo] = combination_counts.get(combo, 0) + 1
+    # Create analysis summary from cross-tabs over the code columns
+    work_type_counts = crosstab(table, 'work_type', order, weights='amount_value')
+    urgency_counts = crosstab(table, 'urgency_level', order)
+    combination_counts = crosstab(table, ['work_type', 'urgency_level'], order).labelled(' - ')
 
-    changes_needed = [r for r in results if r['needs_change']]
+    changes_needed = table.count_differing('current_category', 'recommended_category')
 
     summary = {
-        'total_jobs': len(results),
-        'jobs_needing_reclassification': len(changes_needed),
-        'percentage_needing_change': round(len(changes_needed) / len(results) * 100, 1),
-        'work_type_breakdown': dict(sorted(work_type_counts.items(), key=lambda x: x[1], reverse=True)),
-        'urgency_breakdown': dict(sorted(urgency_counts.items(), key=lambda x: x[1], reverse=True)),
-        'top_combinations': dict(sorted(combination_counts.items(), key=lambda x: x[1], reverse=True)[:15])
+        'total_jobs': len(table),
+        'jobs_needing_reclassification': changes_needed,
+        'percentage_needing_change': round(changes_needed / len(table) * 100, 1),
+        'work_type_breakdown': work_type_counts.top(),
+        'urgency_breakdown': urgency_counts.top(),
+        'top_combinations': combination_counts.top(15),
+        'invoice_total_by_work_type': work_type_counts.rounded_sums()
     }
+    if duplicates:
+        summary['near_duplicate_clusters'] = len(near_duplicate_clusters)
+        summary['jobs_in_near_duplicate_clusters'] = sum(map(len, near_duplicate_clusters.values()))
 
     with open('two_dimensional_summary.json', 'w') as f:
         json.dump(summary, f, indent=2)